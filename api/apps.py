@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Parse the built-in word lists once when the process starts
+        from .utils.wordlists import wordlist_registry
+        wordlist_registry.refresh()
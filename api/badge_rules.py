@@ -0,0 +1,149 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+# How long (seconds) a process keeps its rule table before reloading it from the Badge table
+BADGE_RULES_TTL = getattr(settings, 'BADGE_RULES_TTL', 300)
+
+# Version key bumped by invalidate_badge_rules(). It only reaches other processes when CACHES
+# is a shared backend (ex. Redis); with the default per-process cache they reload after BADGE_RULES_TTL
+BADGE_RULES_VERSION_KEY = 'badge_rules_version'
+
+
+class BadgeRule:
+    """
+    One badge and the conditions a student's stats snapshot must meet to earn it.
+    Every criterion that is set on the badge must hold:
+    - points_required: total points crossed the threshold with this update
+      (and stayed below points_ceiling when one is set)
+    - drills_completed_required: distinct drills completed
+    - correct_answers_required: total correct answers
+    """
+
+    def __init__(self, badge):
+        self.badge = badge
+        self.badge_id = badge.id
+        self.points_required = badge.points_required
+        self.points_ceiling = badge.points_ceiling
+        self.drills_completed_required = badge.drills_completed_required
+        self.correct_answers_required = badge.correct_answers_required
+
+    @property
+    def has_criteria(self):
+        return any(value is not None for value in (
+            self.points_required, self.drills_completed_required, self.correct_answers_required
+        ))
+
+    def matches(self, snapshot):
+        if self.points_required is not None:
+            if not snapshot['previous_points'] < self.points_required <= snapshot['total_points']:
+                return False
+            if self.points_ceiling is not None and snapshot['total_points'] >= self.points_ceiling:
+                return False
+        if self.drills_completed_required is not None and snapshot['drills_completed'] < self.drills_completed_required:
+            return False
+        if self.correct_answers_required is not None and snapshot['correct_answers'] < self.correct_answers_required:
+            return False
+        return True
+
+
+class BadgeRuleTable:
+    """
+    Process-level table of every badge rule, loaded from the database once and
+    reloaded when it expires or when invalidate_badge_rules() bumps the shared version.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules = None
+        self._loaded_at = 0
+        self._version = None
+
+    def _is_stale(self):
+        if self._rules is None:
+            return True
+        if time.monotonic() - self._loaded_at > BADGE_RULES_TTL:
+            return True
+        return cache.get(BADGE_RULES_VERSION_KEY, 0) != self._version
+
+    def rules(self):
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self._load()
+        return self._rules
+
+    def _load(self):
+        from .models import Badge
+
+        version = cache.get(BADGE_RULES_VERSION_KEY, 0)
+        rules = [BadgeRule(badge) for badge in Badge.objects.all()]
+        self._rules = [rule for rule in rules if rule.has_criteria]
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._rules = None
+
+
+rule_table = BadgeRuleTable()
+
+
+def invalidate_badge_rules():
+    """
+    Drops the rule table of this process and bumps the rules version in the cache.
+    Other processes only see the bump if the cache is shared between them, otherwise
+    they pick up the change when their table expires (BADGE_RULES_TTL).
+    """
+    try:
+        cache.incr(BADGE_RULES_VERSION_KEY)
+    except ValueError:
+        cache.set(BADGE_RULES_VERSION_KEY, 1, None)
+    rule_table.clear()
+
+
+def evaluate_badges(snapshot, earned_badge_ids=()):
+    """
+    Evaluates every rule against a stats snapshot in one pass.
+
+    snapshot keys: previous_points, total_points, drills_completed, correct_answers
+    Returns the Badge objects that are newly earned.
+    """
+    earned_badge_ids = set(earned_badge_ids)
+    return [
+        rule.badge for rule in rule_table.rules()
+        if rule.badge_id not in earned_badge_ids and rule.matches(snapshot)
+    ]
+
+
+def award_badges(user, snapshot):
+    """
+    Awards every newly earned badge to the user with one M2M insert and one Notification insert.
+    """
+    from .models import Notification
+
+    new_badges = evaluate_badges(snapshot, user.badges.values_list('id', flat=True))
+    if not new_badges:
+        return set()
+
+    Through = user.badges.through
+    Through.objects.bulk_create(
+        [Through(user_id=user.id, badge_id=badge.id) for badge in new_badges],
+        ignore_conflicts=True
+    )
+    Notification.objects.bulk_create([
+        Notification(
+            recipient=user,
+            type='badge_earned',
+            message=f'Congratulations! You earned the {badge.name} badge!',
+            data={
+                'badge_id': badge.id,
+                'badge_name': badge.name,
+                'badge_description': badge.description,
+                'badge_image': badge.image.url if badge.image else None
+            }
+        ) for badge in new_badges
+    ])
+    return set(new_badges)
@@ -10,7 +10,8 @@ class Command(BaseCommand):
                 'name': "Pathfinder Prodigy",
                 'description': "Completed your first vocabulary drill.",
                 'image': "badges/badge1.png",
-                'points_required': 100
+                'points_required': 100,
+                'points_ceiling': 1000
             },
             {
                 'name': "Vocabulary Rookie",
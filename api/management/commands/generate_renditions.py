@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.models import Badge, User, DrillChoice
+from api.utils.renditions import generate_renditions
+
+class Command(BaseCommand):
+    help = 'Creates the missing image renditions of badges, avatars and drill choices (responses only serve existing ones)'
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in ((Badge, 'image'), (User, 'avatar'), (DrillChoice, 'image')):
+            names.update(model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).values_list(field, flat=True))
+
+        for name in sorted(names):
+            generate_renditions(name)
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully generated renditions for {len(names)} images'))
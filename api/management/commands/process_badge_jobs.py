@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from api.models import BadgeRecomputeJob
+
+class Command(BaseCommand):
+    help = 'Processes queued total-points and badge recomputations (runs until stopped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every due job once and exit')
+        parser.add_argument('--batch-size', type=int, default=50, help='Jobs claimed per transaction')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        processed = 0
+
+        try:
+            while True:
+                succeeded, failed = BadgeRecomputeJob.process_batch(batch_size=batch_size)
+                processed += succeeded
+                if succeeded or failed:
+                    self.stdout.write(self.style.SUCCESS(f'Processed {succeeded} badge job(s), {failed} failed'))
+                if options['once']:
+                    # Claimed jobs (and failed ones, pushed back) aren't due again in this pass
+                    if succeeded + failed < batch_size:
+                        break
+                    continue
+                if succeeded:
+                    continue
+                # Nothing done (empty queue or only failures): wait instead of spinning
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully processed {processed} badge job(s)'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from api.models import Classroom, ClassroomLeaderboardEntry
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized classroom leaderboards from DrillResult points'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classroom', type=int, help='Only rebuild the leaderboard of this classroom id')
+
+    def handle(self, *args, **options):
+        classrooms = Classroom.objects.all()
+        if options.get('classroom'):
+            classrooms = classrooms.filter(id=options['classroom'])
+
+        for classroom in classrooms:
+            student_count = ClassroomLeaderboardEntry.rebuild(classroom)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Rebuilt leaderboard for {classroom.name} ({student_count} students with results)'
+                )
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rebuilt {classrooms.count()} classroom leaderboards'
+            )
+        )
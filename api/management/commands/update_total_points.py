@@ -1,9 +1,8 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Sum
-from api.models import User, DrillResult
+from api.models import User, StudentStats
 
 class Command(BaseCommand):
-    help = 'Updates total_points for all students based on their DrillResult points'
+    help = 'Rebuilds the student stats and total_points of all students from their DrillResult points'
 
     def handle(self, *args, **options):
         # Get all students
@@ -11,12 +10,9 @@ class Command(BaseCommand):
         updated_count = 0
 
         for student in students:
-            # Calculate total points from DrillResult
-            total_points = DrillResult.objects.filter(
-                student=student
-            ).aggregate(
-                total=Sum('points')
-            )['total'] or 0
+            # Recompute the latest-run points per drill and the correct answer count
+            stats = StudentStats.rebuild(student.id)
+            total_points = stats.total_points
 
             # Update student's total_points (encrypted property)
             student.total_points = total_points
@@ -33,4 +29,4 @@ class Command(BaseCommand):
             self.style.SUCCESS(
                 f'Successfully updated total points for {updated_count} students'
             )
-        ) 
\ No newline at end of file
+        )
@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .utils.encryption import request_decryption_cache
+
+
+class DecryptionCacheMiddleware:
+    """
+    Gives every request its own decrypted-value memo so the same ciphertext
+    (ex. a student's encrypted name) is only Fernet-decrypted once per request.
+
+    Works in both modes so async views under ASGI aren't moved to a thread by it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_decryption_cache():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with request_decryption_cache():
+            return await self.get_response(request)
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-17 05:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassroomLeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('drill_scores', models.JSONField(default=dict)),
+                ('total_points', models.FloatField(default=0)),
+                ('completed_drills', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='api.classroom')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-total_points'],
+                'indexes': [models.Index(fields=['classroom', '-total_points'], name='leaderboard_rank_idx')],
+                'unique_together': {('classroom', 'student')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+def build_name_indexes(apps, schema_editor):
+    from api.utils.encryption import decrypt, blind_index
+
+    User = apps.get_model('api', 'User')
+    users = User.objects.filter(first_name_index__isnull=True, last_name_index__isnull=True)
+    for user in users.iterator():
+        user.first_name_index = blind_index(decrypt(user.first_name_encrypted))
+        user.last_name_index = blind_index(decrypt(user.last_name_encrypted))
+        user.save(update_fields=['first_name_index', 'last_name_index'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_classroomleaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='first_name_index',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_name_index',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(build_name_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:01
+
+from django.db import migrations, models
+
+
+def set_pathfinder_ceiling(apps, schema_editor):
+    # Pathfinder Prodigy used to be special-cased by name: only awarded while total points < 1000
+    Badge = apps.get_model('api', 'Badge')
+    Badge.objects.filter(name='Pathfinder Prodigy', points_required=100).update(points_ceiling=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_studentstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='points_ceiling',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_pathfinder_ceiling, migrations.RunPython.noop),
+    ]
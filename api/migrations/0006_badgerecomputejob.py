@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_badge_points_ceiling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeRecomputeJob',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='badge_job', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['requested_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_attempt_cursors(apps, schema_editor):
+    DrillResult = apps.get_model('api', 'DrillResult')
+    DrillAttempt = apps.get_model('api', 'DrillAttempt')
+    question_models = [
+        apps.get_model('api', name)
+        for name in ('SmartSelectQuestion', 'BlankBustersQuestion', 'SentenceBuilderQuestion', 'PictureWordQuestion', 'MemoryGameQuestion')
+    ]
+
+    totals = {}
+    for model_cls in question_models:
+        for row in model_cls.objects.values('drill_id').annotate(count=models.Count('id')):
+            totals[row['drill_id']] = totals.get(row['drill_id'], 0) + row['count']
+
+    # Latest run of every student on every drill
+    latest = {}
+    results = DrillResult.objects.annotate(answered=models.Count('question_results')).order_by('run_number', 'id')
+    for result in results.iterator():
+        latest[(result.student_id, result.drill_id)] = result
+
+    DrillAttempt.objects.bulk_create([
+        DrillAttempt(
+            student_id=student_id,
+            drill_id=drill_id,
+            drill_result_id=result.id,
+            run_number=result.run_number,
+            answered_count=result.answered,
+            question_total=totals.get(drill_id, 0),
+        ) for (student_id, drill_id), result in latest.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_badgerecomputejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DrillAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_number', models.IntegerField(default=0)),
+                ('answered_count', models.IntegerField(default=0)),
+                ('question_total', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('drill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='api.drill')),
+                ('drill_result', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.drillresult')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drill_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'drill')},
+            },
+        ),
+        migrations.RunPython(build_attempt_cursors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_drillattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='drill',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_definitioncache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badgerecomputejob',
+            name='dead',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='badgerecomputejob',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_source_urls(apps, schema_editor):
+    # The url each file was downloaded from moves to its own table
+    StoredMedia = apps.get_model('api', 'StoredMedia')
+    StoredMediaSource = apps.get_model('api', 'StoredMediaSource')
+    StoredMediaSource.objects.bulk_create([
+        StoredMediaSource(url=url, media_id=media_id)
+        for media_id, url in StoredMedia.objects.exclude(source_url__isnull=True).exclude(source_url='').values_list('id', 'source_url')
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_badgerecomputejob_dead'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredMediaSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1000, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('media', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sources', to='api.storedmedia')),
+            ],
+        ),
+        migrations.RunPython(copy_source_urls, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='storedmedia',
+            name='source_url',
+        ),
+    ]
@@ -1,13 +1,24 @@
 from datetime import timedelta
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
-from .utils.encryption import encrypt, decrypt
+from .utils.encryption import encrypt, decrypt, decrypt_many, blind_index
+from .utils.media import MediaBatch
+from .utils.renditions import generate_renditions
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.core.files.storage import default_storage
+import hashlib
+import json
+import logging
 import os
+import re
+import unicodedata
+import uuid
+
+logger = logging.getLogger(__name__)
 
 # Create your models here.
 
@@ -17,12 +28,24 @@ class Badge(models.Model):
     description = models.TextField()
     image = models.ImageField(upload_to='badges/', null=True, blank=True)
     points_required = models.IntegerField(null=True, blank=True)
+    points_ceiling = models.IntegerField(null=True, blank=True)  # badge can no longer be earned once total points reach this
     drills_completed_required = models.IntegerField(null=True, blank=True)
     correct_answers_required = models.IntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .badge_rules import invalidate_badge_rules
+        invalidate_badge_rules()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .badge_rules import invalidate_badge_rules
+        invalidate_badge_rules()
+        return result
+
     class Meta:
         ordering = ['points_required']
 
@@ -30,6 +53,9 @@ class User(AbstractUser): # inherit AbstractUser
     email = models.EmailField(unique=True)  
     first_name_encrypted = models.BinaryField(null=True)
     last_name_encrypted = models.BinaryField(null=True)
+    # keyed HMAC of the normalized names, lets us look users up by name without decrypting
+    first_name_index = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    last_name_index = models.CharField(max_length=64, null=True, blank=True, db_index=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
     badges = models.ManyToManyField(Badge, related_name='users', blank=True)
     total_points_encrypted = models.BinaryField(null=True, blank=True)
@@ -40,8 +66,10 @@ class User(AbstractUser): # inherit AbstractUser
         if self._state.adding: # checks if the instance is newly added
           if (self.first_name):
               self.first_name_encrypted = encrypt(self.first_name)
+              self.first_name_index = blind_index(self.first_name)
           if (self.last_name):
               self.last_name_encrypted = encrypt(self.last_name)
+              self.last_name_index = blind_index(self.last_name)
           if not self.total_points_encrypted:
               self.total_points_encrypted = encrypt(str(0))
         
@@ -75,17 +103,42 @@ class User(AbstractUser): # inherit AbstractUser
             return int(decrypt(self.total_points_encrypted))
         return 0
 
+    @classmethod
+    def filter_by_names(cls, names, queryset=None):
+        """
+        Resolve (first_name, last_name) pairs to users with one indexed query.
+        Returns a dict keyed by the (first_name_index, last_name_index) pair.
+        """
+        pairs = {(blind_index(first), blind_index(last)) for first, last in names}
+        pairs.discard((None, None))
+        if not pairs:
+            return {}
+        queryset = cls.objects.all() if queryset is None else queryset
+        candidates = queryset.filter(
+            first_name_index__in={first for first, _ in pairs},
+            last_name_index__in={last for _, last in pairs}
+        )
+        return {
+            (user.first_name_index, user.last_name_index): user
+            for user in candidates
+            if (user.first_name_index, user.last_name_index) in pairs
+        }
+
+    @staticmethod
+    def prime_decrypted_names(users):
+        """Batch-decrypt the names of many users so later get_decrypted_* calls hit the request cache"""
+        encrypted_names = []
+        for user in users:
+            encrypted_names.append(user.first_name_encrypted)
+            encrypted_names.append(user.last_name_encrypted)
+        decrypt_many(encrypted_names)
+        return users
+
     def update_points_and_badges(self, points_to_add):
         """Update user's total points and check for new badges (latest attempt per drill only)"""
-        # Calculate total points from only the latest attempt for each drill
-        from collections import defaultdict
-        drill_results = DrillResult.objects.filter(student=self)
-        latest_by_drill = {}
-        for result in drill_results:
-            drill_id = result.drill_id
-            if drill_id not in latest_by_drill or result.run_number > latest_by_drill[drill_id].run_number:
-                latest_by_drill[drill_id] = result
-        total_points = sum(r.points or 0 for r in latest_by_drill.values())
+        # Total points of the latest attempt of each drill, kept up to date by StudentStats
+        stats = StudentStats.for_student(self.id)
+        total_points = stats.total_points
 
         # Store previous points for badge comparison
         previous_points = self.total_points
@@ -93,79 +146,14 @@ class User(AbstractUser): # inherit AbstractUser
         self.total_points = total_points
         self.save(update_fields=['total_points_encrypted'])
 
-        # Get all badges that could be earned
-        new_badges = set()
-
-        # Check for point-based badges (including Pathfinder Prodigy)
-        point_badges = Badge.objects.filter(
-            points_required__isnull=False,
-            drills_completed_required__isnull=True,
-            correct_answers_required__isnull=True
-        ).exclude(
-            id__in=self.badges.values_list('id', flat=True)  # Exclude already earned badges
-        )
-
-        for badge in point_badges:
-            # Pathfinder Prodigy: only award if points_required=100 and total_points is in [100, 1000)
-            if badge.name == 'Pathfinder Prodigy':
-                if badge.points_required == 100 and previous_points < 100 and 100 <= self.total_points < 1000:
-                    new_badges.add(badge)
-            elif previous_points < badge.points_required <= self.total_points:
-                new_badges.add(badge)
-
-        # Check for drill completion badges (like Vocabulary Rookie)
-        completed_drills = DrillResult.objects.filter(
-            student=self
-        ).values('drill').distinct().count()
-
-        drill_badges = Badge.objects.filter(
-            drills_completed_required__isnull=False,
-            points_required__isnull=True,
-            correct_answers_required__isnull=True
-        ).exclude(
-            id__in=self.badges.values_list('id', flat=True)
-        )
-
-        for badge in drill_badges:
-            if completed_drills >= badge.drills_completed_required:
-                new_badges.add(badge)
-
-        # Check for correct answers badges
-        total_correct = QuestionResult.objects.filter(
-            drill_result__student=self,
-            is_correct=True
-        ).count()
-
-        correct_badges = Badge.objects.filter(
-            correct_answers_required__isnull=False,
-            points_required__isnull=True,
-            drills_completed_required__isnull=True
-        ).exclude(
-            id__in=self.badges.values_list('id', flat=True)
-        )
-
-        for badge in correct_badges:
-            if total_correct >= badge.correct_answers_required:
-                new_badges.add(badge)
-
-        # Award all new badges
-        if new_badges:
-            self.badges.add(*new_badges)
-            # Create notifications for each new badge
-            for badge in new_badges:
-                Notification.objects.create(
-                    recipient=self,
-                    type='badge_earned',
-                    message=f'Congratulations! You earned the {badge.name} badge!',
-                    data={
-                        'badge_id': badge.id,
-                        'badge_name': badge.name,
-                        'badge_description': badge.description,
-                        'badge_image': badge.image.url if badge.image else None
-                    }
-                )
-
-        return new_badges
+        # Evaluate every badge rule at once against the stats snapshot
+        from .badge_rules import award_badges
+        return award_badges(self, {
+            'previous_points': previous_points,
+            'total_points': int(total_points),
+            'drills_completed': stats.drills_completed,
+            'correct_answers': stats.correct_answers,
+        })
 
     # award_first_drill_badge removed
 
@@ -264,21 +252,231 @@ class Drill(models.Model):
         ('published', 'Published'),
     ]
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    version = models.PositiveIntegerField(default=1)  # bumped whenever the serialized drill changes, keys the cached payload and question manifest
     
+    def bump_version(self):
+        """Invalidate every cached payload and question manifest of this drill"""
+        Drill.objects.filter(pk=self.pk).update(version=models.F('version') + 1)
+        self.refresh_from_db(fields=['version'])
+
+    @classmethod
+    def bump_versions(cls, **filters):
+        """Invalidate every cached payload of the drills matching filters (ex. custom_wordlist=wordlist)"""
+        cls.objects.filter(**filters).update(version=models.F('version') + 1)
+
+    # How long (seconds) a question manifest stays in the cache
+    QUESTION_MANIFEST_TTL = 60 * 60
+
+    @staticmethod
+    def question_models():
+        """Question type code -> concrete question model"""
+        return {
+            'M': SmartSelectQuestion,
+            'F': BlankBustersQuestion,
+            'D': SentenceBuilderQuestion,
+            'P': PictureWordQuestion,
+            'G': MemoryGameQuestion,
+        }
+
+    def _question_manifest_key(self):
+        # Keyed on the version: the cache is per process, a bump makes every worker miss its stale copy
+        return f'drill_question_manifest:{self.id}:v{self.version}'
+
+    def question_manifest(self, refresh=False):
+        """
+        Cached manifest of this drill's questions:
+        {'total': 5, 'questions': {<question id>: ['M', 'D']}}
+        Ids are per question table, so one id can belong to several types.
+        """
+        key = self._question_manifest_key()
+        manifest = None if refresh else cache.get(key)
+        if manifest is None:
+            questions = {}
+            total = 0
+            for type_code, model_cls in self.question_models().items():
+                for question_id in model_cls.objects.filter(drill=self).values_list('id', flat=True):
+                    questions.setdefault(question_id, []).append(type_code)
+                    total += 1
+            manifest = {'total': total, 'questions': questions}
+            cache.set(key, manifest, self.QUESTION_MANIFEST_TTL)
+        return manifest
+
+    def invalidate_question_manifest(self):
+        cache.delete(self._question_manifest_key())
+        self.bump_version()
+
+    def find_question(self, question_id, question_type=None):
+        """
+        Returns the question with this id (and type, when given) using the manifest
+        and a single primary-key fetch, or None when the drill has no such question.
+        """
+        question_models = self.question_models()
+        for refresh in (False, True):
+            types = self.question_manifest(refresh=refresh)['questions'].get(int(question_id), [])
+            if question_type in question_models:
+                types = [question_type] if question_type in types else []
+            for type_code in types:
+                question = question_models[type_code].objects.filter(pk=question_id, drill=self).first()
+                if question is not None:
+                    return question
+            # The manifest may predate a question saved outside create/update_with_questions
+        return None
+
+    def count_questions(self):
+        """Total number of questions across every question type of this drill"""
+        return self.question_manifest()['total']
+
+    @staticmethod
+    def _uploaded_media_path(f, folder):
+        """
+        Storage path of an uploaded image/video under <folder>/images or <folder>/videos,
+        or None for other content types.
+        """
+        if f.content_type.startswith('image/'):
+            return f"{folder}/images/{os.path.basename(f.name)}"
+        elif f.content_type.startswith('video/'):
+            return f"{folder}/videos/{os.path.basename(f.name)}"
+        return None
+
+    @classmethod
+    def _process_question_media(cls, q_type, q_data, media, request=None):
+        """
+        Replace the media keys of a question payload with urls (Picture Word pictures,
+        Memory Game cards, Smart Select question_media). Uploaded files from request.FILES
+        are queued on the MediaBatch and their urls filled in when it runs.
+        """
+        files = getattr(request, 'FILES', None) if request else None
+
+        def queue_upload(f, folder, on_url, quiet):
+            path = cls._uploaded_media_path(f, folder)
+            if path:
+                media.save_upload(f, path, lambda saved_path: on_url(default_storage.url(saved_path)), quiet=quiet)
+
+        try:
+            # Picture Word: map media -> url
+            if q_type == 'P' and isinstance(q_data.get('pictureWord'), list):
+                for picture in q_data['pictureWord']:
+                    if not isinstance(picture, dict):
+                        continue
+                    media_key = picture.get('media')
+                    if files is not None and isinstance(media_key, str) and media_key in files:
+                        queue_upload(files[media_key], 'vocabulary', lambda url, picture=picture: picture.update(media={'url': url}), True)
+                    elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
+                        picture['media'] = {'url': media_key}
+
+            # Memory Game: map media -> content
+            if q_type == 'G' and isinstance(q_data.get('memoryCards'), list):
+                for card in q_data['memoryCards']:
+                    if not isinstance(card, dict):
+                        continue
+                    media_key = card.get('media')
+                    if files is not None and isinstance(media_key, str) and media_key in files:
+                        queue_upload(files[media_key], 'vocabulary', lambda url, card=card: card.update(media=url), True)
+                    elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
+                        card['media'] = media_key
+        except Exception:
+            pass
+
+        # Handle question_media for Smart Select questions (M)
+        if q_type == 'M':
+            media_key = q_data.get('question_media')
+            if files is not None and isinstance(media_key, str) and media_key in files:
+                queue_upload(files[media_key], 'questions', lambda url: q_data.update(question_media=url), False)
+            elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
+                # Already a URL, keep it
+                q_data['question_media'] = media_key
+
+    @staticmethod
+    def _apply_choice_media(drill_choice, media_key, media, request=None):
+        """
+        Attach the media of a choice: an uploaded file from request.FILES, a local path,
+        or an external url that is downloaded into storage. Uploads and downloads are
+        queued on the MediaBatch and set on the choice when it runs.
+        """
+        files = getattr(request, 'FILES', None) if request else None
+        if not media_key or not isinstance(media_key, str):
+            return
+
+        def queue(attr, name, transfer, *args):
+            path = drill_choice._meta.get_field(attr).generate_filename(drill_choice, name)
+
+            def on_done(saved_path):
+                setattr(drill_choice, attr, saved_path)
+                if attr == 'image':
+                    # Responses only serve renditions that exist, create them with the upload
+                    generate_renditions(saved_path)
+            transfer(*args, path, on_done)
+
+        if files is not None and media_key in files:
+            f = files[media_key]
+            if f.content_type.startswith('image/'):
+                queue('image', f.name, media.save_upload, f)
+            elif f.content_type.startswith('video/'):
+                queue('video', f.name, media.save_upload, f)
+            return
+
+        if not (media_key.startswith('http') or media_key.startswith('/')):
+            return
+
+        # URL from wordlist - determine if it's image or video based on extension or path
+        lower_media = media_key.lower()
+        if any(ext in lower_media for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '/images/']):
+            attr = 'image'
+        elif any(ext in lower_media for ext in ['.mp4', '.webm', '.mov', '.avi', '/videos/']):
+            attr = 'video'
+        else:
+            return
+
+        if media_key.startswith('/'):
+            # For local URLs, just store the path
+            setattr(drill_choice, attr, media_key.lstrip('/'))
+        else:
+            # For external URLs, download and save
+            queue(attr, os.path.basename(media_key.split('?')[0]), media.save_remote, media_key)
+
+    @staticmethod
+    def _build_choice_specs(question, choices_data):
+        """(text, is_correct, media key) of every choice in the payload of a question"""
+        specs = []
+        for c_idx, choice in enumerate(choices_data or []):
+            is_correct = False
+            if hasattr(question, 'answer') and question.answer is not None:
+                try:
+                    is_correct = (c_idx == int(question.answer))
+                except (ValueError, TypeError):
+                    is_correct = False
+            specs.append((choice.get('text', ''), is_correct, choice.pop('media', None)))
+        return specs
+
+    def _build_choices(self, question, ct, choices_data, media, request=None):
+        """
+        Unsaved DrillChoice rows of a SmartSelect/BlankBusters question
+        (object_id is set once the question itself is saved)
+        """
+        choices = []
+        for text, is_correct, media_key in self._build_choice_specs(question, choices_data):
+            drill_choice = DrillChoice(
+                content_type=ct,
+                object_id=question.id,
+                text=text,
+                is_correct=is_correct,
+            )
+            self._apply_choice_media(drill_choice, media_key, media, request)
+            choices.append(drill_choice)
+        return choices
+
     def create_with_questions(self, questions_input, request=None):
         """
         Create questions of appropriate subclass based on 'type' in questions_input.
         Supports choices via GenericRelation for SmartSelect/BlankBusters.
+        Questions are inserted with one bulk_create per question type and choices with
+        one bulk_create per content type, all in a single transaction.
         """
-        from django.contrib.contenttypes.models import ContentType
-        type_to_model = {
-        'M': SmartSelectQuestion,
-        'F': BlankBustersQuestion,
-        'D': SentenceBuilderQuestion,
-        'P': PictureWordQuestion,
-        'G': MemoryGameQuestion,
-        }
+        type_to_model = self.question_models()
+        media = MediaBatch()
 
+        # Build the unsaved questions and choices grouped by model
+        pending = {q_type: [] for q_type in type_to_model}
         for q_data in questions_input or []:
             q_type = q_data.get('type') or q_data.get('drill_type')
             model_cls = type_to_model.get(q_type)
@@ -288,190 +486,93 @@ class Drill(models.Model):
             # Extract and remove choices for later processing
             choices_data = q_data.pop('choices', []) if isinstance(q_data, dict) else []
 
-            # Handle media for Picture Word (P) and Memory Game (G) before creating the question
-            if isinstance(q_data, dict):
-                try:
-                    # Picture Word: map media -> url
-                    if q_type == 'P' and isinstance(q_data.get('pictureWord'), list):
-                        processed_pictures = []
-                        for picture in q_data.get('pictureWord', []):
-                            if not isinstance(picture, dict):
-                                processed_pictures.append(picture)
-                                continue
-                            media_key = picture.get('media')
-                            if request and hasattr(request, 'FILES') and isinstance(media_key, str) and media_key in request.FILES:
-                                f = request.FILES[media_key]
-                                saved_url = None
-                                if f.content_type.startswith('image/'):
-                                    filename = f"vocabulary/images/{os.path.basename(f.name)}"
-                                    saved_path = default_storage.save(filename, f)
-                                    saved_url = default_storage.url(saved_path)
-                                elif f.content_type.startswith('video/'):
-                                    filename = f"vocabulary/videos/{os.path.basename(f.name)}"
-                                    saved_path = default_storage.save(filename, f)
-                                    saved_url = default_storage.url(saved_path)
-                                if saved_url:
-                                    picture['media'] = {'url': saved_url}
-                            elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                                picture['media'] = {'url': media_key}
-                            processed_pictures.append(picture)
-                        q_data['pictureWord'] = processed_pictures
-
-                    # Memory Game: map media -> content
-                    if q_type == 'G' and isinstance(q_data.get('memoryCards'), list):
-                        processed_cards = []
-                        for card in q_data.get('memoryCards', []):
-                            if not isinstance(card, dict):
-                                processed_cards.append(card)
-                                continue
-                            media_key = card.get('media')
-                            if request and hasattr(request, 'FILES') and isinstance(media_key, str) and media_key in request.FILES:
-                                f = request.FILES[media_key]
-                                saved_url = None
-                                if f.content_type.startswith('image/'):
-                                    filename = f"vocabulary/images/{os.path.basename(f.name)}"
-                                    saved_path = default_storage.save(filename, f)
-                                    saved_url = default_storage.url(saved_path)
-                                elif f.content_type.startswith('video/'):
-                                    filename = f"vocabulary/videos/{os.path.basename(f.name)}"
-                                    saved_path = default_storage.save(filename, f)
-                                    saved_url = default_storage.url(saved_path)
-                                if saved_url:
-                                    card['media'] = saved_url
-                            elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                                card['media'] = media_key
-                            processed_cards.append(card)
-                        q_data['memoryCards'] = processed_cards
-                except Exception:
-                    pass
+            # Queue media before creating the question
+            self._process_question_media(q_type, q_data, media, request)
 
-            # Handle question_media for Smart Select questions (M)
-            if q_type == 'M' and isinstance(q_data, dict):
-                media_key = q_data.get('question_media')
-                if request and hasattr(request, 'FILES') and isinstance(media_key, str) and media_key in request.FILES:
-                    # Handle uploaded file
-                    f = request.FILES[media_key]
-                    saved_url = None
-                    if f.content_type.startswith('image/'):
-                        filename = f"questions/images/{os.path.basename(f.name)}"
-                        saved_path = default_storage.save(filename, f)
-                        saved_url = default_storage.url(saved_path)
-                    elif f.content_type.startswith('video/'):
-                        filename = f"questions/videos/{os.path.basename(f.name)}"
-                        saved_path = default_storage.save(filename, f)
-                        saved_url = default_storage.url(saved_path)
-                    if saved_url:
-                        q_data['question_media'] = saved_url
-                elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                    # Already a URL, keep it
-                    q_data['question_media'] = media_key
-
-            # Create question
             question_fields = {k: v for k, v in q_data.items() if k not in ['id', 'choices']}
-            question = model_cls.objects.create(drill=self, **question_fields)
-            print(f"Created {q_type} question with ID {question.id} for drill {self.id}")
+            question = model_cls(drill=self, **question_fields)
+            question.type = model_cls.drill_type
 
             # Handle choices for SmartSelect/BlankBusters
-            if q_type in ['M', 'F'] and choices_data:
-                ct = ContentType.objects.get_for_model(question)
-                for c_idx, choice in enumerate(choices_data):
-                    # Handle optional media from request.FILES (key in 'media')
-                    image = None
-                    video = None
-                    image_url = None
-                    video_url = None
-                    
-                    media_key = choice.pop('media', None)
-                    if request and media_key and isinstance(media_key, str) and hasattr(request, 'FILES') and media_key in request.FILES:
-                        # Handle uploaded file
-                        f = request.FILES[media_key]
-                        if f.content_type.startswith('image/'):
-                            image = f
-                        elif f.content_type.startswith('video/'):
-                            video = f
-                    elif media_key and isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                        # Handle URL from wordlist - determine if it's image or video based on extension or path
-                        lower_media = media_key.lower()
-                        if any(ext in lower_media for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '/images/']):
-                            image_url = media_key
-                        elif any(ext in lower_media for ext in ['.mp4', '.webm', '.mov', '.avi', '/videos/']):
-                            video_url = media_key
-
-                    is_correct = False
-                    if hasattr(question, 'answer') and question.answer is not None:
-                        try:
-                            is_correct = (c_idx == int(question.answer))
-                        except (ValueError, TypeError):
-                            is_correct = False
-
-                    # Create choice with file or URL
-                    drill_choice = DrillChoice.objects.create(
-                        content_type=ct,
-                        object_id=question.id,
-                        text=choice.get('text', ''),
-                        image=image,
-                        video=video,
-                        is_correct=is_correct,
-                    )
-                    
-                    # If we have URLs, save them to the file fields
-                    if image_url:
-                        from django.core.files.base import ContentFile
-                        import requests
-                        try:
-                            # For local URLs, just store the path
-                            if image_url.startswith('/'):
-                                drill_choice.image.name = image_url.lstrip('/')
-                            else:
-                                # For external URLs, download and save
-                                response = requests.get(image_url, timeout=10)
-                                if response.status_code == 200:
-                                    filename = os.path.basename(image_url.split('?')[0])
-                                    drill_choice.image.save(filename, ContentFile(response.content), save=False)
-                        except Exception as e:
-                            print(f"Error saving image URL: {e}")
-                    
-                    if video_url:
-                        from django.core.files.base import ContentFile
-                        import requests
-                        try:
-                            # For local URLs, just store the path
-                            if video_url.startswith('/'):
-                                drill_choice.video.name = video_url.lstrip('/')
-                            else:
-                                # For external URLs, download and save
-                                response = requests.get(video_url, timeout=10)
-                                if response.status_code == 200:
-                                    filename = os.path.basename(video_url.split('?')[0])
-                                    drill_choice.video.save(filename, ContentFile(response.content), save=False)
-                        except Exception as e:
-                            print(f"Error saving video URL: {e}")
-                    
-                    if image_url or video_url:
-                        drill_choice.save()
-        
+            choices = []
+            if q_type in ['M', 'F']:
+                choices = self._build_choices(question, ContentType.objects.get_for_model(model_cls), choices_data, media, request)
+            pending[q_type].append((question, q_data, choices))
+
+        # Every upload and download of the payload runs concurrently
+        media.run()
+
+        with transaction.atomic():
+            for q_type, items in pending.items():
+                if not items:
+                    continue
+                model_cls = type_to_model[q_type]
+                for question, q_data, _ in items:
+                    if 'question_media' in q_data:
+                        question.question_media = q_data['question_media']
+                model_cls.objects.bulk_create([question for question, _, _ in items])
+
+                choices = []
+                for question, _, question_choices in items:
+                    for drill_choice in question_choices:
+                        drill_choice.object_id = question.id
+                    choices.extend(question_choices)
+                if choices:
+                    DrillChoice.objects.bulk_create(choices)
+
+            print(f"Created {sum(len(items) for items in pending.values())} questions for drill {self.id}")
+
+        self.invalidate_question_manifest()
         return self
         
+    @staticmethod
+    def _choice_media_unchanged(drill_choice, media_key):
+        """True when the payload media of a choice refers to what the choice already stores"""
+        stored = [field.name for field in (drill_choice.image, drill_choice.video) if field and field.name]
+        if not media_key:
+            return not stored
+        if not isinstance(media_key, str):
+            return False
+        path = media_key.split('?')[0]
+        return any(path.lstrip('/') == name or path.endswith('/' + name) for name in stored)
+
     def update_with_questions(self, questions_input, request=None):
         """
         Upsert strategy:
         - Update existing questions by id and type
         - Create new questions not having an id
         - Delete questions removed from the payload
-        Choices for M/F are fully replaced from the payload
-        """
-        from django.contrib.contenttypes.models import ContentType
+        Choices for M/F are matched to the existing ones by position: unchanged choices
+        (and their stored media) are left alone, the rest are updated, created or deleted.
 
-        type_to_model = {
-            'M': SmartSelectQuestion,
-            'F': BlankBustersQuestion,
-            'D': SentenceBuilderQuestion,
-            'P': PictureWordQuestion,
-            'G': MemoryGameQuestion,
-        }
+        Existing questions and choices are loaded once and the changes are written with
+        bulk_update/bulk_create and one delete per model, in a single transaction.
+        """
+        type_to_model = self.question_models()
+        media = MediaBatch()
+        choice_types = [t for t in ('M', 'F') if t in type_to_model]
+        content_types = {t: ContentType.objects.get_for_model(type_to_model[t]) for t in choice_types}
+
+        # Existing questions and choices of the drill
+        existing = {t: {q.id: q for q in model_cls.objects.filter(drill=self)} for t, model_cls in type_to_model.items()}
+        existing_choices = {}
+        choice_ids = {content_types[t].id: list(existing[t]) for t in choice_types}
+        choice_filter = models.Q(pk__in=[])
+        for ct_id, ids in choice_ids.items():
+            if ids:
+                choice_filter |= models.Q(content_type_id=ct_id, object_id__in=ids)
+        for choice in DrillChoice.objects.filter(choice_filter).order_by('id'):
+            existing_choices.setdefault((choice.content_type_id, choice.object_id), []).append(choice)
 
         # Track which IDs to keep per type
         kept_ids_by_type = {t: set() for t in type_to_model.keys()}
+        to_update = {t: [] for t in type_to_model}
+        update_fields = {t: set() for t in type_to_model}
+        to_create = {t: [] for t in type_to_model}
+        choices_to_update = []
+        choices_to_create = []
+        choices_to_delete = []
+        media_targets = []
 
         for q_data in questions_input or []:
             if not isinstance(q_data, dict):
@@ -485,181 +586,102 @@ class Drill(models.Model):
             # Extract choices for later (M/F only)
             choices_data = q_data.pop('choices', []) if isinstance(q_data, dict) else []
 
-            # Preprocess media for P and G just like in create
-            try:
-                if q_type == 'P' and isinstance(q_data.get('pictureWord'), list):
-                    processed_pictures = []
-                    for picture in q_data.get('pictureWord', []):
-                        if not isinstance(picture, dict):
-                            processed_pictures.append(picture)
-                            continue
-                        media_key = picture.get('media')
-                        if request and hasattr(request, 'FILES') and isinstance(media_key, str) and media_key in request.FILES:
-                            f = request.FILES[media_key]
-                            saved_url = None
-                            if f.content_type.startswith('image/'):
-                                filename = f"vocabulary/images/{os.path.basename(f.name)}"
-                                saved_path = default_storage.save(filename, f)
-                                saved_url = default_storage.url(saved_path)
-                            elif f.content_type.startswith('video/'):
-                                filename = f"vocabulary/videos/{os.path.basename(f.name)}"
-                                saved_path = default_storage.save(filename, f)
-                                saved_url = default_storage.url(saved_path)
-                            if saved_url:
-                                picture['media'] = {'url': saved_url}
-                        elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                            picture['media'] = {'url': media_key}
-                        processed_pictures.append(picture)
-                    q_data['pictureWord'] = processed_pictures
-
-                if q_type == 'G' and isinstance(q_data.get('memoryCards'), list):
-                    processed_cards = []
-                    for card in q_data.get('memoryCards', []):
-                        if not isinstance(card, dict):
-                            processed_cards.append(card)
-                            continue
-                        media_key = card.get('media')
-                        if request and hasattr(request, 'FILES') and isinstance(media_key, str) and media_key in request.FILES:
-                            f = request.FILES[media_key]
-                            saved_url = None
-                            if f.content_type.startswith('image/'):
-                                filename = f"vocabulary/images/{os.path.basename(f.name)}"
-                                saved_path = default_storage.save(filename, f)
-                                saved_url = default_storage.url(saved_path)
-                            elif f.content_type.startswith('video/'):
-                                filename = f"vocabulary/videos/{os.path.basename(f.name)}"
-                                saved_path = default_storage.save(filename, f)
-                                saved_url = default_storage.url(saved_path)
-                            if saved_url:
-                                card['media'] = saved_url
-                        elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                            card['media'] = media_key
-                        processed_cards.append(card)
-                    q_data['memoryCards'] = processed_cards
-            except Exception:
-                pass
+            # Queue media just like in create
+            self._process_question_media(q_type, q_data, media, request)
 
-            # Handle question_media for Smart Select questions (M)
-            if q_type == 'M':
-                media_key = q_data.get('question_media')
-                if request and hasattr(request, 'FILES') and isinstance(media_key, str) and media_key in request.FILES:
-                    # Handle uploaded file
-                    f = request.FILES[media_key]
-                    saved_url = None
-                    if f.content_type.startswith('image/'):
-                        filename = f"questions/images/{os.path.basename(f.name)}"
-                        saved_path = default_storage.save(filename, f)
-                        saved_url = default_storage.url(saved_path)
-                    elif f.content_type.startswith('video/'):
-                        filename = f"questions/videos/{os.path.basename(f.name)}"
-                        saved_path = default_storage.save(filename, f)
-                        saved_url = default_storage.url(saved_path)
-                    if saved_url:
-                        q_data['question_media'] = saved_url
-                elif isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                    # Already a URL, keep it
-                    q_data['question_media'] = media_key
-
-            # Upsert question
             question_id = q_data.get('id')
             question_fields = {k: v for k, v in q_data.items() if k not in ['id', 'choices']}
-            question = None
-            if question_id is not None:
-                question = model_cls.objects.filter(drill=self, id=question_id).first()
-
-            if question:
-                # Update existing
-                for k, v in question_fields.items():
-                    if hasattr(question, k):
-                        setattr(question, k, v)
-                question.save()
-            else:
+            try:
+                question = existing[q_type].get(int(question_id)) if question_id is not None else None
+            except (ValueError, TypeError):
+                question = None
+
+            if question is None:
                 # Create new
-                question = model_cls.objects.create(drill=self, **question_fields)
+                question = model_cls(drill=self, **question_fields)
+                question.type = model_cls.drill_type
+                choices = []
+                if q_type in choice_types:
+                    choices = self._build_choices(question, content_types[q_type], choices_data, media, request)
+                to_create[q_type].append((question, choices))
+                media_targets.append((question, q_data))
+                continue
 
+            # Update existing, only if something changed
+            column_names = {field.name for field in model_cls._meta.concrete_fields}
+            question_fields['type'] = model_cls.drill_type
+            changed_fields = set()
+            for k, v in question_fields.items():
+                if hasattr(question, k) and getattr(question, k) != v:
+                    setattr(question, k, v)
+                    if k in column_names:
+                        changed_fields.add(k)
+            if changed_fields:
+                update_fields[q_type].update(changed_fields)
+                to_update[q_type].append(question)
             kept_ids_by_type[q_type].add(question.id)
-
-            # Replace choices for M/F
-            if q_type in ['M', 'F']:
-                # Delete existing generic choices
-                question.choices_generic.all().delete()
-                ct = ContentType.objects.get_for_model(question)
-                for c_idx, choice in enumerate(choices_data or []):
-                    image = None
-                    video = None
-                    image_url = None
-                    video_url = None
-                    
-                    media_key = choice.pop('media', None)
-                    if request and media_key and isinstance(media_key, str) and hasattr(request, 'FILES') and media_key in request.FILES:
-                        # Handle uploaded file
-                        f = request.FILES[media_key]
-                        if f.content_type.startswith('image/'):
-                            image = f
-                        elif f.content_type.startswith('video/'):
-                            video = f
-                    elif media_key and isinstance(media_key, str) and (media_key.startswith('http') or media_key.startswith('/')):
-                        # Handle URL from wordlist
-                        lower_media = media_key.lower()
-                        if any(ext in lower_media for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '/images/']):
-                            image_url = media_key
-                        elif any(ext in lower_media for ext in ['.mp4', '.webm', '.mov', '.avi', '/videos/']):
-                            video_url = media_key
-
-                    is_correct = False
-                    if hasattr(question, 'answer') and question.answer is not None:
-                        try:
-                            is_correct = (c_idx == int(question.answer))
-                        except (ValueError, TypeError):
-                            is_correct = False
-
-                    drill_choice = DrillChoice.objects.create(
-                        content_type=ct,
-                        object_id=question.id,
-                        text=choice.get('text', ''),
-                        image=image,
-                        video=video,
-                        is_correct=is_correct,
-                    )
-                    
-                    # If we have URLs, save them to the file fields
-                    if image_url:
-                        from django.core.files.base import ContentFile
-                        import requests
-                        try:
-                            if image_url.startswith('/'):
-                                drill_choice.image.name = image_url.lstrip('/')
-                            else:
-                                response = requests.get(image_url, timeout=10)
-                                if response.status_code == 200:
-                                    filename = os.path.basename(image_url.split('?')[0])
-                                    drill_choice.image.save(filename, ContentFile(response.content), save=False)
-                        except Exception as e:
-                            print(f"Error saving image URL: {e}")
-                    
-                    if video_url:
-                        from django.core.files.base import ContentFile
-                        import requests
-                        try:
-                            if video_url.startswith('/'):
-                                drill_choice.video.name = video_url.lstrip('/')
-                            else:
-                                response = requests.get(video_url, timeout=10)
-                                if response.status_code == 200:
-                                    filename = os.path.basename(video_url.split('?')[0])
-                                    drill_choice.video.save(filename, ContentFile(response.content), save=False)
-                        except Exception as e:
-                            print(f"Error saving video URL: {e}")
-                    
-                    if image_url or video_url:
-                        drill_choice.save()
-
-        # Delete questions that were removed in payload
-        for t, model_cls in type_to_model.items():
-            existing = model_cls.objects.filter(drill=self).values_list('id', flat=True)
-            to_delete = [qid for qid in existing if qid not in kept_ids_by_type[t]]
-            if to_delete:
-                model_cls.objects.filter(id__in=to_delete, drill=self).delete()
+            media_targets.append((question, q_data))
+
+            # Diff choices for M/F
+            if q_type in choice_types:
+                ct = content_types[q_type]
+                current = existing_choices.get((ct.id, question.id), [])
+                wanted = self._build_choice_specs(question, choices_data)
+                for c_idx, (text, is_correct, media_key) in enumerate(wanted):
+                    if c_idx >= len(current):
+                        drill_choice = DrillChoice(content_type=ct, object_id=question.id, text=text, is_correct=is_correct)
+                        self._apply_choice_media(drill_choice, media_key, media, request)
+                        choices_to_create.append(drill_choice)
+                        continue
+
+                    drill_choice = current[c_idx]
+                    changed = drill_choice.text != text or drill_choice.is_correct != is_correct
+                    drill_choice.text = text
+                    drill_choice.is_correct = is_correct
+                    if not self._choice_media_unchanged(drill_choice, media_key):
+                        drill_choice.image = None
+                        drill_choice.video = None
+                        self._apply_choice_media(drill_choice, media_key, media, request)
+                        changed = True
+                    if changed:
+                        choices_to_update.append(drill_choice)
+                choices_to_delete.extend(choice.id for choice in current[len(wanted):])
+
+        # Every upload and download of the payload runs concurrently
+        media.run()
+        for question, q_data in media_targets:
+            if 'question_media' in q_data and hasattr(question, 'question_media'):
+                question.question_media = q_data['question_media']
+
+        with transaction.atomic():
+            for t, model_cls in type_to_model.items():
+                if to_update[t]:
+                    model_cls.objects.bulk_update(to_update[t], sorted(update_fields[t]))
+
+                if to_create[t]:
+                    model_cls.objects.bulk_create([question for question, _ in to_create[t]])
+                    for question, choices in to_create[t]:
+                        kept_ids_by_type[t].add(question.id)
+                        for drill_choice in choices:
+                            drill_choice.object_id = question.id
+                        choices_to_create.extend(choices)
+
+                # Delete questions that were removed in payload (their choices go with them)
+                to_delete = [qid for qid in existing[t] if qid not in kept_ids_by_type[t]]
+                if to_delete:
+                    model_cls.objects.filter(id__in=to_delete, drill=self).delete()
+
+            if choices_to_delete:
+                DrillChoice.objects.filter(id__in=choices_to_delete).delete()
+            if choices_to_update:
+                DrillChoice.objects.bulk_update(choices_to_update, ['text', 'is_correct', 'image', 'video'])
+            if choices_to_create:
+                DrillChoice.objects.bulk_create(choices_to_create)
+
+        self.invalidate_question_manifest()
+
+        # Attempts in progress now need the new number of questions to be complete
+        DrillAttempt.objects.filter(drill=self).update(question_total=self.count_questions())
 
         return self
 
@@ -886,6 +908,22 @@ class DrillChoice(models.Model):
   video = models.FileField(upload_to='drill_choices/videos/', null=True, blank=True)
   is_correct = models.BooleanField(default=False) # marks which of the DrillChoice objects is the correct answer option used for Multiple Choice ('M') and Fill in the Blank ('F') questions
 
+  def _bump_drill_version(self):
+    if not self.content_type_id or not self.object_id:
+      return
+    model_cls = self.content_type.model_class()
+    drill_id = model_cls.objects.filter(pk=self.object_id).values_list('drill_id', flat=True).first() if model_cls else None
+    if drill_id:
+      Drill.objects.filter(pk=drill_id).update(version=models.F('version') + 1)
+
+  def save(self, *args, **kwargs):
+    super().save(*args, **kwargs)
+    self._bump_drill_version()
+
+  def delete(self, *args, **kwargs):
+    self._bump_drill_version()
+    return super().delete(*args, **kwargs)
+
 class DrillResult(models.Model):
     id = models.AutoField(primary_key=True)
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='drill_results')
@@ -941,10 +979,18 @@ class DrillResult(models.Model):
         if self.points is None or self.points != total_points:
             self.points = total_points
             super().save(update_fields=['_points_encrypted'])
-        
+
+        # Keep the student aggregates and the materialized classroom leaderboard in sync with this run
+        StudentStats.record_result(self)
+        ClassroomLeaderboardEntry.record_result(self)
+
         # Update points and check for badges (always call this after points are updated)
         if self.points is not None:
-            self.student.update_points_and_badges(self.points)
+            if settings.DEFER_BADGE_RECOMPUTE:
+                # Recomputed by the process_badge_jobs worker after the response is sent
+                BadgeRecomputeJob.enqueue(self.student_id)
+            else:
+                self.student.update_points_and_badges(self.points)
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -971,9 +1017,539 @@ class QuestionResult(models.Model):
     submitted_at = models.DateTimeField(auto_now_add=True) # Timestamp of when this question was answered
     points_awarded = models.FloatField(default=0) # Points awarded for this specific question
 
+    # is_correct as it is stored in the database, used to compute StudentStats deltas
+    _stored_is_correct = False
+
     class Meta:
         unique_together = ('drill_result', 'content_type', 'object_id'); 
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_is_correct = instance.is_correct
+        return instance
+
+    def save(self, *args, **kwargs):
+        correct_delta = int(bool(self.is_correct)) - int(bool(self._stored_is_correct))
+        super().save(*args, **kwargs)
+        self._stored_is_correct = self.is_correct
+        if correct_delta:
+            StudentStats.apply_correct_delta(self.drill_result.student_id, correct_delta)
+
+class DrillAttempt(models.Model):
+    """
+    Cursor of a student's current run of a drill: which DrillResult new answers go to,
+    how many questions it has answered and how many the drill has. Lets SubmitAnswerView
+    resolve or roll the attempt with a single locked lookup.
+    """
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='drill_attempts')
+    drill = models.ForeignKey(Drill, on_delete=models.CASCADE, related_name='attempts')
+    drill_result = models.ForeignKey(DrillResult, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    run_number = models.IntegerField(default=0)
+    answered_count = models.IntegerField(default=0)
+    question_total = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'drill')
+
+    @property
+    def is_complete(self):
+        return self.drill_result_id is None or self.answered_count >= self.question_total
+
+    @classmethod
+    def resolve(cls, student, drill):
+        """
+        Returns the locked attempt the next answer belongs to, starting a new run
+        (new DrillResult) when there is none yet or the current one is complete.
+        Must be called inside transaction.atomic().
+        """
+        locked = cls.objects.select_for_update().select_related('drill_result').filter(student=student, drill=drill)
+        attempt = locked.first()
+        if attempt is None:
+            # First answer of this student on this drill: create the cursor (or wait for
+            # a concurrent request that is creating it) and lock it
+            last_run = DrillResult.objects.filter(student=student, drill=drill).aggregate(last=models.Max('run_number'))['last'] or 0
+            cls.objects.bulk_create([cls(student=student, drill=drill, run_number=last_run)], ignore_conflicts=True)
+            attempt = locked.get()
+        if not attempt.is_complete:
+            return attempt
+
+        attempt.drill_result = DrillResult.objects.create(
+            student=student,
+            drill=drill,
+            run_number=attempt.run_number + 1,
+            start_time=timezone.now(),
+            completion_time=timezone.now(),
+            points=0.0
+        )
+        attempt.run_number = attempt.drill_result.run_number
+        attempt.answered_count = 0
+        attempt.question_total = drill.count_questions()
+        attempt.save()
+        print(f"Created new DrillResult for attempt {attempt.run_number}")
+        return attempt
+
+    def record_answer(self):
+        """Counts a newly answered question in the current run"""
+        self.answered_count += 1
+        self.save(update_fields=['answered_count', 'updated_at'])
+
+class StudentStats(models.Model):
+    """
+    Running aggregates for one student, updated with deltas on every answer
+    so points and badge checks never rescan the student's whole history.
+    """
+    student = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    drill_points = models.JSONField(default=dict)  # {"<drill_id>": {"run_number": 2, "points": 180.0}} latest run per drill
+    total_points = models.FloatField(default=0)
+    drills_completed = models.IntegerField(default=0)
+    correct_answers = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def _recalculate_totals(self):
+        self.total_points = sum(score.get('points') or 0 for score in self.drill_points.values())
+        self.drills_completed = len(self.drill_points)
+
+    @classmethod
+    def for_student(cls, student_id):
+        """Returns the stats of a student, building them from history the first time"""
+        stats = cls.objects.filter(student_id=student_id).first()
+        return stats if stats else cls.rebuild(student_id)
+
+    @classmethod
+    def rebuild(cls, student_id):
+        """Recompute the stats of a student from all of their DrillResults and QuestionResults"""
+        drill_points = {}
+        results = DrillResult.objects.filter(student_id=student_id).only('drill_id', 'run_number', '_points_encrypted')
+        for result in results:
+            key = str(result.drill_id)
+            if key not in drill_points or result.run_number > drill_points[key]['run_number']:
+                drill_points[key] = {'run_number': result.run_number, 'points': result.points or 0}
+
+        stats = cls(student_id=student_id, drill_points=drill_points)
+        stats._recalculate_totals()
+        stats.correct_answers = QuestionResult.objects.filter(
+            drill_result__student_id=student_id,
+            is_correct=True
+        ).count()
+        stats, _ = cls.objects.update_or_create(
+            student_id=student_id,
+            defaults={
+                'drill_points': stats.drill_points,
+                'total_points': stats.total_points,
+                'drills_completed': stats.drills_completed,
+                'correct_answers': stats.correct_answers,
+            }
+        )
+        return stats
+
+    @classmethod
+    def apply_correct_delta(cls, student_id, delta):
+        """Add delta (+1/-1) to the correct answer counter in a single UPDATE"""
+        updated = cls.objects.filter(student_id=student_id).update(
+            correct_answers=models.F('correct_answers') + delta,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            # First answer we see for this student, the rebuild already includes it
+            cls.rebuild(student_id)
+
+    @classmethod
+    def record_result(cls, drill_result):
+        """Fold a saved DrillResult into the student's latest-run points"""
+        with transaction.atomic():
+            stats = cls.objects.select_for_update().filter(student_id=drill_result.student_id).first()
+            if stats is None:
+                return cls.rebuild(drill_result.student_id)
+
+            key = str(drill_result.drill_id)
+            current = stats.drill_points.get(key)
+            if current and current.get('run_number', 0) > drill_result.run_number:
+                return stats
+
+            stats.drill_points[key] = {
+                'run_number': drill_result.run_number,
+                'points': drill_result.points or 0,
+            }
+            stats._recalculate_totals()
+            stats.save()
+        return stats
+
+class ClassroomLeaderboardEntry(models.Model):
+    """
+    Materialized leaderboard row for one student in one classroom.
+    Holds the latest-run points per drill so leaderboard reads never touch DrillResult.
+    """
+    id = models.AutoField(primary_key=True)
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    drill_scores = models.JSONField(default=dict)  # {"<drill_id>": {"run_number": 2, "points": 180.0}}
+    total_points = models.FloatField(default=0)
+    completed_drills = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('classroom', 'student')
+        indexes = [
+            models.Index(fields=['classroom', '-total_points'], name='leaderboard_rank_idx'),
+        ]
+        ordering = ['-total_points']
+
+    def _recalculate_totals(self):
+        self.total_points = sum(score.get('points') or 0 for score in self.drill_scores.values())
+        self.completed_drills = len(self.drill_scores)
+
+    @classmethod
+    def record_result(cls, drill_result):
+        """Fold a saved DrillResult into its classroom leaderboard row (latest run per drill wins)"""
+        classroom_id = Drill.objects.filter(id=drill_result.drill_id).values_list('classroom_id', flat=True).first()
+        if classroom_id is None:
+            return None
+
+        with transaction.atomic():
+            entry, _ = cls.objects.select_for_update().get_or_create(
+                classroom_id=classroom_id,
+                student_id=drill_result.student_id
+            )
+            key = str(drill_result.drill_id)
+            current = entry.drill_scores.get(key)
+            if current and current.get('run_number', 0) > drill_result.run_number:
+                # An older run was re-saved, the latest run still counts
+                return entry
+
+            entry.drill_scores[key] = {
+                'run_number': drill_result.run_number,
+                'points': drill_result.points or 0,
+            }
+            entry._recalculate_totals()
+            entry.save()
+        return entry
+
+    @classmethod
+    def rebuild(cls, classroom):
+        """Recompute every leaderboard row of a classroom from its DrillResults"""
+        scores_by_student = {}
+        results = DrillResult.objects.filter(drill__classroom=classroom).only('student_id', 'drill_id', 'run_number', '_points_encrypted')
+        for result in results:
+            drill_scores = scores_by_student.setdefault(result.student_id, {})
+            key = str(result.drill_id)
+            if key not in drill_scores or result.run_number > drill_scores[key]['run_number']:
+                drill_scores[key] = {'run_number': result.run_number, 'points': result.points or 0}
+
+        with transaction.atomic():
+            cls.objects.filter(classroom=classroom).delete()
+            entries = []
+            for student_id, drill_scores in scores_by_student.items():
+                entry = cls(classroom=classroom, student_id=student_id, drill_scores=drill_scores)
+                entry._recalculate_totals()
+                entries.append(entry)
+            cls.objects.bulk_create(entries)
+        return len(scores_by_student)
+
+    @classmethod
+    def ranked_for(cls, classroom):
+        """
+        Returns (student, entry) pairs for every enrolled student, highest points first.
+        Students without any result yet get entry=None and rank after everyone else.
+        """
+        students = User.prime_decrypted_names(list(classroom.students.all()))
+        entries = {
+            entry.student_id: entry
+            for entry in cls.objects.filter(classroom=classroom, student__in=students)
+        }
+        ranked = sorted(
+            ((student, entries.get(student.id)) for student in students),
+            key=lambda pair: pair[1].total_points if pair[1] else 0,
+            reverse=True
+        )
+        return ranked
+
+class BadgeRecomputeJob(models.Model):
+    """
+    Pending total-points and badge recomputation for a student, processed by
+    `python manage.py process_badge_jobs`. One row per student, so every
+    submission made before the worker picks it up coalesces into a single job.
+
+    A failing job is retried later (exponential backoff on requested_at) and parked
+    as dead after MAX_ATTEMPTS; a new submission of the student revives it.
+    """
+    student = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='badge_job')
+    requested_at = models.DateTimeField(default=timezone.now)  # the job isn't picked up before this time
+    attempts = models.IntegerField(default=0)
+    dead = models.BooleanField(default=False)  # gave up after MAX_ATTEMPTS failures
+    last_error = models.TextField(blank=True, default='')
+
+    MAX_ATTEMPTS = getattr(settings, 'BADGE_JOB_MAX_ATTEMPTS', 5)
+    RETRY_DELAY = getattr(settings, 'BADGE_JOB_RETRY_DELAY', 30)  # seconds before the first retry, doubled after each failure
+    LEASE = 300  # seconds a claimed job is hidden from other workers while it runs
+
+    class Meta:
+        ordering = ['requested_at']
+
+    @classmethod
+    def enqueue(cls, student_id):
+        """Insert the student's job or refresh the pending one (single upsert)"""
+        cls.objects.bulk_create(
+            [cls(student_id=student_id, requested_at=timezone.now())],
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['requested_at', 'attempts', 'dead', 'last_error'],
+        )
+
+    @classmethod
+    def process_batch(cls, batch_size=50):
+        """
+        Claim up to batch_size due jobs (skipping rows another worker holds) and run them,
+        each in its own transaction.
+
+        Returns:
+            tuple: (jobs that succeeded, jobs that failed)
+        """
+        now = timezone.now()
+        lease_until = now + timedelta(seconds=cls.LEASE)
+        # Claim: push requested_at past the lease so the rows are only locked for this short transaction
+        with transaction.atomic():
+            student_ids = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(dead=False, requested_at__lte=now)
+                .order_by('requested_at')
+                .values_list('student_id', flat=True)[:batch_size]
+            )
+            cls.objects.filter(student_id__in=student_ids).update(requested_at=lease_until)
+
+        succeeded = failed = 0
+        for student in User.objects.filter(id__in=student_ids):
+            try:
+                with transaction.atomic():
+                    student.update_points_and_badges(None)
+                    # A submission made while the job ran re-enqueued it (requested_at changed), keep it then
+                    cls.objects.filter(student_id=student.id, requested_at=lease_until).delete()
+                succeeded += 1
+            except Exception as e:
+                failed += 1
+                job = cls.objects.filter(student_id=student.id).first()
+                if job is None:
+                    continue
+                job.attempts += 1
+                job.last_error = str(e)
+                if job.attempts >= cls.MAX_ATTEMPTS:
+                    job.dead = True
+                    logger.error(f"Giving up recomputing badges for student {student.id} after {job.attempts} attempts: {e}")
+                else:
+                    job.requested_at = timezone.now() + timedelta(seconds=cls.RETRY_DELAY * 2 ** (job.attempts - 1))
+                    logger.warning(f"Error recomputing badges for student {student.id} (attempt {job.attempts}): {e}")
+                job.save(update_fields=['attempts', 'last_error', 'dead', 'requested_at'])
+        return succeeded, failed
+
+class StoredMedia(models.Model):
+    """
+    Index of media saved by content (see api/utils/media.py): one storage object per
+    distinct file, so identical uploads and re-downloaded word-list media reuse it.
+    """
+    digest = models.CharField(max_length=64, unique=True)  # sha256 of the content
+    path = models.CharField(max_length=512)  # storage path (ex. vocabulary/images/<digest>.png)
+    size = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+class StoredMediaSource(models.Model):
+    """
+    Remote url a StoredMedia file was downloaded from. Kept apart from the file, so
+    every url serving content that is already stored is indexed too and isn't downloaded again.
+    """
+    url = models.URLField(max_length=1000, unique=True)
+    media = models.ForeignKey(StoredMedia, on_delete=models.CASCADE, related_name='sources')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.url
+
+class ChunkedUpload(models.Model):
+    """
+    A resumable upload sent in numbered parts (see api/utils/chunked_upload.py).
+    Each part is streamed to the storage backend as it arrives and the parts are
+    assembled into the final file at `path` on completion.
+    """
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    path = models.CharField(max_length=512)  # storage path of the assembled file
+    backend_upload_id = models.CharField(max_length=1024, blank=True)  # ex. the S3 multipart UploadId
+    parts = models.JSONField(default=dict)  # {"1": {"etag": "...", "size": 8388608}}
+    size = models.BigIntegerField(null=True, blank=True)  # total size announced by the client
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def received_size(self):
+        return sum(part.get('size', 0) for part in self.parts.values())
+
+class DefinitionCache(models.Model):
+    """
+    Validated Gemini definition results (see GeminiAIDefinitionView), reused for every
+    request of the same word with the same prompt template and model, so common words
+    cost no tokens after the first request.
+
+    Entries expire after DEFINITION_CACHE_TTL seconds and the least recently used ones
+    are evicted past DEFINITION_CACHE_MAX_ENTRIES rows.
+    """
+    word = models.CharField(max_length=255)  # normalized (see normalize_word)
+    prompt_hash = models.CharField(max_length=64)  # sha256 of the prompt template and system message
+    model = models.CharField(max_length=100)
+    response = models.JSONField()  # {"is_valid": bool, "definitions": [...]}
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    TTL = getattr(settings, 'DEFINITION_CACHE_TTL', 60 * 60 * 24 * 30)
+    MAX_ENTRIES = getattr(settings, 'DEFINITION_CACHE_MAX_ENTRIES', 20000)
+
+    class Meta:
+        unique_together = ('word', 'prompt_hash', 'model')
+
+    def __str__(self):
+        return f"{self.word} ({self.model})"
+
+    # ex.
+    # normalize_word('  Butterfly ') == 'butterfly'
+    @staticmethod
+    def normalize_word(word):
+        return ' '.join(unicodedata.normalize('NFKC', word or '').split()).lower()
+
+    @classmethod
+    def prompt_template_hash(cls, prompt, system_message, word):
+        """hash of the prompt with the word taken out, so every word asked with the same template shares it"""
+        template = prompt or ''
+        if word and word.strip():
+            template = re.sub(rf'\b{re.escape(word.strip())}\b', '{word}', template, flags=re.IGNORECASE)
+        raw = json.dumps([template, system_message or ''])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @classmethod
+    def lookup(cls, word, prompt_hash, model):
+        """
+        Returns:
+            dict: the cached response (counted as a hit)\n
+            None: on a miss or an expired entry
+        """
+        entry = cls.objects.filter(
+            word=word,
+            prompt_hash=prompt_hash,
+            model=model,
+            created_at__gte=timezone.now() - timedelta(seconds=cls.TTL),
+        ).values_list('id', 'response').first()
+        if entry is None:
+            DefinitionCacheCounter.count(misses=1)
+            return None
+
+        cls.objects.filter(id=entry[0]).update(hits=models.F('hits') + 1, last_used_at=timezone.now())
+        DefinitionCacheCounter.count(hits=1)
+        return entry[1]
+
+    @classmethod
+    def lookup_many(cls, keys, model):
+        """
+        lookup of many (word, prompt_hash) keys in one query
+
+        Returns:
+            dict: (word, prompt_hash) -> cached response, only for the keys that hit
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+        rows = cls.objects.filter(
+            word__in={word for word, _ in keys},
+            prompt_hash__in={prompt_hash for _, prompt_hash in keys},
+            model=model,
+            created_at__gte=timezone.now() - timedelta(seconds=cls.TTL),
+        ).values_list('id', 'word', 'prompt_hash', 'response')
+        found = {(word, prompt_hash): (entry_id, response) for entry_id, word, prompt_hash, response in rows if (word, prompt_hash) in keys}
+
+        if found:
+            cls.objects.filter(id__in=[entry_id for entry_id, _ in found.values()]).update(hits=models.F('hits') + 1, last_used_at=timezone.now())
+        DefinitionCacheCounter.count(hits=len(found), misses=len(keys) - len(found))
+        return {key: response for key, (_, response) in found.items()}
+
+    @classmethod
+    def store(cls, word, prompt_hash, model, response):
+        """Insert or refresh the entry (single upsert), then evict past MAX_ENTRIES"""
+        cls.store_many([(word, prompt_hash, response)], model)
+
+    @classmethod
+    def store_many(cls, entries, model):
+        """Insert or refresh [(word, prompt_hash, response)] in one upsert, then evict past MAX_ENTRIES"""
+        # one row per key, an upsert can't touch the same row twice
+        entries = {(word, prompt_hash): response for word, prompt_hash, response in entries}
+        if not entries:
+            return
+        now = timezone.now()
+        cls.objects.bulk_create(
+            [
+                cls(word=word, prompt_hash=prompt_hash, model=model, response=response, created_at=now, last_used_at=now)
+                for (word, prompt_hash), response in entries.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['word', 'prompt_hash', 'model'],
+            update_fields=['response', 'created_at', 'last_used_at'],
+        )
+        cls.evict()
+
+    @classmethod
+    def evict(cls):
+        """Delete expired entries and the least recently used ones past MAX_ENTRIES"""
+        cls.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=cls.TTL)).delete()
+        overflow = cls.objects.count() - cls.MAX_ENTRIES
+        if overflow > 0:
+            oldest = cls.objects.order_by('last_used_at').values_list('id', flat=True)[:overflow]
+            cls.objects.filter(id__in=list(oldest)).delete()
+
+    @classmethod
+    def stats(cls):
+        """
+        lookups that hit and missed (see DefinitionCacheCounter), their hit ratio and the number
+        of entries, read from the database so every process reports the same numbers
+        """
+        counts = DefinitionCacheCounter.objects.aggregate(hits=models.Sum('hits'), misses=models.Sum('misses'))
+        hits, misses = counts['hits'] or 0, counts['misses'] or 0
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'entries': cls.objects.count(),
+        }
+
+class DefinitionCacheCounter(models.Model):
+    """Hits and misses of the DefinitionCache lookups, one row per day"""
+    day = models.DateField(unique=True)
+    hits = models.PositiveBigIntegerField(default=0)
+    misses = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.hits} hits, {self.misses} misses"
+
+    @classmethod
+    def count(cls, hits=0, misses=0):
+        """adds to the counters of today with a single UPDATE (the row is created on the first lookup of the day)"""
+        if not hits and not misses:
+            return
+        day = timezone.localdate()
+        changes = {'hits': models.F('hits') + hits, 'misses': models.F('misses') + misses}
+        if not cls.objects.filter(day=day).update(**changes):
+            cls.objects.bulk_create([cls(day=day)], ignore_conflicts=True)
+            cls.objects.filter(day=day).update(**changes)
+
 class TransferRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
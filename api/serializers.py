@@ -2,6 +2,7 @@ from rest_framework import serializers
 from .models import *
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from collections import Counter
+from .utils.renditions import image_url, rendition_options
 import os
 
 # Serializers that convert the Django Object to JSON, and vice versa
@@ -38,9 +39,8 @@ class BadgeSerializer(serializers.ModelSerializer):
 
     def get_image_url(self, obj):
         request = self.context.get('request')
-        if obj.image and hasattr(obj.image, 'url'):
-            return request.build_absolute_uri(obj.image.url) if request else obj.image.url
-        return None
+        size, fmt = rendition_options(request, self.context)
+        return image_url(obj.image, request, size, fmt)
 
     def get_progress(self, obj):
         request = self.context.get('request')
@@ -190,13 +190,15 @@ class ClassroomSerializer(serializers.ModelSerializer):
 
     def get_students(self, obj):
         request = self.context.get('request')
+        size, fmt = rendition_options(request, self.context, default_size='small')
+        students = User.prime_decrypted_names(list(obj.students.all()))
         return [
             {
                 'id': student.id,
                 'username': student.username,
                 'name': f"{student.get_decrypted_first_name()} {student.get_decrypted_last_name()}",
-                'avatar': request.build_absolute_uri(student.avatar.url) if student.avatar and student.avatar.name else None
-            } for student in obj.students.all()
+                'avatar': image_url(student.avatar, request, size, fmt)
+            } for student in students
         ]
 
     def create(self, validated_data):
@@ -205,6 +207,16 @@ class ClassroomSerializer(serializers.ModelSerializer):
         validated_data['teacher'] = teacher
         return super().create(validated_data)
 
+class DrillListSerializer(serializers.ListSerializer):
+    """
+    Loads the questions and choices of every drill in the page up front
+    so serializing the list takes a fixed number of queries.
+    """
+    def to_representation(self, data):
+        drills = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.prefetch_questions(drills)
+        return super().to_representation(drills)
+
 class DrillSerializer(serializers.ModelSerializer):
     questions = serializers.SerializerMethodField()
     questions_input = serializers.ListField(write_only=True, required=False)
@@ -216,6 +228,46 @@ class DrillSerializer(serializers.ModelSerializer):
     class Meta:
         model = Drill
         fields = ['id', 'title', 'description', 'open_date', 'deadline', 'classroom', 'created_by', 'questions', 'questions_input', 'status', 'custom_wordlist', 'wordlist_name', 'wordlist_id', 'created_at']
+        list_serializer_class = DrillListSerializer
+
+    def prefetch_questions(self, drills):
+        """
+        Bulk-load the questions of the given drills (one query per question type)
+        and the choices of all of them (one query), grouped for the _serialize_* methods.
+        """
+        from django.db.models import Q
+        from .models import DrillChoice
+
+        drill_ids = [drill.id for drill in drills]
+        questions = {drill_id: {type_code: [] for type_code in Drill.question_models()} for drill_id in drill_ids}
+        choices = {}
+        choice_filter = Q(pk__in=[])
+
+        if drill_ids:
+            for type_code, model_cls in Drill.question_models().items():
+                ids = []
+                for question in model_cls.objects.filter(drill_id__in=drill_ids):
+                    questions[question.drill_id][type_code].append(question)
+                    ids.append(question.id)
+                if ids and hasattr(model_cls, 'choices_generic'):
+                    ct = ContentType.objects.get_for_model(model_cls)
+                    choice_filter |= Q(content_type=ct, object_id__in=ids)
+                    choices.update({(ct.id, question_id): [] for question_id in ids})
+
+            if choices:
+                for choice in DrillChoice.objects.filter(choice_filter):
+                    choices[(choice.content_type_id, choice.object_id)].append(choice)
+
+        self._prefetched_questions = getattr(self, '_prefetched_questions', {})
+        self._prefetched_questions.update(questions)
+        self._prefetched_choices = getattr(self, '_prefetched_choices', {})
+        self._prefetched_choices.update(choices)
+
+    def _get_drill_questions(self, drill_obj, type_code):
+        prefetched = getattr(self, '_prefetched_questions', {})
+        if drill_obj.id not in prefetched:
+            self.prefetch_questions([drill_obj])
+        return self._prefetched_questions[drill_obj.id][type_code]
 
     def get_questions(self, obj):
         """
@@ -249,7 +301,7 @@ class DrillSerializer(serializers.ModelSerializer):
         }
         
         # For built-in drills (no custom_wordlist), try to find media URLs
-        if not drill_obj.custom_wordlist and question.word:
+        if not drill_obj.custom_wordlist_id and question.word:
             media_urls = self._get_wordlist_media_urls(question.word)
             payload.update(media_urls)
         
@@ -260,44 +312,9 @@ class DrillSerializer(serializers.ModelSerializer):
         Look up media URLs for a word from built-in wordlists.
         Returns dict with 'image' and 'signVideo' keys if found.
         """
-        import os
-        import json
-        from django.conf import settings
-        
-        wordlist_dir = os.path.join(settings.BASE_DIR, 'api', 'word-lists')
-        if not os.path.exists(wordlist_dir):
-            return {}
-        
-        for filename in os.listdir(wordlist_dir):
-            if not filename.endswith('.json'):
-                continue
-                
-            try:
-                wordlist_file = os.path.join(wordlist_dir, filename)
-                with open(wordlist_file, 'r', encoding='utf-8') as f:
-                    wordlist_data = json.load(f)
-                
-                # Check if this word exists in this wordlist
-                words = wordlist_data.get('words', [])
-                matching_word = next(
-                    (w for w in words if w.get('word', '').lower() == word.lower()), 
-                    None
-                )
-                
-                if matching_word:
-                    # Found the wordlist! Return media URLs
-                    media_urls = {}
-                    if matching_word.get('image_url'):
-                        media_urls['image'] = matching_word['image_url']
-                    if matching_word.get('video_url'):
-                        media_urls['signVideo'] = matching_word['video_url']
-                    return media_urls
-                    
-            except Exception as e:
-                print(f"Error reading wordlist {filename}: {e}")
-                continue
-        
-        return {}
+        from .utils.wordlists import wordlist_registry
+
+        return wordlist_registry.get_media_urls(word)
 
     def _serialize_choices(self, question):
         """
@@ -307,24 +324,33 @@ class DrillSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         choices = []
         
-        for choice in question.choices_generic.all():
+        ct = ContentType.objects.get_for_model(question)
+        prefetched = getattr(self, '_prefetched_choices', {})
+        key = (ct.id, question.id)
+        for choice in (prefetched[key] if key in prefetched else question.choices_generic.all()):
             choices.append({
                 'id': choice.id,
                 'text': choice.text,
                 'is_correct': choice.is_correct,
-                'image': self._get_media_url(choice.image, request),
+                'image': self._get_media_url(choice.image, request, rendition=True),
                 'video': self._get_media_url(choice.video, request),
             })
         
         return choices
 
-    def _get_media_url(self, media_field, request):
+    def _get_media_url(self, media_field, request, rendition=False):
         """
         Get absolute URL for media field, handling both request context and direct URLs.
+        With rendition=True the image size asked for (see rendition_options) is served instead.
         """
         if not media_field:
             return None
-        
+
+        if rendition:
+            size, fmt = rendition_options(request, self.context)
+            if size:
+                return image_url(media_field, request, size, fmt)
+
         if request:
             return request.build_absolute_uri(media_field.url)
         else:
@@ -334,10 +360,8 @@ class DrillSerializer(serializers.ModelSerializer):
         """
         Serialize SmartSelectQuestion (Multiple Choice) questions.
         """
-        from .models import SmartSelectQuestion
-        
         questions = []
-        for question in SmartSelectQuestion.objects.filter(drill=drill_obj):
+        for question in self._get_drill_questions(drill_obj, 'M'):
             payload = self._base_payload(question, 'M', drill_obj)
             payload['answer'] = question.answer
             payload['choices'] = self._serialize_choices(question)
@@ -350,10 +374,8 @@ class DrillSerializer(serializers.ModelSerializer):
         """
         Serialize BlankBustersQuestion (Fill-in-the-blank) questions.
         """
-        from .models import BlankBustersQuestion
-        
         questions = []
-        for question in BlankBustersQuestion.objects.filter(drill=drill_obj):
+        for question in self._get_drill_questions(drill_obj, 'F'):
             payload = self._base_payload(question, 'F', drill_obj)
             payload['letterChoices'] = question.letterChoices
             payload['answer'] = question.answer
@@ -368,10 +390,8 @@ class DrillSerializer(serializers.ModelSerializer):
         """
         Serialize SentenceBuilderQuestion (Drag & Drop) questions.
         """
-        from .models import SentenceBuilderQuestion
-        
         questions = []
-        for question in SentenceBuilderQuestion.objects.filter(drill=drill_obj):
+        for question in self._get_drill_questions(drill_obj, 'D'):
             payload = self._base_payload(question, 'D', drill_obj)
             payload['sentence'] = question.sentence
             payload['dragItems'] = question.dragItems
@@ -384,10 +404,8 @@ class DrillSerializer(serializers.ModelSerializer):
         """
         Serialize PictureWordQuestion (Picture Selection) questions.
         """
-        from .models import PictureWordQuestion
-        
         questions = []
-        for question in PictureWordQuestion.objects.filter(drill=drill_obj):
+        for question in self._get_drill_questions(drill_obj, 'P'):
             payload = self._base_payload(question, 'P', drill_obj)
             payload['pictureWord'] = question.pictureWord
             payload['answer'] = question.answer
@@ -399,10 +417,8 @@ class DrillSerializer(serializers.ModelSerializer):
         """
         Serialize MemoryGameQuestion (Memory Matching) questions.
         """
-        from .models import MemoryGameQuestion
-        
         questions = []
-        for question in MemoryGameQuestion.objects.filter(drill=drill_obj):
+        for question in self._get_drill_questions(drill_obj, 'G'):
             payload = self._base_payload(question, 'G', drill_obj)
             payload['memoryCards'] = question.memoryCards
             questions.append(payload)
@@ -410,8 +426,8 @@ class DrillSerializer(serializers.ModelSerializer):
         return questions
 
     def get_wordlist_id(self, obj):
-        if obj.custom_wordlist:
-            return obj.custom_wordlist.id
+        if obj.custom_wordlist_id:
+            return obj.custom_wordlist_id
         elif obj.wordlist_name:
             return obj.wordlist_name
         return None
@@ -448,6 +464,7 @@ class DrillSerializer(serializers.ModelSerializer):
         # Process questions if provided
         questions_data = validated_data.get('questions_input')
         if questions_data is None:
+            instance.bump_version()
             return instance
                 
         if isinstance(questions_data, str):
@@ -460,6 +477,49 @@ class DrillSerializer(serializers.ModelSerializer):
         instance.update_with_questions(questions_data, request=request)
         return instance
     
+class DrillSummarySerializer(serializers.ModelSerializer):
+    """
+    Drill without its question bodies, used by the drill list.
+    Expects the queryset annotations added by DrillListCreateView (question counts
+    per type and, for students, their current attempt).
+    """
+    created_by = serializers.PrimaryKeyRelatedField(read_only=True)
+    wordlist_id = serializers.SerializerMethodField()
+    question_counts = serializers.SerializerMethodField()
+    question_count = serializers.SerializerMethodField()
+    attempt = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Drill
+        fields = ['id', 'title', 'description', 'open_date', 'deadline', 'classroom', 'created_by', 'status', 'custom_wordlist', 'wordlist_name', 'wordlist_id', 'created_at', 'question_counts', 'question_count', 'attempt']
+
+    def get_wordlist_id(self, obj):
+        if obj.custom_wordlist_id:
+            return obj.custom_wordlist_id
+        elif obj.wordlist_name:
+            return obj.wordlist_name
+        return None
+
+    def get_question_counts(self, obj):
+        return {type_code: getattr(obj, f'{type_code.lower()}_question_count', 0) or 0 for type_code in Drill.question_models()}
+
+    def get_question_count(self, obj):
+        return sum(self.get_question_counts(obj).values())
+
+    def get_attempt(self, obj):
+        """Current attempt of the requesting student (None for teachers)"""
+        if not hasattr(obj, 'attempt_run_number'):
+            return None
+        if obj.attempt_run_number is None:
+            return {'status': 'not_started', 'run_number': 0, 'answered_count': 0, 'question_total': self.get_question_count(obj)}
+        complete = obj.attempt_answered_count >= obj.attempt_question_total
+        return {
+            'status': 'completed' if complete else 'in_progress',
+            'run_number': obj.attempt_run_number,
+            'answered_count': obj.attempt_answered_count,
+            'question_total': obj.attempt_question_total,
+        }
+
 class ClassroomPointsSerializer(serializers.Serializer):
     classroom_id = serializers.IntegerField()
     leaderboard = serializers.ListField(
@@ -526,6 +586,28 @@ class PromptSerializer(serializers.Serializer):
     system_message = serializers.CharField(max_length=1000, required=False, allow_blank=True)
     temperature = serializers.FloatField(required=False, default=0.7)
     max_tokens = serializers.IntegerField(required=False, default=500)
+    word = serializers.CharField(max_length=255, required=False, allow_blank=True)  # the word the prompt is about, lets definitions be cached
+    bypass_cache = serializers.BooleanField(required=False, default=False)  # always ask the model (the new result replaces the cached one)
+
+class DefinitionBatchSerializer(serializers.Serializer):
+    WORD_PLACEHOLDER = "INSERT_WORD_HERE"
+
+    words = serializers.ListField(child=serializers.CharField(max_length=255), allow_empty=False, max_length=100)
+    prompt = serializers.CharField(max_length=5000)  # per-word prompt, the word replaced by INSERT_WORD_HERE
+    system_message = serializers.CharField(max_length=1000, required=False, allow_blank=True)
+    temperature = serializers.FloatField(required=False, default=0.7)
+    bypass_cache = serializers.BooleanField(required=False, default=False)
+
+    def validate_prompt(self, value):
+        if self.WORD_PLACEHOLDER not in value:
+            raise serializers.ValidationError(f"The prompt must contain {self.WORD_PLACEHOLDER} where the word goes.")
+        return value
+
+    def validate_words(self, value):
+        words = [word.strip() for word in value if word.strip()]
+        if not words:
+            raise serializers.ValidationError("Send at least one word.")
+        return words
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -637,6 +719,9 @@ class WordListSerializer(serializers.ModelSerializer):
             for word in words_to_delete:
                 word.delete()
 
+            # Drills built from this list cache their payload per version
+            Drill.bump_versions(custom_wordlist=instance)
+
         return instance
 
 class QuestionResultSerializer(serializers.ModelSerializer):
@@ -672,9 +757,8 @@ class DrillResultSerializer(serializers.ModelSerializer):
         first_name = obj.student.get_decrypted_first_name() or ''
         last_name = obj.student.get_decrypted_last_name() or ''
         request = self.context.get('request')
-        avatar_url = None
-        if obj.student.avatar:
-            avatar_url = request.build_absolute_uri(obj.student.avatar.url) if request else obj.student.avatar.url
+        size, fmt = rendition_options(request, self.context, default_size='small')
+        avatar_url = image_url(obj.student.avatar, request, size, fmt)
         return {
             'id': obj.student.id,
             'username': obj.student.username,
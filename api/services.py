@@ -1,46 +1,284 @@
 import requests
+import httpx
+import asyncio
 import json
+import hashlib
+import queue
+import threading
+import weakref
+from contextlib import contextmanager
 from django.conf import settings
 
+# Timeout (seconds) of the async calls to OpenRouter
+OPENROUTER_TIMEOUT = getattr(settings, 'OPENROUTER_TIMEOUT', 60)
+
+
+def _per_loop(store, factory):
+  """
+  the object of store for the running event loop, created by factory on first use (async clients
+  can't be shared between loops). Only meant for the long-lived loop of the ASGI server: the
+  views call the async methods under ASGI only (see api.utils.async_views.call_service).
+  """
+  loop = asyncio.get_running_loop()
+  value = store.get(loop)
+  if value is None:
+    value = store[loop] = factory()
+  return value
+
 class OpenRouterService:
-  def __init__(self, api_key):
+  def __init__(self, api_key, session=None, async_client_factory=None):
     self.base_url = "https://openrouter.ai/api/v1/chat/completions"
     self.headers = {
       "Authorization": f"Bearer {api_key}",
       "Content-Type": "application/json",
     }
     self.model_name = "google/gemma-3-27b-it:free" # free version; remove ':free' if Openrouter account has credits
+    self.session = session or requests # anything with post(...); pass a fake one to test without the network
+    # returns an httpx.AsyncClient (or a fake one) for the async methods
+    self.async_client_factory = async_client_factory or (lambda: httpx.AsyncClient(timeout=OPENROUTER_TIMEOUT))
+    self._async_clients = weakref.WeakKeyDictionary()
 
-  def generate_text(self, prompt, system_message=None, temperature=0.7, max_tokens=500):
+  def _messages(self, prompt, system_message=None):
     messages = []
     if system_message:
       messages.append({"role": "system", "content": system_message})
     messages.append({"role": "user", "content": prompt})
+    return messages
 
+  def generate_text(self, prompt, system_message=None, temperature=0.7, max_tokens=500):
     payload = {
       "model": self.model_name,
-      "messages": messages,
+      "messages": self._messages(prompt, system_message),
       "temperature": temperature,
       "max_tokens": max_tokens,
-      "stream": False # Set to True for streaming responses
+      "stream": False # see stream_text for streaming responses
     }
 
     try:
-      response = requests.post(self.base_url, headers=self.headers, data=json.dumps(payload))
+      response = self.session.post(self.base_url, headers=self.headers, data=json.dumps(payload))
       response.raise_for_status()  # Raise an exception for HTTP errors
       return response.json()
     except requests.exceptions.RequestException as e:
       print(f"Error calling OpenRouter API: {e}")
       return None
     
+  def stream_text(self, prompt, system_message=None, temperature=0.7, max_tokens=500):
+    """
+    streams the completion as it is generated
+
+    Yields:
+      str: the text chunks\n
+      dict: {"usage": {...}} at the end, when OpenRouter reports the token usage
+
+    Raises:
+      requests.exceptions.RequestException: if the request fails
+    """
+    payload = {
+      "model": self.model_name,
+      "messages": self._messages(prompt, system_message),
+      "temperature": temperature,
+      "max_tokens": max_tokens,
+      "stream": True
+    }
+
+    response = self.session.post(self.base_url, headers=self.headers, data=json.dumps(payload), stream=True)
+    try:
+      response.raise_for_status()
+      # server-sent events: "data: {...}" lines, ": ..." keep-alive comments, "data: [DONE]" at the end
+      for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+          continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+          break
+        try:
+          chunk = json.loads(data)
+        except ValueError:
+          continue
+        if chunk.get("error"):
+          raise requests.exceptions.RequestException(chunk["error"].get("message", "OpenRouter stream error"))
+        for choice in chunk.get("choices", []):
+          text = (choice.get("delta") or {}).get("content")
+          if text:
+            yield text
+        if chunk.get("usage"):
+          yield {"usage": chunk["usage"]}
+    finally:
+      response.close()
+
   def check_limit(self):
     try:
-      response = requests.get("https://openrouter.ai/api/v1/auth/key", headers=self.headers)
+      response = self.session.get("https://openrouter.ai/api/v1/auth/key", headers=self.headers)
       response.raise_for_status()
       return response.json()
     except requests.exceptions.RequestException as e:
       print(f"Error calling OpenRouter API: {e}")
       return None
 
+  async def agenerate_text(self, prompt, system_message=None, temperature=0.7, max_tokens=500):
+    """async version of generate_text, the worker isn't held while OpenRouter answers"""
+    payload = {
+      "model": self.model_name,
+      "messages": self._messages(prompt, system_message),
+      "temperature": temperature,
+      "max_tokens": max_tokens,
+      "stream": False
+    }
+
+    try:
+      client = _per_loop(self._async_clients, self.async_client_factory)
+      response = await client.post(self.base_url, headers=self.headers, content=json.dumps(payload))
+      response.raise_for_status()
+      return response.json()
+    except httpx.HTTPError as e:
+      print(f"Error calling OpenRouter API: {e}")
+      return None
+
+  async def acheck_limit(self):
+    """async version of check_limit"""
+    try:
+      client = _per_loop(self._async_clients, self.async_client_factory)
+      response = await client.get("https://openrouter.ai/api/v1/auth/key", headers=self.headers)
+      response.raise_for_status()
+      return response.json()
+    except httpx.HTTPError as e:
+      print(f"Error calling OpenRouter API: {e}")
+      return None
+
 # Initialize the service with API key from settings
-openrouter_service = OpenRouterService(api_key=settings.OPENROUTER_API_KEY)
\ No newline at end of file
+openrouter_service = OpenRouterService(api_key=settings.OPENROUTER_API_KEY)
+
+
+# Number of Gemini clients kept open per process (each keeps its own HTTP connections)
+GEMINI_CLIENT_POOL_SIZE = getattr(settings, 'GEMINI_CLIENT_POOL_SIZE', 4)
+GEMINI_MODEL = getattr(settings, 'GEMINI_MODEL', "gemini-2.5-flash")
+
+
+def _default_gemini_client():
+  from google import genai
+  return genai.Client(api_key=settings.GEMINI_API_KEY) if settings.GEMINI_API_KEY else genai.Client()
+
+
+class _InFlight:
+  def __init__(self):
+    self.done = threading.Event()
+    self.response = None
+    self.error = None
+
+
+class GeminiService:
+  """
+  process-wide access to Gemini:
+  - clients are created once and reused by every request (at most pool_size of them)
+  - identical requests running at the same time (same model, prompt and config, so the
+    same word, system message and temperature) share one upstream call
+
+  client_factory returns a new client; pass a fake one (anything with
+  models.generate_content) to use the service without the network.
+  """
+  def __init__(self, client_factory=None, pool_size=GEMINI_CLIENT_POOL_SIZE, model=GEMINI_MODEL):
+    self.client_factory = client_factory or _default_gemini_client
+    self.model = model
+    self.pool_size = pool_size
+    self._pool = queue.LifoQueue()
+    self._slots = threading.BoundedSemaphore(pool_size)
+    self._lock = threading.Lock()
+    self._in_flight = {}
+    # async side: one client (its .aio API handles concurrent calls) and in-flight calls per event loop
+    self._async_clients = weakref.WeakKeyDictionary()
+    self._async_in_flight = weakref.WeakKeyDictionary()
+
+  @contextmanager
+  def client(self):
+    """borrows a pooled client (created on first use)"""
+    self._slots.acquire()
+    try:
+      try:
+        client = self._pool.get_nowait()
+      except queue.Empty:
+        client = self.client_factory()
+      yield client
+      self._pool.put(client)
+    finally:
+      self._slots.release()
+
+  def _request_key(self, model, contents, config):
+    config_data = config.model_dump_json(exclude_none=True) if hasattr(config, 'model_dump_json') else repr(config)
+    raw = json.dumps([model, contents, config_data], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+  def generate_content(self, contents, config=None, model=None):
+    """
+    calls models.generate_content, or waits for the identical call already running
+
+    Returns:
+      the GenerateContentResponse (shared by the coalesced callers, don't modify it)
+    """
+    model = model or self.model
+    key = self._request_key(model, contents, config)
+
+    with self._lock:
+      in_flight = self._in_flight.get(key)
+      leader = in_flight is None
+      if leader:
+        in_flight = self._in_flight[key] = _InFlight()
+
+    if not leader:
+      in_flight.done.wait()
+      if in_flight.error is not None:
+        raise in_flight.error
+      return in_flight.response
+
+    try:
+      with self.client() as client:
+        in_flight.response = client.models.generate_content(model=model, contents=contents, config=config)
+      return in_flight.response
+    except Exception as e:
+      in_flight.error = e
+      raise
+    finally:
+      with self._lock:
+        self._in_flight.pop(key, None)
+      in_flight.done.set()
+
+  def generate_content_stream(self, contents, config=None, model=None):
+    """
+    streams models.generate_content_stream (streams are not coalesced).
+
+    A stream lasts as long as the client reads it, so it doesn't take one of the pool_size
+    slots (that would leave the short calls waiting behind slow readers): it uses an idle
+    pooled client, or a new one, and returns it to the pool if the pool isn't full.
+
+    Yields:
+      the GenerateContentResponse chunks
+    """
+    try:
+      client = self._pool.get_nowait()
+    except queue.Empty:
+      client = self.client_factory()
+    yield from client.models.generate_content_stream(model=model or self.model, contents=contents, config=config)
+    if self._pool.qsize() < self.pool_size:
+      self._pool.put(client)
+
+  async def _agenerate(self, model, contents, config):
+    client = _per_loop(self._async_clients, self.client_factory)
+    return await client.aio.models.generate_content(model=model, contents=contents, config=config)
+
+  async def agenerate_content(self, contents, config=None, model=None):
+    """
+    async version of generate_content on the Gemini async client (client.aio), identical
+    requests in flight on the event loop share one call
+    """
+    model = model or self.model
+    key = self._request_key(model, contents, config)
+    in_flight = _per_loop(self._async_in_flight, dict)
+
+    task = in_flight.get(key)
+    if task is None:
+      task = in_flight[key] = asyncio.ensure_future(self._agenerate(model, contents, config))
+      task.add_done_callback(lambda _: in_flight.pop(key, None))
+    # a caller that goes away doesn't cancel the call for the others
+    return await asyncio.shield(task)
+
+# Shared Gemini service, clients are only created when the first request needs one
+gemini_service = GeminiService()
@@ -1,3 +1,791 @@
-from django.test import TestCase
+import asyncio
+import copy
+from datetime import timedelta
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from .models import User, Role, Classroom, Drill, DrillResult, StudentStats, ClassroomLeaderboardEntry, BadgeRecomputeJob, ChunkedUpload, DefinitionCache, DefinitionCacheCounter, DrillAttempt, DrillChoice, StoredMedia, StoredMediaSource, WordList
+from .serializers import DrillSerializer
+from .services import GeminiService
+from .utils import chunked_upload, renditions
+from .utils.media import MediaBatch, store_upload
+from .utils.renditions import rendition_options
+from .utils.sse import sse_event, _iterate_in_thread
+from .utils.wordlists import WordListRegistry
+from .views import DrillRetrieveUpdateDestroyView
+from .viewsets.gen_ai import GenAIStreamView, GeminiAIGenericStreamView
 
-# Create your tests here.
+
+class DrillFixtureMixin:
+    """A teacher, two students in a classroom and a published drill with two questions"""
+
+    QUESTIONS = [
+        {'type': 'M', 'text': 'q1', 'word': 'air', 'answer': '1', 'choices': [{'text': 'a'}, {'text': 'b'}]},
+        {'type': 'F', 'text': 'q2', 'word': 'moon', 'answer': 'moon', 'pattern': 'm__n', 'choices': [{'text': 'x'}]},
+    ]
+    ANSWERS = {'M': 1, 'F': 'moon'}
+
+    @staticmethod
+    def make_user(username, role):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pw', first_name='Ann', last_name='Lee')
+        Role.objects.create(user=user, name=role)
+        return user
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def setUp(self):
+        super().setUp()
+        self.teacher = self.make_user('teacher', 'teacher')
+        self.student = self.make_user('student1', 'student')
+        self.other_student = self.make_user('student2', 'student')
+        self.classroom = Classroom.objects.create(name='Room', teacher=self.teacher)
+        self.classroom.students.add(self.student, self.other_student)
+        self.drill_id, self.question_ids = self.create_drill('D1')
+
+    def create_drill(self, title):
+        response = self.client_for(self.teacher).post('/api/drills/', {
+            'title': title,
+            'open_date': '2020-01-01T00:00:00Z',
+            'deadline': '2099-01-01T00:00:00Z',
+            'classroom': self.classroom.id,
+            'status': 'published',
+            'questions_input': self.QUESTIONS,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        drill = response.json()
+        return drill['id'], {q['type']: q['id'] for q in drill['questions']}
+
+    def submit(self, student, question_type, drill_id=None, question_ids=None, points=100, correct=True):
+        drill_id = drill_id or self.drill_id
+        question_ids = question_ids or self.question_ids
+        answer = self.ANSWERS[question_type] if correct else 'nope'
+        response = self.client_for(student).post(
+            f'/api/drills/{drill_id}/questions/{question_ids[question_type]}/submit/',
+            {'answer': answer, 'question_type': question_type, 'points': points},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+
+@override_settings(DEFER_BADGE_RECOMPUTE=False)
+class StudentStatsTests(DrillFixtureMixin, TestCase):
+    def assertStatsMatchRebuild(self, student):
+        stats = StudentStats.objects.get(student=student)
+        rebuilt = StudentStats.rebuild(student.id)
+        self.assertEqual(
+            (stats.drill_points, stats.total_points, stats.drills_completed, stats.correct_answers),
+            (rebuilt.drill_points, rebuilt.total_points, rebuilt.drills_completed, rebuilt.correct_answers)
+        )
+
+    def test_incremental_stats_match_rebuild(self):
+        self.submit(self.student, 'M', points=40)
+        self.submit(self.student, 'F', points=60, correct=False)
+        self.submit(self.student, 'F', points=60)
+        self.submit(self.other_student, 'M', points=10)
+
+        stats = StudentStats.objects.get(student=self.student)
+        self.assertEqual(stats.drills_completed, 1)
+        self.assertEqual(stats.correct_answers, 2)
+        self.assertStatsMatchRebuild(self.student)
+        self.assertStatsMatchRebuild(self.other_student)
+
+    def test_new_run_replaces_drill_points(self):
+        self.submit(self.student, 'M', points=40)
+        self.submit(self.student, 'F', points=60)
+        # Both questions answered, the next answer starts run 2
+        self.submit(self.student, 'M', points=5)
+
+        stats = StudentStats.objects.get(student=self.student)
+        self.assertEqual(stats.drill_points[str(self.drill_id)]['run_number'], 2)
+        self.assertEqual(stats.total_points, 5)
+        self.assertStatsMatchRebuild(self.student)
+
+    def test_deleting_a_drill_removes_its_points(self):
+        other_drill_id, other_question_ids = self.create_drill('D2')
+        self.submit(self.student, 'M', points=40)
+        self.submit(self.student, 'M', drill_id=other_drill_id, question_ids=other_question_ids, points=7)
+
+        response = self.client_for(self.teacher).delete(f'/api/drills/{self.drill_id}/')
+        self.assertEqual(response.status_code, 204)
+
+        stats = StudentStats.objects.get(student=self.student)
+        self.assertEqual(list(stats.drill_points), [str(other_drill_id)])
+        self.assertEqual(stats.total_points, 7)
+        self.assertEqual(User.objects.get(id=self.student.id).total_points, 7)
+        entry = ClassroomLeaderboardEntry.objects.get(classroom=self.classroom, student=self.student)
+        self.assertEqual(entry.total_points, 7)
+
+
+@override_settings(DEFER_BADGE_RECOMPUTE=True)
+class BadgeRecomputeJobTests(DrillFixtureMixin, TestCase):
+    def test_submissions_coalesce_into_one_job(self):
+        self.submit(self.student, 'M', points=40)
+        self.submit(self.student, 'F', points=60)
+        self.assertEqual(BadgeRecomputeJob.objects.filter(student=self.student).count(), 1)
+
+        self.assertEqual(BadgeRecomputeJob.process_batch(), (1, 0))
+        self.assertFalse(BadgeRecomputeJob.objects.exists())
+        self.assertEqual(User.objects.get(id=self.student.id).total_points, 100)
+
+    def test_failing_job_backs_off_then_dies(self):
+        self.submit(self.student, 'M', points=40)
+        with mock.patch.object(User, 'update_points_and_badges', side_effect=RuntimeError('boom')):
+            self.assertEqual(BadgeRecomputeJob.process_batch(), (0, 1))
+            job = BadgeRecomputeJob.objects.get(student=self.student)
+            self.assertEqual((job.attempts, job.dead, job.last_error), (1, False, 'boom'))
+            self.assertGreater(job.requested_at, timezone.now())
+            # Not due yet
+            self.assertEqual(BadgeRecomputeJob.process_batch(), (0, 0))
+
+            for attempt in range(2, BadgeRecomputeJob.MAX_ATTEMPTS + 1):
+                BadgeRecomputeJob.objects.update(requested_at=timezone.now() - timedelta(seconds=1))
+                self.assertEqual(BadgeRecomputeJob.process_batch(), (0, 1))
+
+        job = BadgeRecomputeJob.objects.get(student=self.student)
+        self.assertTrue(job.dead)
+        BadgeRecomputeJob.objects.update(requested_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(BadgeRecomputeJob.process_batch(), (0, 0))
+
+        # A new submission revives it
+        self.submit(self.student, 'F', points=60)
+        job = BadgeRecomputeJob.objects.get(student=self.student)
+        self.assertEqual((job.attempts, job.dead), (0, False))
+        self.assertEqual(BadgeRecomputeJob.process_batch(), (1, 0))
+
+    def test_once_exits_when_every_job_fails(self):
+        self.submit(self.student, 'M')
+        self.submit(self.other_student, 'M')
+        out = StringIO()
+        with mock.patch.object(User, 'update_points_and_badges', side_effect=RuntimeError('boom')):
+            call_command('process_badge_jobs', '--once', '--batch-size', '1', stdout=out)
+        self.assertIn('Successfully processed 0 badge job(s)', out.getvalue())
+        self.assertEqual(BadgeRecomputeJob.objects.filter(attempts=1).count(), 2)
+
+
+class QuestionManifestTests(DrillFixtureMixin, TestCase):
+    def test_saving_questions_skips_manifests_cached_by_other_processes(self):
+        drill = Drill.objects.get(id=self.drill_id)
+        stale_key = drill._question_manifest_key()
+        self.assertEqual(drill.question_manifest()['total'], 2)
+
+        drill.update_with_questions(copy.deepcopy(self.QUESTIONS[:1]))
+        # Another worker still holds the manifest of the previous version
+        cache.set(stale_key, {'total': 2, 'questions': {}})
+
+        self.assertEqual(Drill.objects.get(id=self.drill_id).question_manifest()['total'], 1)
+
+    def test_batch_submit_refreshes_a_stale_manifest(self):
+        drill = Drill.objects.get(id=self.drill_id)
+        cache.set(drill._question_manifest_key(), {'total': 2, 'questions': {}})
+
+        response = self.client_for(self.student).post(f'/api/drills/{self.drill_id}/submit/', {'answers': [
+            {'question_id': self.question_ids['M'], 'question_type': 'M', 'answer': 1, 'points': 100},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+
+class TempStorageMixin:
+    """Files go to a temporary filesystem storage, removed after each test"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        storages = {'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}}
+        settings_override = override_settings(STORAGES=storages, MEDIA_ROOT=self.media_root, CHUNKED_UPLOAD_BACKEND=None)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        temp_dir_patch = mock.patch.object(chunked_upload, 'CHUNKED_UPLOAD_TEMP_DIR', os.path.join(self.media_root, 'parts'))
+        temp_dir_patch.start()
+        self.addCleanup(temp_dir_patch.stop)
+
+
+class MediaBatchTests(TempStorageMixin, TestCase):
+    def stored_files(self, folder):
+        return default_storage.listdir(folder)[1]
+
+    def test_file_used_in_two_folders_is_saved_once(self):
+        f = SimpleUploadedFile('cat.png', b'not really a png', content_type='image/png')
+        paths = []
+        media = MediaBatch()
+        media.save_upload(f, 'vocabulary/images/cat.png', paths.append)
+        media.save_upload(f, 'drills/images/cat.png', paths.append)
+        self.assertEqual(len(media), 1)
+        media.run()
+
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(paths[0], paths[1])
+        self.assertTrue(paths[0].startswith('vocabulary/images/'))
+        self.assertEqual(StoredMedia.objects.get().digest, hashlib.sha256(b'not really a png').hexdigest())
+
+    def test_identical_uploads_share_the_first_stored_file(self):
+        paths = []
+        for name in ('cat.png', 'copy.png', 'again.png'):
+            media = MediaBatch()
+            media.save_upload(SimpleUploadedFile(name, b'same bytes', content_type='image/png'), f'vocabulary/images/{name}', paths.append)
+            media.save_upload(SimpleUploadedFile(name, b'same bytes', content_type='image/png'), f'drills/images/{name}', paths.append)
+            media.run()
+
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(self.stored_files('vocabulary/images'), [os.path.basename(paths[0])])
+        self.assertEqual(self.stored_files('drills/images'), [])
+
+    def test_url_of_already_stored_content_is_downloaded_once(self):
+        upload_path = store_upload(SimpleUploadedFile('cat.png', b'cat bytes', content_type='image/png'), 'vocabulary/images/cat.png')
+        response = SimpleNamespace(status_code=200, content=b'cat bytes', headers={'Content-Type': 'image/png'})
+        session = mock.Mock(get=mock.Mock(return_value=response))
+        paths = []
+        with mock.patch('api.utils.media.get_http_session', return_value=session):
+            for _ in range(3):
+                media = MediaBatch()
+                media.save_remote('https://example.com/cat.png', 'vocabulary/images/cat.png', paths.append)
+                media.run()
+
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(paths, [upload_path] * 3)
+        self.assertEqual(StoredMediaSource.objects.get().media.path, upload_path)
+        self.assertEqual(self.stored_files('vocabulary/images'), [os.path.basename(upload_path)])
+
+
+class ChunkedUploadTests(TempStorageMixin, DrillFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.student)
+
+    def start_upload(self, size):
+        response = self.client.post('/api/uploads/', {'filename': 'clip.mp4', 'content_type': 'video/mp4', 'size': size}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def put_part(self, upload_id, number, body):
+        return self.client.generic('PUT', f'/api/uploads/{upload_id}/parts/{number}/', body, content_type='application/octet-stream')
+
+    def test_parts_are_assembled_in_order(self):
+        upload_id = self.start_upload(9)
+        # Parts may arrive out of order
+        self.assertEqual(self.put_part(upload_id, 2, b'def').status_code, 200)
+        self.assertEqual(self.put_part(upload_id, 3, b'ghi').status_code, 200)
+        self.assertEqual(self.put_part(upload_id, 1, b'abc').status_code, 200)
+
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 201, response.content)
+        path = ChunkedUpload.objects.get(id=upload_id).path
+        with default_storage.open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'abcdefghi')
+
+    def test_missing_parts_are_reported(self):
+        upload_id = self.start_upload(None)
+        self.put_part(upload_id, 1, b'abc')
+        self.put_part(upload_id, 3, b'ghi')
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['missing'], [2])
+
+    def test_empty_part_is_rejected(self):
+        upload_id = self.start_upload(None)
+        self.assertEqual(self.put_part(upload_id, 1, b'').status_code, 400)
+
+    def test_part_too_large_leaves_no_temporary_file(self):
+        upload_id = self.start_upload(None)
+        with mock.patch.object(chunked_upload, 'CHUNKED_UPLOAD_MAX_PART_SIZE', 4):
+            self.assertEqual(self.put_part(upload_id, 1, b'abcdefgh').status_code, 413)
+        self.assertEqual(os.listdir(os.path.join(chunked_upload.CHUNKED_UPLOAD_TEMP_DIR, upload_id)), [])
+
+
+class DirectUploadTests(TempStorageMixin, DrillFixtureMixin, TestCase):
+    def presign(self, size):
+        response = self.client_for(self.student).post('/api/uploads/direct/', {'filename': 'cat.png', 'content_type': 'image/png', 'size': size}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_local_upload_is_received_and_completed(self):
+        data = self.presign(5)
+        response = APIClient().generic('PUT', data['upload']['url'], b'hello', content_type='image/png')
+        self.assertEqual(response.status_code, 204, response.content)
+
+        response = self.client_for(self.student).post('/api/uploads/direct/complete/', {'token': data['token']}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        with default_storage.open(data['path'], 'rb') as f:
+            self.assertEqual(f.read(), b'hello')
+
+    def test_empty_body_is_rejected(self):
+        data = self.presign(5)
+        response = APIClient().generic('PUT', data['upload']['url'], b'', content_type='image/png')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(default_storage.exists(data['path']))
+
+
+class RenditionTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        image = io.BytesIO()
+        Image.new('RGB', (600, 300), (200, 30, 30)).save(image, format='PNG')
+        self.name = default_storage.save('badges/red.png', ContentFile(image.getvalue()))
+
+    def test_unknown_size_and_format_fall_back_to_allowed_values(self):
+        request = RequestFactory().get('/', {'image_size': 'huge', 'image_format': 'gif'})
+        self.assertEqual(rendition_options(request), (None, renditions.DEFAULT_RENDITION_FORMAT))
+        request = RequestFactory().get('/', {'image_size': 'small', 'image_format': 'jpeg'})
+        self.assertEqual(rendition_options(request), ('small', 'jpeg'))
+
+    def test_lookup_never_renders(self):
+        with mock.patch.object(renditions, 'render_image') as render:
+            self.assertIsNone(renditions.get_rendition(self.name, 'small'))
+            self.assertIsNone(renditions.get_rendition(self.name, 'small'))
+        render.assert_not_called()
+
+        renditions.generate_renditions(self.name)
+        cache.clear()
+        path = renditions.get_rendition(self.name, 'small')
+        with default_storage.open(path, 'rb') as f, Image.open(f) as image:
+            self.assertEqual(image.size, (128, 64))
+
+    def test_every_format_is_generated(self):
+        renditions.generate_renditions(self.name, sizes=['small'])
+        cache.clear()
+        self.assertEqual(renditions.get_rendition(self.name, 'small', 'jpeg'), 'renditions/small/badges/red.png.jpg')
+        self.assertEqual(renditions.get_rendition(self.name, 'small', 'webp'), 'renditions/small/badges/red.png.webp')
+        field = SimpleNamespace(name=self.name, url=default_storage.url(self.name))
+        self.assertTrue(renditions.image_url(field, size='small', fmt='jpeg').endswith('renditions/small/badges/red.png.jpg'))
+
+    def test_failures_are_remembered(self):
+        broken = default_storage.save('badges/broken.png', ContentFile(b'not an image'))
+        with mock.patch.object(renditions, 'render_image', wraps=renditions.render_image) as render:
+            self.assertIsNone(renditions.create_rendition(broken, 'small'))
+            self.assertIsNone(renditions.create_rendition(broken, 'small'))
+        self.assertEqual(render.call_count, 1)
+
+
+class FakeGeminiClient:
+    """Stands in for genai.Client: records the calls and blocks them until release is set"""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.models = self
+
+    def generate_content(self, model, contents, config=None):
+        with self.owner.lock:
+            self.owner.calls.append(contents)
+        self.owner.started.set()
+        self.owner.release.wait(5)
+        if contents == 'fail':
+            raise RuntimeError('upstream error')
+        return f'response to {contents}'
+
+
+class GeminiServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.clients = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def client_factory(self):
+        client = FakeGeminiClient(self)
+        self.clients.append(client)
+        return client
+
+    def run_concurrently(self, service, prompts):
+        results = [None] * len(prompts)
+
+        def call(index, prompt):
+            try:
+                results[index] = service.generate_content(prompt)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=call, args=(index, prompt)) for index, prompt in enumerate(prompts)]
+        threads[0].start()
+        self.started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        # Let the other callers reach the call in flight before it finishes
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_identical_requests_share_one_call(self):
+        service = GeminiService(client_factory=self.client_factory)
+        results = self.run_concurrently(service, ['cat'] * 4)
+        self.assertEqual(self.calls, ['cat'])
+        self.assertEqual(results, ['response to cat'] * 4)
+
+    def test_error_reaches_every_coalesced_caller(self):
+        service = GeminiService(client_factory=self.client_factory)
+        results = self.run_concurrently(service, ['fail'] * 3)
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        # Nothing is left in flight, the next call goes upstream again
+        self.assertEqual(service._in_flight, {})
+
+    def test_clients_are_reused(self):
+        self.release.set()
+        service = GeminiService(client_factory=self.client_factory, pool_size=2)
+        for prompt in ['cat', 'dog', 'cow']:
+            service.generate_content(prompt)
+        self.assertEqual(len(self.clients), 1)
+        self.assertEqual(self.calls, ['cat', 'dog', 'cow'])
+
+    def test_pool_size_bounds_the_clients(self):
+        service = GeminiService(client_factory=self.client_factory, pool_size=2)
+        results = self.run_concurrently(service, ['cat', 'dog', 'cow', 'pig'])
+        self.assertEqual(sorted(self.calls), ['cat', 'cow', 'dog', 'pig'])
+        self.assertEqual(len(self.clients), 2)
+        self.assertEqual(results, [f'response to {prompt}' for prompt in ['cat', 'dog', 'cow', 'pig']])
+
+
+class FakeOpenRouter:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream_text(self, prompt, system_message=None, temperature=None, max_tokens=None):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class FakeGeminiStreamClient:
+    def __init__(self):
+        self.models = self
+
+    def generate_content_stream(self, model, contents, config=None):
+        usage = SimpleNamespace(prompt_token_count=3, candidates_token_count=2, total_token_count=5)
+        yield SimpleNamespace(text='Hel', usage_metadata=None)
+        yield SimpleNamespace(text='lo', usage_metadata=usage)
+
+
+class StreamTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(DrillFixtureMixin.make_user('teacher', 'teacher'))
+
+    def stream(self, url):
+        response = self.client.post(url, {'prompt': 'hi'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_event_framing(self):
+        self.assertEqual(sse_event({'text': 'Hel'}), 'data: {"text": "Hel"}\n\n')
+        self.assertEqual(sse_event({'tokens': None}, event='done'), 'event: done\ndata: {"tokens": null}\n\n')
+
+    def test_openrouter_stream(self):
+        fake = FakeOpenRouter(['Hel', 'lo', {'usage': {'prompt_tokens': 3, 'completion_tokens': 2, 'total_tokens': 5}}])
+        with mock.patch.object(GenAIStreamView, 'service', fake):
+            body = self.stream('/api/gen-ai/openrouter/stream/')
+        self.assertEqual(body, ''.join([
+            sse_event({'text': 'Hel'}),
+            sse_event({'text': 'lo'}),
+            sse_event({'tokens': {'prompt_tokens': 3, 'output_tokens': 2, 'total_tokens': 5}}, event='done'),
+        ]))
+
+    def test_error_midway_ends_with_an_error_event(self):
+        with mock.patch.object(GenAIStreamView, 'service', FakeOpenRouter(['Hel', RuntimeError('gone')])):
+            body = self.stream('/api/gen-ai/openrouter/stream/')
+        events = body.split('\n\n')
+        self.assertEqual(events[0], 'data: {"text": "Hel"}')
+        self.assertTrue(events[1].startswith('event: error\ndata: '))
+        self.assertEqual(events[2:], [''])
+
+    def test_gemini_stream(self):
+        service = GeminiService(client_factory=FakeGeminiStreamClient, pool_size=1)
+        with mock.patch.object(GeminiAIGenericStreamView, 'service', service):
+            body = self.stream('/api/gen-ai/stream/')
+        self.assertEqual(body, ''.join([
+            sse_event({'text': 'Hel'}),
+            sse_event({'text': 'lo'}),
+            sse_event({'tokens': {'prompt_tokens': 3, 'output_tokens': 2, 'total_tokens': 5}}, event='done'),
+        ]))
+        # The stream gave its client back to the pool without holding a slot
+        self.assertEqual(service._pool.qsize(), 1)
+
+
+class IterateInThreadTests(SimpleTestCase):
+    def test_disconnect_waits_for_the_pending_next_before_closing(self):
+        in_next = threading.Event()
+        release = threading.Event()
+        closed = []
+
+        def events():
+            try:
+                yield 'first'
+                in_next.set()
+                release.wait(5)
+                yield 'second'
+            finally:
+                closed.append(True)
+
+        async def consume():
+            stream = _iterate_in_thread(events())
+            self.assertEqual(await stream.__anext__(), 'first')
+            task = asyncio.ensure_future(stream.__anext__())
+            await asyncio.get_running_loop().run_in_executor(None, in_next.wait, 5)
+            # The client goes away while next() still runs in the thread
+            threading.Timer(0.1, release.set).start()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await stream.aclose()
+
+        asyncio.run(consume())
+        self.assertEqual(closed, [True])
+
+
+class AsyncAIViewTests(TestCase):
+    GEMINI_RESPONSE = SimpleNamespace(
+        text='A small animal',
+        usage_metadata=SimpleNamespace(prompt_token_count=3, candidates_token_count=2, total_token_count=5),
+    )
+
+    def setUp(self):
+        self.user = DrillFixtureMixin.make_user('teacher', 'teacher')
+
+    def test_wsgi_uses_the_sync_service(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch('api.viewsets.gen_ai.gemini_service') as service:
+            service.generate_content.return_value = self.GEMINI_RESPONSE
+            response = client.post('/api/gen-ai/', {'prompt': 'cat'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['response'], 'A small animal')
+        service.agenerate_content.assert_not_called()
+
+    def test_drf_authentication_and_parsing(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/gen-ai/', {'prompt': 'cat'}, format='json').status_code, 401)
+
+        # Session auth works like on any other APIView
+        client.login(username='teacher', password='pw')
+        with mock.patch('api.viewsets.gen_ai.gemini_service') as service:
+            service.generate_content.return_value = self.GEMINI_RESPONSE
+            self.assertEqual(client.post('/api/gen-ai/', {'prompt': 'cat'}, format='json').status_code, 200)
+            self.assertEqual(client.post('/api/gen-ai/', ['cat'], format='json').status_code, 400)
+            self.assertEqual(client.post('/api/gen-ai/', '{"prompt":', content_type='application/json').status_code, 400)
+
+    async def test_asgi_uses_the_async_service(self):
+        from django.test import AsyncClient
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        client = AsyncClient()
+        with mock.patch('api.viewsets.gen_ai.openrouter_service') as service:
+            service.acheck_limit = mock.AsyncMock(return_value={'data': {'usage': 1}})
+            response = await client.get('/api/gen-ai/checklimit/', headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'response': {'usage': 1}})
+        service.check_limit.assert_not_called()
+
+
+class DefinitionCacheStatsTests(TestCase):
+    def test_stats_come_from_the_table(self):
+        DefinitionCache.store('cat', 'h', 'm', {'is_valid': True, 'definitions': ['a', 'b', 'c']})
+        DefinitionCache.store('dog', 'h', 'm', {'is_valid': True, 'definitions': ['a', 'b', 'c']})
+        DefinitionCache.lookup('cat', 'h', 'm')
+        DefinitionCache.lookup_many([('cat', 'h'), ('dog', 'h'), ('cow', 'h')], 'm')
+        # Other processes don't share the local cache, the numbers don't depend on it
+        cache.clear()
+        self.assertEqual(DefinitionCache.stats(), {'hits': 3, 'misses': 1, 'hit_ratio': 0.75, 'entries': 2})
+
+    def test_counts_outlive_evicted_entries(self):
+        DefinitionCache.lookup('cat', 'h', 'm')
+        DefinitionCache.store('cat', 'h', 'm', {'is_valid': True, 'definitions': ['a', 'b', 'c']})
+        DefinitionCache.lookup('cat', 'h', 'm')
+        DefinitionCache.objects.all().delete()
+
+        self.assertEqual(DefinitionCache.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5, 'entries': 0})
+        self.assertEqual(DefinitionCacheCounter.objects.get().day, timezone.localdate())
+
+    def test_only_teachers_and_admins_see_the_stats(self):
+        client = APIClient()
+        client.force_authenticate(DrillFixtureMixin.make_user('student', 'student'))
+        self.assertEqual(client.get('/api/gen-ai-definitions/').status_code, 403)
+
+        client.force_authenticate(DrillFixtureMixin.make_user('teacher', 'teacher'))
+        self.assertEqual(client.get('/api/gen-ai-definitions/').json(), {'hits': 0, 'misses': 0, 'hit_ratio': None, 'entries': 0})
+
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='pw', is_staff=True)
+        client.force_authenticate(admin)
+        self.assertEqual(client.get('/api/gen-ai-definitions/').status_code, 200)
+
+
+@override_settings(DEFER_BADGE_RECOMPUTE=False)
+class SubmitAnswerTests(DrillFixtureMixin, TestCase):
+    def test_failed_submission_writes_nothing(self):
+        with mock.patch('api.views.QuestionResult.objects.update_or_create', side_effect=RuntimeError('boom')):
+            response = self.client_for(self.student).post(
+                f'/api/drills/{self.drill_id}/questions/{self.question_ids["M"]}/submit/',
+                {'answer': 1, 'question_type': 'M', 'points': 100},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 500)
+        # The run started by DrillAttempt.resolve is rolled back with the rest
+        self.assertFalse(DrillResult.objects.filter(student=self.student).exists())
+        self.assertFalse(DrillAttempt.objects.filter(student=self.student).exists())
+
+    def test_batch_with_an_unknown_question_starts_no_run(self):
+        # In the manifest (stale) but gone from the table
+        drill = Drill.objects.get(id=self.drill_id)
+        cache.set(drill._question_manifest_key(), {'total': 2, 'questions': {self.question_ids['M']: ['M'], 999: ['M']}})
+
+        response = self.client_for(self.student).post(f'/api/drills/{self.drill_id}/submit/', {'answers': [
+            {'question_id': self.question_ids['M'], 'question_type': 'M', 'answer': 1, 'points': 100},
+            {'question_id': 999, 'question_type': 'M', 'answer': 1, 'points': 100},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(DrillResult.objects.filter(student=self.student).exists())
+        self.assertFalse(DrillAttempt.objects.filter(student=self.student).exists())
+
+
+class DrillListSerializationTests(DrillFixtureMixin, TestCase):
+    QUESTIONS = DrillFixtureMixin.QUESTIONS + [
+        {'type': 'D', 'text': 'q3', 'sentence': 's', 'dragItems': [{'text': 'a'}, {'text': 'b'}]},
+        {'type': 'P', 'text': 'q4', 'answer': 'star', 'pictureWord': [{'media': '/media/x.png'}]},
+        {'type': 'G', 'text': 'q5', 'memoryCards': [{'id': 1}, {'id': 2}]},
+    ]
+
+    def test_prefetched_list_matches_single_drills(self):
+        self.create_drill('D2')
+        request = RequestFactory().get('/api/drills/')
+        request.user = self.teacher
+        drills = list(Drill.objects.order_by('id'))
+
+        listed = DrillSerializer(drills, many=True, context={'request': request}).data
+        single = [DrillSerializer(drill, context={'request': request}).data for drill in Drill.objects.order_by('id')]
+        self.assertEqual(len(listed[0]['questions']), 5)
+        self.assertEqual(listed, single)
+
+    def test_full_list_queries_dont_grow_with_the_drills(self):
+        client = self.client_for(self.teacher)
+        # The drills, the questions of each type (5) and the choices of all of them
+        with self.assertNumQueries(7):
+            self.assertEqual(client.get('/api/drills/', {'view': 'full'}).status_code, 200)
+        self.create_drill('D2')
+        self.create_drill('D3')
+        with self.assertNumQueries(7):
+            response = client.get('/api/drills/', {'view': 'full'})
+        self.assertEqual(len(response.json()), 3)
+
+
+class DrillPayloadCacheTests(DrillFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_failed_build_releases_the_lock(self):
+        client = self.client_for(self.teacher)
+        with mock.patch.object(DrillRetrieveUpdateDestroyView, 'get_serializer', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                client.get(f'/api/drills/{self.drill_id}/')
+
+        # The next request builds the payload right away instead of waiting for the lock to expire
+        started = time.monotonic()
+        self.assertEqual(client.get(f'/api/drills/{self.drill_id}/').status_code, 200)
+        self.assertLess(time.monotonic() - started, DrillRetrieveUpdateDestroyView.PAYLOAD_BUILD_WAIT)
+
+    def test_word_list_update_bumps_its_drills(self):
+        wordlist = WordList.objects.create(name='Space', description='d', created_by=self.teacher)
+        Drill.objects.filter(id=self.drill_id).update(custom_wordlist=wordlist)
+        version = Drill.objects.get(id=self.drill_id).version
+
+        response = self.client_for(self.teacher).put(f'/api/wordlist/{wordlist.id}/', {
+            'name': 'Space', 'description': 'd',
+            'words': [{'word': 'moon', 'definition': 'm', 'image_url': 'https://example.com/moon.png'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Drill.objects.get(id=self.drill_id).version, version + 1)
+
+    def test_reloaded_builtin_lists_bump_builtin_drills(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'space.json')
+        with open(path, 'w') as f:
+            f.write('{"name": "Space", "description": "d", "words": []}')
+        registry = WordListRegistry(directory)
+        version = Drill.objects.get(id=self.drill_id).version
+
+        registry.refresh(force=True)
+        self.assertEqual(Drill.objects.get(id=self.drill_id).version, version)
+
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        registry.refresh(force=True)
+        self.assertEqual(Drill.objects.get(id=self.drill_id).version, version + 1)
+
+
+class UpdateWithQuestionsTests(DrillFixtureMixin, TestCase):
+    def choices(self, question_type):
+        model_cls = Drill.question_models()[question_type]
+        return list(DrillChoice.objects.filter(
+            content_type=ContentType.objects.get_for_model(model_cls),
+            object_id=self.question_ids[question_type],
+        ).order_by('id'))
+
+    def test_choices_are_diffed_by_position(self):
+        first, second = self.choices('M')
+        DrillChoice.objects.filter(pk=first.pk).update(image='drill_choices/images/a.png')
+        drill = Drill.objects.get(id=self.drill_id)
+
+        drill.update_with_questions([
+            {'id': self.question_ids['M'], 'type': 'M', 'text': 'q1', 'word': 'air', 'answer': '1', 'choices': [
+                {'text': 'a', 'media': '/media/drill_choices/images/a.png'},
+                {'text': 'b2'},
+                {'text': 'c'},
+            ]},
+            {'id': self.question_ids['F'], 'type': 'F', 'text': 'q2', 'word': 'moon', 'answer': 'moon', 'pattern': 'm__n', 'choices': []},
+        ])
+
+        unchanged, reworded, appended = self.choices('M')
+        self.assertEqual((unchanged.pk, unchanged.text, unchanged.image.name), (first.pk, 'a', 'drill_choices/images/a.png'))
+        self.assertEqual((reworded.pk, reworded.text, reworded.is_correct), (second.pk, 'b2', True))
+        self.assertEqual((appended.text, appended.is_correct), ('c', False))
+        self.assertEqual(self.choices('F'), [])
+
+    def test_reordered_choices_are_rewritten(self):
+        first, second = self.choices('M')
+        drill = Drill.objects.get(id=self.drill_id)
+
+        drill.update_with_questions([
+            {'id': self.question_ids['M'], 'type': 'M', 'text': 'q1', 'word': 'air', 'answer': '0', 'choices': [{'text': 'b'}]},
+            {'id': self.question_ids['F'], 'type': 'F', 'text': 'q2', 'word': 'moon', 'answer': 'moon', 'pattern': 'm__n', 'choices': [{'text': 'x'}]},
+        ])
+
+        [moved] = self.choices('M')
+        self.assertEqual((moved.pk, moved.text, moved.is_correct), (first.pk, 'b', True))
+        self.assertFalse(DrillChoice.objects.filter(pk=second.pk).exists())
+
+    def test_attempts_get_the_new_question_total(self):
+        self.submit(self.student, 'M')
+        self.assertEqual(DrillAttempt.objects.get(student=self.student, drill_id=self.drill_id).question_total, 2)
+        drill = Drill.objects.get(id=self.drill_id)
+
+        drill.update_with_questions([
+            {'id': self.question_ids['M'], 'type': 'M', 'text': 'q1', 'word': 'air', 'answer': '1', 'choices': [{'text': 'a'}, {'text': 'b'}]},
+            {'id': self.question_ids['F'], 'type': 'F', 'text': 'q2', 'word': 'moon', 'answer': 'moon', 'pattern': 'm__n', 'choices': [{'text': 'x'}]},
+            {'type': 'D', 'text': 'q3', 'sentence': 's', 'dragItems': [{'text': 'a'}]},
+        ])
+
+        self.assertEqual(DrillAttempt.objects.get(student=self.student, drill_id=self.drill_id).question_total, 3)
@@ -0,0 +1,56 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework.views import APIView
+import asyncio
+
+
+class AsyncAPIView(APIView):
+  """
+  APIView with async handlers (ex. `async def post(self, request)`), served without holding
+  a worker thread under ASGI (backend/asgi.py).
+
+  DRF's dispatch is synchronous, this one runs the same steps: the authentication,
+  permission and throttle checks of the view and the parsing of request.data run in a
+  thread, then the handler runs on the event loop. Errors go through DRF's exception
+  handler and handlers return DRF Responses, like any other APIView.
+  """
+  def _initial(self, request, *args, **kwargs):
+    self.initial(request, *args, **kwargs)
+    request.data  # parse the body here, not on the event loop
+
+  async def dispatch(self, request, *args, **kwargs):
+    self.args = args
+    self.kwargs = kwargs
+    request = self.initialize_request(request, *args, **kwargs)
+    self.request = request
+    self.headers = self.default_response_headers
+
+    try:
+      await sync_to_async(self._initial)(request, *args, **kwargs)
+
+      if request.method.lower() in self.http_method_names:
+        handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+      else:
+        handler = self.http_method_not_allowed
+
+      response = handler(request, *args, **kwargs)
+      if asyncio.iscoroutine(response):  # options() is synchronous
+        response = await response
+    except Exception as exc:
+      response = self.handle_exception(exc)
+
+    self.response = self.finalize_response(request, response, *args, **kwargs)
+    return self.response
+
+
+async def call_service(request, async_method, sync_method, *args, **kwargs):
+  """
+  awaits async_method(*args, **kwargs) under ASGI.
+
+  Under WSGI Django runs every async view on a new event loop, where the per-loop async
+  clients of the services would be created for a single request and never closed, so the
+  sync method (on the pooled clients) runs in a thread instead.
+  """
+  if isinstance(getattr(request, '_request', request), ASGIRequest):
+    return await async_method(*args, **kwargs)
+  return await sync_to_async(sync_method, thread_sensitive=False)(*args, **kwargs)
@@ -0,0 +1,169 @@
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+import os
+import shutil
+import tempfile
+
+# Size of the blocks read from the request body; memory per request never grows past
+# CHUNKED_UPLOAD_SPOOL_SIZE + one block, whatever the size of the part or the file
+STREAM_BLOCK_SIZE = 64 * 1024
+CHUNKED_UPLOAD_SPOOL_SIZE = getattr(settings, 'CHUNKED_UPLOAD_SPOOL_SIZE', 1024 * 1024)
+
+# Recommended and maximum part sizes (S3 needs every part but the last to be at least 5 MB)
+CHUNKED_UPLOAD_PART_SIZE = getattr(settings, 'CHUNKED_UPLOAD_PART_SIZE', 8 * 1024 * 1024)
+CHUNKED_UPLOAD_MAX_PART_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_PART_SIZE', 64 * 1024 * 1024)
+
+# Where the filesystem backend keeps received parts until the upload completes
+CHUNKED_UPLOAD_TEMP_DIR = getattr(settings, 'CHUNKED_UPLOAD_TEMP_DIR', os.path.join(tempfile.gettempdir(), 'hano-chunked-uploads'))
+
+
+class ChunkedUploadError(Exception):
+  """raised when a part or the completion is rejected (ex. a part is too big or missing)"""
+
+
+def copy_stream(stream, destination, limit):
+  """
+  copies a readable stream into destination block by block
+
+  Parameters:
+    stream: the request body (anything with read(size))
+    destination: a writable file
+    limit (int): maximum number of bytes accepted
+
+  Returns:
+    int: number of bytes copied
+  """
+  copied = 0
+  while True:
+    block = stream.read(STREAM_BLOCK_SIZE)
+    if not block:
+      return copied
+    copied += len(block)
+    if copied > limit:
+      raise ChunkedUploadError(f"Part is larger than {limit} bytes")
+    destination.write(block)
+
+
+class FileSystemChunkBackend:
+  """
+  keeps the parts as files in CHUNKED_UPLOAD_TEMP_DIR and, on completion, streams them
+  in order into the storage. Used for local development and tests.
+  """
+  def __init__(self, storage=None, temp_dir=None):
+    self.storage = storage or default_storage
+    self.temp_dir = temp_dir or CHUNKED_UPLOAD_TEMP_DIR
+
+  def _upload_dir(self, upload):
+    return os.path.join(self.temp_dir, str(upload.id))
+
+  def _part_path(self, upload, part_number):
+    return os.path.join(self._upload_dir(upload), f'part-{int(part_number):05d}')
+
+  def start(self, upload):
+    os.makedirs(self._upload_dir(upload), exist_ok=True)
+    return ''
+
+  def write_part(self, upload, part_number, stream):
+    """streams one part to disk, returns (etag, size)"""
+    os.makedirs(self._upload_dir(upload), exist_ok=True)
+    part_path = self._part_path(upload, part_number)
+    try:
+      with open(part_path + '.tmp', 'wb') as destination:
+        size = copy_stream(stream, destination, CHUNKED_UPLOAD_MAX_PART_SIZE)
+      os.replace(part_path + '.tmp', part_path)
+    finally:
+      # a rejected or interrupted part doesn't leave its temporary file behind
+      if os.path.exists(part_path + '.tmp'):
+        os.remove(part_path + '.tmp')
+    return f'{part_number}-{size}', size
+
+  def complete(self, upload, part_numbers):
+    """assembles the parts and saves the file, returns the saved storage path"""
+    with tempfile.TemporaryFile() as assembled:
+      for part_number in part_numbers:
+        with open(self._part_path(upload, part_number), 'rb') as part:
+          shutil.copyfileobj(part, assembled, STREAM_BLOCK_SIZE)
+      assembled.seek(0)
+      saved_path = self.storage.save(upload.path, File(assembled, name=upload.filename))
+    self.abort(upload)
+    return saved_path
+
+  def abort(self, upload):
+    shutil.rmtree(self._upload_dir(upload), ignore_errors=True)
+
+
+class S3MultipartBackend:
+  """
+  streams every part straight into an S3 multipart upload of the storage's bucket
+  (any S3 compatible endpoint configured on the django-storages backend, ex. moto).
+  """
+  def __init__(self, storage=None):
+    self.storage = storage or default_storage
+
+  @property
+  def client(self):
+    return self.storage.connection.meta.client
+
+  def _key(self, upload):
+    from storages.utils import clean_name
+    return self.storage._normalize_name(clean_name(upload.path))
+
+  def start(self, upload):
+    response = self.client.create_multipart_upload(
+      Bucket=self.storage.bucket_name,
+      Key=self._key(upload),
+      ContentType=upload.content_type,
+    )
+    return response['UploadId']
+
+  def write_part(self, upload, part_number, stream):
+    """spools one part (to disk past CHUNKED_UPLOAD_SPOOL_SIZE) and uploads it, returns (etag, size)"""
+    with tempfile.SpooledTemporaryFile(max_size=CHUNKED_UPLOAD_SPOOL_SIZE) as spooled:
+      size = copy_stream(stream, spooled, CHUNKED_UPLOAD_MAX_PART_SIZE)
+      spooled.seek(0)
+      response = self.client.upload_part(
+        Bucket=self.storage.bucket_name,
+        Key=self._key(upload),
+        UploadId=upload.backend_upload_id,
+        PartNumber=int(part_number),
+        Body=spooled,
+        ContentLength=size,
+      )
+    return response['ETag'], size
+
+  def complete(self, upload, part_numbers):
+    try:
+      self.client.complete_multipart_upload(
+        Bucket=self.storage.bucket_name,
+        Key=self._key(upload),
+        UploadId=upload.backend_upload_id,
+        MultipartUpload={'Parts': [
+          {'ETag': upload.parts[str(number)]['etag'], 'PartNumber': int(number)} for number in part_numbers
+        ]},
+      )
+    except Exception as e:
+      raise ChunkedUploadError(str(e))
+    return upload.path
+
+  def abort(self, upload):
+    if upload.backend_upload_id:
+      self.client.abort_multipart_upload(
+        Bucket=self.storage.bucket_name,
+        Key=self._key(upload),
+        UploadId=upload.backend_upload_id,
+      )
+
+
+def get_chunk_backend():
+  """
+  returns the backend configured by CHUNKED_UPLOAD_BACKEND (dotted path), or the S3
+  multipart backend when the default storage is S3 and the filesystem one otherwise
+  """
+  backend_path = getattr(settings, 'CHUNKED_UPLOAD_BACKEND', None)
+  if backend_path:
+    return import_string(backend_path)()
+  if hasattr(default_storage, 'bucket_name') and hasattr(default_storage, 'connection'):
+    return S3MultipartBackend()
+  return FileSystemChunkBackend()
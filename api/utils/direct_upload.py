@@ -0,0 +1,222 @@
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from .chunked_upload import copy_stream
+from .media import content_path, media_folder, _record
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+
+# Seconds an issued upload (presigned url or local token) stays valid
+DIRECT_UPLOAD_EXPIRES = getattr(settings, 'DIRECT_UPLOAD_EXPIRES', 60 * 60)
+
+# Largest file accepted by a direct upload
+DIRECT_UPLOAD_MAX_SIZE = getattr(settings, 'DIRECT_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024)
+
+_TOKEN_SALT = 'api.direct-upload'
+
+
+class DirectUploadError(Exception):
+  """raised when an upload can't be issued, received or completed"""
+
+
+def _is_s3(storage):
+  return hasattr(storage, 'bucket_name') and hasattr(storage, 'connection')
+
+
+def _s3_key(storage, path):
+  from storages.utils import clean_name
+  return storage._normalize_name(clean_name(path))
+
+
+def _check_digest(digest):
+  digest = (digest or '').lower()
+  if not digest:
+    return None
+  try:
+    if len(digest) != 64:
+      raise ValueError
+    bytes.fromhex(digest)
+  except ValueError:
+    raise DirectUploadError("sha256 must be the hex sha256 of the file")
+  return digest
+
+
+def read_token(token):
+  """
+  Returns:
+    dict: the upload described by the token
+    {'user': user id, 'path': storage path, 'content_type': ..., 'size': int or None, 'sha256': hex or None}
+  """
+  try:
+    return signing.loads(token, salt=_TOKEN_SALT, max_age=DIRECT_UPLOAD_EXPIRES)
+  except signing.SignatureExpired:
+    raise DirectUploadError("Upload token expired")
+  except signing.BadSignature:
+    raise DirectUploadError("Invalid upload token")
+
+
+# ex.
+# presign_upload(request, 'cat.png', 'image/png', size=48213)
+# == {
+#   'token': '...',
+#   'path': 'vocabulary/images/cat.png',
+#   'exists': False,
+#   'upload': {'method': 'POST', 'url': 'https://bucket.s3.amazonaws.com/', 'fields': {...}},
+# }
+def presign_upload(request, filename, content_type, size=None, sha256=None):
+  """
+  issues the parameters the client needs to send a file straight to the default storage.
+
+  - S3 storage: a presigned POST (size limited by a content-length-range condition), or a
+    presigned PUT when the sha256 is given (S3 then checks the checksum of the body)
+  - any other storage: a signed PUT url on this server (see receive_local_upload)
+
+  When the sha256 is given the file is stored by content and, if the same file was already
+  uploaded, 'exists' is True and there is nothing to upload.
+
+  Returns:
+    dict: token (to send to the completion endpoint), path, exists and upload ({method, url, fields or headers})
+  """
+  filename = os.path.basename(filename or '')
+  folder = media_folder(content_type)
+  if not filename:
+    raise DirectUploadError("filename is required")
+  if not folder:
+    raise DirectUploadError("Invalid file type. Only image and video files are allowed.")
+  if size is not None:
+    try:
+      size = int(size)
+    except (ValueError, TypeError):
+      raise DirectUploadError("size must be a number")
+    if not 0 < size <= DIRECT_UPLOAD_MAX_SIZE:
+      raise DirectUploadError(f"size must be between 1 and {DIRECT_UPLOAD_MAX_SIZE} bytes")
+  sha256 = _check_digest(sha256)
+
+  if sha256:
+    from api.models import StoredMedia
+
+    existing = StoredMedia.objects.filter(digest=sha256).values_list('path', flat=True).first()
+    if existing:
+      return {'token': None, 'path': existing, 'exists': True, 'upload': None}
+    path = content_path(f"{folder}/{filename}", sha256)
+  else:
+    path = default_storage.get_available_name(f"{folder}/{filename}")
+
+  token = signing.dumps({
+    'user': request.user.id,
+    'path': path,
+    'content_type': content_type,
+    'size': size,
+    'sha256': sha256,
+  }, salt=_TOKEN_SALT)
+
+  if not _is_s3(default_storage):
+    upload = {
+      'method': 'PUT',
+      'url': request.build_absolute_uri(reverse('direct_upload_receive', args=[token])),
+      'headers': {'Content-Type': content_type},
+    }
+  elif sha256:
+    client = default_storage.connection.meta.client
+    checksum = base64.b64encode(binascii.unhexlify(sha256)).decode()
+    params = {
+      'Bucket': default_storage.bucket_name,
+      'Key': _s3_key(default_storage, path),
+      'ContentType': content_type,
+      'ChecksumSHA256': checksum,
+    }
+    headers = {'Content-Type': content_type, 'x-amz-checksum-sha256': checksum}
+    if size is not None:
+      params['ContentLength'] = size
+    upload = {
+      'method': 'PUT',
+      'url': client.generate_presigned_url('put_object', Params=params, ExpiresIn=DIRECT_UPLOAD_EXPIRES),
+      'headers': headers,
+    }
+  else:
+    client = default_storage.connection.meta.client
+    presigned = client.generate_presigned_post(
+      Bucket=default_storage.bucket_name,
+      Key=_s3_key(default_storage, path),
+      Fields={'Content-Type': content_type},
+      Conditions=[
+        {'Content-Type': content_type},
+        ['content-length-range', 1, size or DIRECT_UPLOAD_MAX_SIZE],
+      ],
+      ExpiresIn=DIRECT_UPLOAD_EXPIRES,
+    )
+    upload = {'method': 'POST', 'url': presigned['url'], 'fields': presigned['fields']}
+
+  return {'token': token, 'path': path, 'exists': False, 'upload': upload}
+
+
+class _HashingWriter:
+  def __init__(self, destination):
+    self.destination = destination
+    self.digest = hashlib.sha256()
+
+  def write(self, block):
+    self.digest.update(block)
+    self.destination.write(block)
+
+
+def receive_local_upload(token, stream):
+  """
+  local stand-in for the presigned url when the storage isn't S3: streams the request
+  body into default_storage at the path of the token
+
+  Returns:
+    str: the storage path
+  """
+  upload = read_token(token)
+  path = upload['path']
+  limit = upload['size'] or DIRECT_UPLOAD_MAX_SIZE
+
+  if default_storage.exists(path):
+    if upload['sha256']:
+      # stored by content, the same file is already there
+      return path
+    raise DirectUploadError("This upload was already received")
+
+  with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spooled:
+    writer = _HashingWriter(spooled)
+    try:
+      size = copy_stream(stream, writer, limit)
+    except Exception as e:
+      raise DirectUploadError(str(e))
+    if upload['size'] is not None and size != upload['size']:
+      raise DirectUploadError(f"Received {size} of {upload['size']} bytes")
+    if upload['sha256'] and writer.digest.hexdigest() != upload['sha256']:
+      raise DirectUploadError("The file doesn't match its sha256")
+    spooled.seek(0)
+    return default_storage.save(path, File(spooled, name=os.path.basename(path)))
+
+
+def complete_direct_upload(user, token):
+  """
+  called by the client once the file is in the storage: checks the object and records it
+  in the StoredMedia index (when its sha256 is known)
+
+  Returns:
+    str: the storage path of the file
+  """
+  upload = read_token(token)
+  if upload['user'] != user.id:
+    raise DirectUploadError("Invalid upload token")
+
+  path = upload['path']
+  if not default_storage.exists(path):
+    raise DirectUploadError("The file has not been uploaded yet")
+  size = default_storage.size(path)
+  if upload['size'] is not None and size != upload['size']:
+    default_storage.delete(path)
+    raise DirectUploadError(f"Received {size} of {upload['size']} bytes")
+
+  if upload['sha256']:
+    _record([{'digest': upload['sha256'], 'path': path, 'size': size, 'content_type': upload['content_type']}])
+  return path
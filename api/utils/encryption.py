@@ -1,8 +1,23 @@
 from cryptography.fernet import Fernet
 from django.conf import settings
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import hashlib
+import hmac
+import threading
+import time
 
 f = Fernet(settings.ENCRYPTION_KEY)
 
+# Key for the blind indexes, falls back to a key derived from ENCRYPTION_KEY
+_blind_index_key = getattr(settings, 'BLIND_INDEX_KEY', None) or hmac.new(
+  settings.ENCRYPTION_KEY, b'hano-blind-index', hashlib.sha256
+).digest()
+
+# Maximum number of decrypted values kept in the process-level LRU
+DECRYPT_LRU_SIZE = getattr(settings, 'DECRYPT_LRU_SIZE', 4096)
+
 # ex. 
 # data value is 'Hello World', 
 # after decrypting, it will return:
@@ -22,12 +37,113 @@ def encrypt(data):
     return f.encrypt(data.encode())
   return None
 
+
+def normalize_name(value):
+  """
+  normalizes a name before it is blind-indexed (trimmed, single spaces, lowercase)
+  """
+  return ' '.join(str(value).split()).lower()
+
+
+# ex.
+# blind_index(' Juan ') == blind_index('juan')
+def blind_index(value):
+  """
+  computes a keyed HMAC of a normalized value so encrypted columns can be searched by equality
+
+  Parameters:
+    value (str): the plain text (ex. a first name)
+
+  Returns:
+    str: 64 character hex digest\n
+    None: if value is empty or does not exist
+  """
+  if value is None:
+    return None
+  normalized = normalize_name(value)
+  if not normalized:
+    return None
+  return hmac.new(_blind_index_key, normalized.encode(), hashlib.sha256).hexdigest()
+
+
+class _DecryptLRU:
+  """
+  thread-safe, size-bounded LRU of ciphertext -> plaintext shared by the whole process
+  """
+  def __init__(self, max_size):
+    self.max_size = max_size
+    self._data = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      if key not in self._data:
+        return None
+      self._data.move_to_end(key)
+      return self._data[key]
+
+  def set(self, key, value):
+    if self.max_size <= 0:
+      return
+    with self._lock:
+      self._data[key] = value
+      self._data.move_to_end(key)
+      while len(self._data) > self.max_size:
+        self._data.popitem(last=False)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+  def __len__(self):
+    return len(self._data)
+
+
+_lru = _DecryptLRU(DECRYPT_LRU_SIZE)
+
+# ciphertext -> plaintext memo that only lives for the current request (see DecryptionCacheMiddleware)
+_request_memo = ContextVar('decrypt_request_memo', default=None)
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'decrypt_seconds': 0.0}
+
+
+def _normalize(data):
+  if isinstance(data, memoryview):
+    return data.tobytes()
+  return bytes(data) if isinstance(data, bytearray) else data
+
+
+def _record(hits=0, misses=0, seconds=0.0):
+  with _stats_lock:
+    _stats['hits'] += hits
+    _stats['misses'] += misses
+    _stats['decrypt_seconds'] += seconds
+
+
+def _lookup(token, memo):
+  """returns the cached plaintext of a ciphertext or None"""
+  if memo is not None and token in memo:
+    return memo[token]
+  value = _lru.get(token)
+  if value is not None and memo is not None:
+    memo[token] = value
+  return value
+
+
+def _store(token, value, memo):
+  if memo is not None:
+    memo[token] = value
+  _lru.set(token, value)
+
+
 # ex. 
 # data value is 'gAAAAABoAlUUVUESw4coyFFzHXJ35tEBjVXY2SjcIddKQAw2VJRWMSOiLpivmomefKMAY2T66C52s53F9Ok-aXD71EnjhdHtrA==', 
 # after decrypting, it will return: 'Hello World'
 def decrypt(data):
   """
-  decrypts the data using the ENCRYPTION_KEY
+  decrypts the data using the ENCRYPTION_KEY.
+  Each distinct ciphertext is decrypted once per request and hot values are kept in a process LRU.
 
   Parameters:
     data (byte): the encrypted data you wish to decrypt
@@ -37,9 +153,85 @@ def decrypt(data):
     None: if data is empty or does not exist
   """
   if data:
-    # print("data is of type: ",type(data))
-    if isinstance(data, memoryview):
-      data = data.tobytes()
-       
-    return f.decrypt(data).decode()
-  return None
\ No newline at end of file
+    token = _normalize(data)
+    memo = _request_memo.get()
+
+    value = _lookup(token, memo)
+    if value is not None:
+      _record(hits=1)
+      return value
+
+    started = time.perf_counter()
+    value = f.decrypt(token).decode()
+    _record(misses=1, seconds=time.perf_counter() - started)
+
+    _store(token, value, memo)
+    return value
+  return None
+
+
+def decrypt_many(values):
+  """
+  decrypts a batch of encrypted values, decrypting each distinct ciphertext only once
+
+  Parameters:
+    values (iterable of byte): the encrypted values (None/empty entries are allowed)
+
+  Returns:
+    list: the decrypted values in the same order as the input (None for empty entries)
+  """
+  memo = _request_memo.get()
+  tokens = [_normalize(value) if value else None for value in values]
+  resolved = {}
+  hits = 0
+  misses = 0
+
+  seconds = 0.0
+  for token in tokens:
+    if token is None or token in resolved:
+      continue
+    value = _lookup(token, memo)
+    if value is not None:
+      hits += 1
+    else:
+      started = time.perf_counter()
+      value = f.decrypt(token).decode()
+      seconds += time.perf_counter() - started
+      misses += 1
+      _store(token, value, memo)
+    resolved[token] = value
+  _record(hits=hits, misses=misses, seconds=seconds)
+
+  return [resolved[token] if token is not None else None for token in tokens]
+
+
+@contextmanager
+def request_decryption_cache():
+  """
+  opens a decrypted-value memo for the duration of the block (one per request)
+  """
+  reset_token = _request_memo.set({})
+  try:
+    yield
+  finally:
+    _request_memo.reset(reset_token)
+
+
+def get_decryption_stats():
+  """
+  Returns:
+    dict: hit/miss counters, total time spent decrypting and the current LRU size
+  """
+  with _stats_lock:
+    stats = dict(_stats)
+  stats['lru_size'] = len(_lru)
+  return stats
+
+
+def clear_decryption_cache():
+  """
+  empties the process LRU and resets the counters (ex. after rotating ENCRYPTION_KEY)
+  """
+  _lru.clear()
+  with _stats_lock:
+    _stats.update({'hits': 0, 'misses': 0, 'decrypt_seconds': 0.0})
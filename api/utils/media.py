@@ -0,0 +1,314 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from requests.adapters import HTTPAdapter
+import hashlib
+import os
+import requests
+import threading
+import uuid
+
+# Maximum number of uploads/downloads running at the same time for one payload
+MEDIA_INGEST_WORKERS = getattr(settings, 'MEDIA_INGEST_WORKERS', 8)
+
+# Timeout (seconds) of one remote media download
+MEDIA_FETCH_TIMEOUT = getattr(settings, 'MEDIA_FETCH_TIMEOUT', 10)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+  """
+  returns the process-wide requests.Session used to download remote media
+  (keeps connections to the same hosts open between downloads)
+  """
+  global _session
+  if _session is None:
+    with _session_lock:
+      if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MEDIA_INGEST_WORKERS, pool_maxsize=MEDIA_INGEST_WORKERS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+  return _session
+
+
+class _HashingFile(File):
+  """
+  File wrapper that computes the sha256 and size of what the storage reads from it,
+  so a file is hashed in the same pass that writes it
+  """
+  def __init__(self, f):
+    super().__init__(f, name=getattr(f, 'name', None))
+    self.digest = hashlib.sha256()
+    self.read_size = 0
+
+  def read(self, *args):
+    data = self.file.read(*args)
+    self.digest.update(data)
+    self.read_size += len(data)
+    return data
+
+  def seek(self, offset, *args):
+    # storages rewind the file before reading it
+    if offset == 0 and args in ((), (os.SEEK_SET,)):
+      self.digest = hashlib.sha256()
+      self.read_size = 0
+    return self.file.seek(offset, *args)
+
+
+# ex.
+# content_path('vocabulary/images/cat.PNG', '9f86d08...') == 'vocabulary/images/9f86d08....png'
+def content_path(path, digest):
+  """the content-addressed storage path of a file meant to be saved at path"""
+  directory = os.path.dirname(path)
+  name = f"{digest}{os.path.splitext(path)[1].lower()}"
+  return f"{directory}/{name}" if directory else name
+
+
+# ex.
+# upload_path('vocabulary/images/cat.PNG') == 'vocabulary/images/3f2a...c1.png'
+def upload_path(path):
+  """a new unique storage path in the folder of path (uploads are hashed while they are saved)"""
+  directory = os.path.dirname(path)
+  name = f"{uuid.uuid4().hex}{os.path.splitext(path)[1].lower()}"
+  return f"{directory}/{name}" if directory else name
+
+
+# ex.
+# media_folder('video/mp4') == 'vocabulary/videos'
+def media_folder(content_type):
+  """
+  Returns:
+    str: the storage folder of an image or video content type\n
+    None: if the content type is neither
+  """
+  content_type = content_type or ''
+  if content_type.startswith('image/'):
+    return 'vocabulary/images'
+  if content_type.startswith('video/'):
+    return 'vocabulary/videos'
+  return None
+
+
+def _put(content, path):
+  """
+  saves content at path unless an object is already stored there
+
+  Returns:
+    tuple: (storage path, True if the object was written by this call)
+  """
+  if default_storage.exists(path):
+    return path, False
+  return default_storage.save(path, content), True
+
+
+def _put_upload(f, path):
+  """
+  saves an uploaded file under a new name in the folder of path, hashing it on the way
+
+  Returns:
+    tuple: (storage path, hex digest, size in bytes)
+  """
+  hashed = _HashingFile(f)
+  if hasattr(f, 'seek'):
+    hashed.seek(0)
+  saved_path = default_storage.save(upload_path(path), hashed)
+  return saved_path, hashed.digest.hexdigest(), hashed.read_size
+
+
+def _record(rows):
+  """
+  adds rows to the digest -> path index (content already indexed keeps its path) and
+  their 'source_url' (if any) to the url -> file index
+
+  Returns:
+    dict: digest -> indexed storage path of every row
+  """
+  from api.models import StoredMedia, StoredMediaSource
+
+  if not rows:
+    return {}
+  StoredMedia.objects.bulk_create([
+    StoredMedia(**{k: v for k, v in row.items() if k != 'source_url'}) for row in rows
+  ], ignore_conflicts=True)
+  indexed = {
+    digest: (media_id, path) for media_id, digest, path in
+    StoredMedia.objects.filter(digest__in={row['digest'] for row in rows}).values_list('id', 'digest', 'path')
+  }
+  sources = [
+    StoredMediaSource(url=row['source_url'], media_id=indexed[row['digest']][0])
+    for row in rows if row.get('source_url') and row['digest'] in indexed
+  ]
+  if sources:
+    StoredMediaSource.objects.bulk_create(sources, ignore_conflicts=True)
+  return {digest: path for digest, (_, path) in indexed.items()}
+
+
+def _keep_indexed(saved_path, created, indexed_path):
+  """
+  the indexed path of a file just saved at saved_path: when the same content was already
+  stored (by another upload of this payload or another request), the new copy is removed
+  """
+  if indexed_path is None or indexed_path == saved_path:
+    return saved_path
+  if created:
+    try:
+      default_storage.delete(saved_path)
+    except Exception as e:
+      print(f"Error removing duplicate media {saved_path}: {e}")
+  return indexed_path
+
+
+def store_upload(f, path):
+  """
+  saves an uploaded file by content: identical files share one storage object
+
+  Parameters:
+    f (File): the file to save (ex. from request.FILES)
+    path (str): where the file would be saved normally, its folder and extension are kept
+
+  Returns:
+    str: the storage path of the file
+  """
+  saved_path, digest, size = _put_upload(f, path)
+  indexed = _record([{'digest': digest, 'path': saved_path, 'size': size, 'content_type': getattr(f, 'content_type', '') or ''}])
+  return _keep_indexed(saved_path, True, indexed.get(digest))
+
+
+class _Transfer:
+  def __init__(self, kind, source, path, quiet):
+    self.kind = kind  # 'upload' or 'remote'
+    self.source = source  # the file or the url
+    self.path = path
+    self.quiet = quiet
+    self.callbacks = []
+    self.digest = None
+    self.size = 0
+    self.content_type = ''
+    self.saved_path = None
+    self.created = False
+
+
+def _run_transfer(transfer):
+  if transfer.kind == 'upload':
+    transfer.saved_path, transfer.digest, transfer.size = _put_upload(transfer.source, transfer.path)
+    transfer.content_type = getattr(transfer.source, 'content_type', '') or ''
+    transfer.created = True
+    return
+
+  response = get_http_session().get(transfer.source, timeout=MEDIA_FETCH_TIMEOUT)
+  if response.status_code != 200:
+    return
+  content = response.content
+  transfer.digest = hashlib.sha256(content).hexdigest()
+  transfer.size = len(content)
+  transfer.content_type = response.headers.get('Content-Type', '')[:100]
+  transfer.saved_path, transfer.created = _put(ContentFile(content), content_path(transfer.path, transfer.digest))
+
+
+class MediaBatch:
+  """
+  collects the media transfers of a payload (uploads to storage and remote downloads)
+  and runs them together in a bounded thread pool.
+
+  Files are stored by content (see store_upload): uploads are hashed while they are
+  saved and dropped afterwards if their content was already stored, urls already in the
+  StoredMediaSource index are not downloaded again and reuse the stored object.
+
+  Every transfer has an on_done callback that receives the storage path; callbacks
+  run in the calling thread after all transfers finished, so they can safely update the
+  question data and model instances.
+
+  ex.
+    media = MediaBatch()
+    media.save_upload(f, 'vocabulary/images/cat.png', lambda path: card.update(media=default_storage.url(path)))
+    media.run()
+  """
+  def __init__(self, max_workers=None):
+    self.max_workers = max_workers or MEDIA_INGEST_WORKERS
+    self._transfers = {}
+
+  def __len__(self):
+    return len(self._transfers)
+
+  def _add(self, key, kind, source, path, on_done, quiet):
+    # the same file/url used twice in a payload is only read/transferred once, even for
+    # different folders: files are stored by content, so every use gets the one stored path
+    if key not in self._transfers:
+      self._transfers[key] = _Transfer(kind, source, path, quiet)
+    self._transfers[key].quiet = self._transfers[key].quiet and quiet
+    self._transfers[key].callbacks.append(on_done)
+
+  def save_upload(self, f, path, on_done, quiet=False):
+    """
+    saves an uploaded file to default_storage
+
+    Parameters:
+      f (UploadedFile): the file from request.FILES
+      path (str): where the file would be saved normally, its folder and extension are kept
+        (when the same file is added again, the path of its first use wins)
+      on_done (callable): called with the storage path
+      quiet (bool): print errors instead of raising them
+    """
+    self._add(('upload', id(f)), 'upload', f, path, on_done, quiet)
+
+  def save_remote(self, url, path, on_done):
+    """
+    downloads url with the shared session and saves it to default_storage.
+    Failed downloads are printed and skipped.
+    """
+    self._add(('remote', url), 'remote', url, path, on_done, True)
+
+  def run(self):
+    """runs every collected transfer, then their callbacks"""
+    from api.models import StoredMediaSource
+
+    transfers, self._transfers = list(self._transfers.values()), {}
+    if not transfers:
+      return
+
+    # Urls that were downloaded before are resolved with one query
+    stored_urls = dict(StoredMediaSource.objects.filter(
+      url__in=[t.source for t in transfers if t.kind == 'remote']
+    ).values_list('url', 'media__path'))
+
+    pending = []
+    for transfer in transfers:
+      transfer.saved_path = stored_urls.get(transfer.source) if transfer.kind == 'remote' else None
+      if transfer.saved_path is None:
+        pending.append(transfer)
+
+    if pending:
+      with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as pool:
+        futures = [(pool.submit(_run_transfer, transfer), transfer) for transfer in pending]
+      for future, transfer in futures:
+        try:
+          future.result()
+        except Exception as e:
+          if not transfer.quiet:
+            raise
+          print(f"Error saving media {transfer.source}: {e}")
+
+    saved = [t for t in pending if t.saved_path]
+    indexed = _record([
+      {
+        'digest': t.digest,
+        'path': t.saved_path,
+        'size': t.size,
+        'content_type': t.content_type,
+        'source_url': t.source if t.kind == 'remote' else None,
+      } for t in saved
+    ])
+    # Identical files (in this payload or stored before) all get the first stored object
+    for transfer in saved:
+      transfer.saved_path = _keep_indexed(transfer.saved_path, transfer.created, indexed.get(transfer.digest))
+
+    for transfer in transfers:
+      if transfer.saved_path is None:
+        continue
+      for on_done in transfer.callbacks:
+        on_done(transfer.saved_path)
@@ -0,0 +1,196 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+import hashlib
+import io
+
+# Rendition sizes (longest edge in pixels) that can be asked for, anything else is ignored
+IMAGE_RENDITION_SIZES = getattr(settings, 'IMAGE_RENDITION_SIZES', {
+  'thumb': 64,
+  'small': 128,
+  'medium': 256,
+  'large': 512,
+})
+
+# Output formats: format name -> (Pillow format, file extension)
+IMAGE_RENDITION_FORMATS = {
+  'webp': ('WEBP', 'webp'),
+  'jpeg': ('JPEG', 'jpg'),
+}
+DEFAULT_RENDITION_FORMAT = getattr(settings, 'DEFAULT_RENDITION_FORMAT', 'webp')
+IMAGE_RENDITION_QUALITY = getattr(settings, 'IMAGE_RENDITION_QUALITY', 80)
+
+# Seconds a known rendition path is remembered, so the storage is not asked whether it exists on every request
+RENDITION_CACHE_TTL = getattr(settings, 'RENDITION_CACHE_TTL', 60 * 60 * 24)
+
+# Seconds a missing rendition (the original is served meanwhile) or a failed one is remembered
+RENDITION_MISSING_TTL = getattr(settings, 'RENDITION_MISSING_TTL', 60 * 5)
+RENDITION_FAILURE_TTL = getattr(settings, 'RENDITION_FAILURE_TTL', 60 * 60 * 24)
+
+# Cached in place of a path
+_MISSING = 'missing'
+_FAILED = 'failed'
+
+
+# ex.
+# rendition_path('avatars/me.png', 'small', 'webp') == 'renditions/small/avatars/me.png.webp'
+def rendition_path(name, size, fmt):
+  return f"renditions/{size}/{name}.{IMAGE_RENDITION_FORMATS[fmt][1]}"
+
+
+def _cache_key(name, size, fmt):
+  return f"rendition:{hashlib.md5(name.encode()).hexdigest()}:{size}:{fmt}"
+
+
+def render_image(source, size, fmt):
+  """
+  resizes an image so its longest edge is at most the pixels of size (never upscales)
+
+  Parameters:
+    source (file): the original image
+    size (str): one of IMAGE_RENDITION_SIZES
+    fmt (str): one of IMAGE_RENDITION_FORMATS
+
+  Returns:
+    bytes: the encoded rendition
+  """
+  pixels = IMAGE_RENDITION_SIZES[size]
+  pil_format = IMAGE_RENDITION_FORMATS[fmt][0]
+
+  with Image.open(source) as image:
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((pixels, pixels), Image.LANCZOS)
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+      # JPEG has no transparency, flatten it on white
+      background = Image.new('RGB', image.size, (255, 255, 255))
+      rgba = image.convert('RGBA')
+      background.paste(rgba, mask=rgba.getchannel('A'))
+      image = background
+    elif pil_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+      image = image.convert('RGBA')
+
+    output = io.BytesIO()
+    image.save(output, format=pil_format, quality=IMAGE_RENDITION_QUALITY)
+  return output.getvalue()
+
+
+def _check(name, size, fmt):
+  fmt = fmt or DEFAULT_RENDITION_FORMAT
+  if not name or size not in IMAGE_RENDITION_SIZES or fmt not in IMAGE_RENDITION_FORMATS:
+    return None
+  return fmt
+
+
+def get_rendition(name, size, fmt=None):
+  """
+  returns the storage path of an existing rendition of the stored image name. Renditions
+  are never created here (this runs for every image of a response), see create_rendition.
+
+  Returns:
+    str: storage path of the rendition\n
+    None: if size/fmt aren't allowed or the rendition doesn't exist (callers fall back to the original)
+  """
+  fmt = _check(name, size, fmt)
+  if fmt is None:
+    return None
+
+  key = _cache_key(name, size, fmt)
+  path = cache.get(key)
+  if path is None:
+    path = rendition_path(name, size, fmt)
+    if default_storage.exists(path):
+      cache.set(key, path, RENDITION_CACHE_TTL)
+    else:
+      path = _MISSING
+      cache.set(key, path, RENDITION_MISSING_TTL)
+  return None if path in (_MISSING, _FAILED) else path
+
+
+def create_rendition(name, size, fmt=None):
+  """
+  generates and saves a rendition of the stored image name unless it already exists.
+  Images that can't be rendered are remembered for RENDITION_FAILURE_TTL and not tried again meanwhile.
+
+  Returns:
+    str: storage path of the rendition\n
+    None: if size/fmt aren't allowed or the image can't be rendered
+  """
+  fmt = _check(name, size, fmt)
+  if fmt is None:
+    return None
+
+  key = _cache_key(name, size, fmt)
+  path = cache.get(key)
+  if path == _FAILED:
+    return None
+  if path and path != _MISSING:
+    return path
+
+  path = rendition_path(name, size, fmt)
+  if not default_storage.exists(path):
+    try:
+      with default_storage.open(name, 'rb') as source:
+        content = render_image(source, size, fmt)
+      if not default_storage.exists(path):
+        path = default_storage.save(path, ContentFile(content))
+    except Exception as e:
+      print(f"Error creating {size} {fmt} rendition of {name}: {e}")
+      cache.set(key, _FAILED, RENDITION_FAILURE_TTL)
+      return None
+
+  cache.set(key, path, RENDITION_CACHE_TTL)
+  return path
+
+
+def generate_renditions(name, sizes=None, fmt=None):
+  """creates the renditions of an image right after its upload (every size and format by default)"""
+  for size in sizes or IMAGE_RENDITION_SIZES:
+    for rendition_format in [fmt] if fmt else IMAGE_RENDITION_FORMATS:
+      create_rendition(name, size, rendition_format)
+
+
+def rendition_options(request=None, context=None, default_size=None):
+  """
+  the rendition a response asks for: 'image_size' / 'image_format' in the serializer context,
+  else the ?image_size= / ?image_format= query parameters, else default_size.
+  Unknown sizes mean the original image and unknown formats the default one, so the result
+  only ever takes the allowed values (it is part of cache keys).
+
+  Returns:
+    tuple: (size or None for the original image, format)
+  """
+  context = context or {}
+  params = getattr(request, 'query_params', None) or getattr(request, 'GET', None) or {}
+  size = context.get('image_size') or params.get('image_size') or default_size
+  fmt = context.get('image_format') or params.get('image_format') or DEFAULT_RENDITION_FORMAT
+  if size not in IMAGE_RENDITION_SIZES:
+    size = None
+  if fmt not in IMAGE_RENDITION_FORMATS:
+    fmt = DEFAULT_RENDITION_FORMAT
+  return size, fmt
+
+
+def image_url(field, request=None, size=None, fmt=None):
+  """
+  url of a stored image or of one of its renditions
+
+  Parameters:
+    field (FieldFile): ex. user.avatar, badge.image, choice.image
+    request: used to build an absolute url
+    size (str): rendition size, None for the original image (also served while the rendition doesn't exist)
+
+  Returns:
+    str: the url\n
+    None: if there is no image
+  """
+  if not field or not getattr(field, 'name', None):
+    return None
+
+  url = field.url
+  if size:
+    path = get_rendition(field.name, size, fmt)
+    if path:
+      url = default_storage.url(path)
+  return request.build_absolute_uri(url) if request else url
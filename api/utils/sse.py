@@ -0,0 +1,57 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+import asyncio
+import json
+
+_END = object()
+
+
+# ex.
+# sse_event({'text': 'Hel'}) == 'data: {"text": "Hel"}\n\n'
+# sse_event({'tokens': {...}}, event='done') == 'event: done\ndata: {"tokens": {...}}\n\n'
+def sse_event(data, event=None):
+  """formats one server-sent event"""
+  lines = [f"event: {event}"] if event else []
+  lines.append(f"data: {json.dumps(data)}")
+  return '\n'.join(lines) + '\n\n'
+
+
+async def _iterate_in_thread(iterator):
+  # pulls every event from a worker thread, so a blocking upstream never blocks the event loop
+  pending = None
+  try:
+    while True:
+      # shielded: a client that goes away cancels the wait, not the thread running next()
+      pending = asyncio.ensure_future(sync_to_async(next, thread_sensitive=False)(iterator, _END))
+      item = await asyncio.shield(pending)
+      pending = None
+      if item is _END:
+        return
+      yield item
+  finally:
+    if pending is not None:
+      # closing the generator while next() still runs in the thread raises "generator already executing"
+      await asyncio.wait([pending])
+      if not pending.cancelled():
+        pending.exception()
+    close = getattr(iterator, 'close', None)
+    if close:
+      await sync_to_async(close, thread_sensitive=False)()
+
+
+def sse_response(request, events):
+  """
+  streams events (a generator of sse_event strings) to the client as they are produced
+
+  Under ASGI (backend/asgi.py) Django buffers synchronous iterators completely before
+  sending them, so the generator is consumed from a thread through an async iterator;
+  under WSGI it is served as is.
+  """
+  django_request = getattr(request, '_request', request)
+  content = _iterate_in_thread(iter(events)) if isinstance(django_request, ASGIRequest) else events
+
+  response = StreamingHttpResponse(content, content_type='text/event-stream')
+  response['Cache-Control'] = 'no-cache'
+  response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+  return response
@@ -0,0 +1,122 @@
+from django.conf import settings
+import json
+import os
+import threading
+import time
+
+WORDLISTS_DIR = os.path.join(settings.BASE_DIR, 'api', 'word-lists')
+
+# Minimum seconds between two checks of the word-list files for changes
+WORDLISTS_REFRESH_INTERVAL = getattr(settings, 'WORDLISTS_REFRESH_INTERVAL', 5)
+
+
+class WordListRegistry:
+  """
+  process-wide registry of the built-in word lists. Every JSON file is parsed once and
+  the files are re-read only when their names or modification times change.
+
+  Holds:
+    lists: list id (file name without .json) -> parsed word list
+    summaries: [{id, name, description}] of every list
+    media: lowercase word -> {'image': ..., 'signVideo': ...} (first list containing the word wins)
+  """
+  def __init__(self, directory):
+    self.directory = directory
+    self._lock = threading.Lock()
+    self._signature = None
+    self._checked_at = 0
+    self.lists = {}
+    self.summaries = []
+    self.media = {}
+
+  def _current_signature(self):
+    if not os.path.isdir(self.directory):
+      return ()
+    signature = []
+    for filename in sorted(os.listdir(self.directory)):
+      if filename.endswith('.json'):
+        signature.append((filename, os.path.getmtime(os.path.join(self.directory, filename))))
+    return tuple(signature)
+
+  def _load(self, signature):
+    lists = {}
+    summaries = []
+    media = {}
+    for filename, _ in signature:
+      try:
+        with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+          data = json.load(f)
+      except Exception as e:
+        print(f"Error reading wordlist {filename}: {e}")
+        continue
+
+      lists[filename[:-len('.json')]] = data
+      summaries.append({
+        "id": data.get("id"),
+        "name": data.get("name"),
+        "description": data.get("description", "")
+      })
+      for entry in data.get('words', []):
+        word = (entry.get('word') or '').lower()
+        if word in media:
+          continue
+        media_urls = {}
+        if entry.get('image_url'):
+          media_urls['image'] = entry['image_url']
+        if entry.get('video_url'):
+          media_urls['signVideo'] = entry['video_url']
+        media[word] = media_urls
+
+    changed = self._signature is not None and signature != self._signature
+    self.lists, self.summaries, self.media = lists, summaries, media
+    self._signature = signature
+    if changed:
+      # Built-in drills serve the media of these files in their cached payloads
+      self._bump_builtin_drills()
+
+  def _bump_builtin_drills(self):
+    from api.models import Drill
+
+    try:
+      Drill.bump_versions(custom_wordlist__isnull=True)
+    except Exception as e:
+      print(f"Error invalidating built-in drill payloads: {e}")
+
+  def refresh(self, force=False):
+    """re-parses the files if they changed (checked at most once per WORDLISTS_REFRESH_INTERVAL)"""
+    now = time.monotonic()
+    if not force and self._signature is not None and now - self._checked_at < WORDLISTS_REFRESH_INTERVAL:
+      return
+    with self._lock:
+      if not force and self._signature is not None and now - self._checked_at < WORDLISTS_REFRESH_INTERVAL:
+        return
+      signature = self._current_signature()
+      if force or signature != self._signature:
+        self._load(signature)
+      self._checked_at = now
+
+  def get_list(self, list_id):
+    """
+    Returns:
+      dict: the parsed word list\n
+      None: if there is no list with this id
+    """
+    self.refresh()
+    return self.lists.get(list_id)
+
+  def get_summaries(self):
+    self.refresh()
+    return self.summaries
+
+  def get_media_urls(self, word):
+    """
+    Returns:
+      dict: 'image' and/or 'signVideo' urls of the word (empty if the word has none or is unknown)
+    """
+    if not word:
+      return {}
+    self.refresh()
+    return dict(self.media.get(word.lower(), {}))
+
+
+wordlist_registry = WordListRegistry(WORDLISTS_DIR)
@@ -1,12 +1,12 @@
 from django.shortcuts import render
-from .models import User, Role, PasswordReset, Classroom, Drill, DrillQuestionBase, DrillResult, TransferRequest, Notification, QuestionResult, Badge, SmartSelectQuestion, BlankBustersQuestion, SentenceBuilderQuestion, PictureWordQuestion, MemoryGameQuestion
+from .models import User, Role, PasswordReset, Classroom, Drill, DrillQuestionBase, DrillResult, TransferRequest, Notification, QuestionResult, Badge, SmartSelectQuestion, BlankBustersQuestion, SentenceBuilderQuestion, PictureWordQuestion, MemoryGameQuestion, ClassroomLeaderboardEntry, DrillAttempt, StudentStats, BadgeRecomputeJob
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from rest_framework import generics, viewsets, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .serializers import UserSerializer, CustomTokenSerializer, ResetPasswordRequestSerializer, ResetPasswordSerializer, ClassroomSerializer, DrillSerializer, TransferRequestSerializer, NotificationSerializer, DrillResultSerializer, BadgeSerializer, ClassroomPointsSerializer
+from .serializers import UserSerializer, CustomTokenSerializer, ResetPasswordRequestSerializer, ResetPasswordSerializer, ClassroomSerializer, DrillSerializer, DrillSummarySerializer, TransferRequestSerializer, NotificationSerializer, DrillResultSerializer, BadgeSerializer, ClassroomPointsSerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
@@ -19,10 +19,13 @@ from django.core.files.storage import default_storage
 import pandas as pd
 from django.contrib.auth.hashers import make_password
 from rest_framework.decorators import api_view, permission_classes, action
-from api.utils.encryption import encrypt, decrypt  # Import the decrypt function
+from api.utils.encryption import encrypt, decrypt, blind_index  # Import the decrypt function
+from api.utils.media import store_upload
+from api.utils.renditions import image_url, rendition_options, generate_renditions
 from cryptography.fernet import InvalidToken  # Import the InvalidToken exception
 from django.utils import timezone
-from django.db import models
+from django.utils.http import parse_etags, quote_etag
+from django.db import models, transaction
 from django.db.models import Sum, Avg, Max
 import os
 import math
@@ -236,59 +239,31 @@ class ClassroomStudentsView(APIView): # enroll and delete students in a classroo
             
             # Check if this is a leaderboard request
             if request.path.endswith('/leaderboard/'):
-                # Get all students in the classroom
-                students = classroom.students.all()
-                
+                # Read the materialized leaderboard (latest attempt per drill, already summed)
                 leaderboard_data = []
-                for student in students:
-                    # Get all drill results for this student in this classroom
-                    drill_results = DrillResult.objects.filter(
-                        student=student,
-                        drill__classroom=classroom
-                    ).select_related('drill')
-                    
-                    # Calculate total points using the latest attempt for each drill
-                    classroom_points = 0
-                    drill_scores = {}  # Track latest attempt scores per drill
-                    
-                    for result in drill_results:
-                        drill_id = result.drill.id
-                        # Keep the latest attempt (highest run_number) for each drill
-                        if drill_id not in drill_scores or result.run_number > drill_scores[drill_id]['run_number']:
-                            drill_scores[drill_id] = {
-                                'points': result.points,
-                                'run_number': result.run_number
-                            }
-                    
-                    # Sum up the latest attempt scores
-                    classroom_points = sum(score['points'] or 0 for score in drill_scores.values())
-                    
-                    # Convert drill_scores back to simple format for compatibility
-                    simple_drill_scores = {drill_id: score['points'] for drill_id, score in drill_scores.items()}
-                    
+                for student, entry in ClassroomLeaderboardEntry.ranked_for(classroom):
+                    drill_scores = entry.drill_scores if entry else {}
                     leaderboard_data.append({
                         'id': student.id,
                         'first_name': student.get_decrypted_first_name(),
                         'last_name': student.get_decrypted_last_name(),
-                        'avatar': request.build_absolute_uri(student.avatar.url) if student.avatar else None,
-                        'points': classroom_points,
-                        'drill_scores': simple_drill_scores  # Include drill scores for detailed view
+                        'avatar': image_url(student.avatar, request, *rendition_options(request, default_size='small')),
+                        'points': entry.total_points if entry else 0,
+                        'drill_scores': {drill_id: score['points'] for drill_id, score in drill_scores.items()}  # Include drill scores for detailed view
                     })
-                
-                # Sort by points in descending order
-                leaderboard_data.sort(key=lambda x: x['points'], reverse=True)
+
                 return Response(leaderboard_data)
             
             # Regular student list request
-            students = classroom.students.all()
+            students = User.prime_decrypted_names(list(classroom.students.all()))
             return Response({
-                'count': students.count(),
+                'count': len(students),
                 'students': [
                     {
                         'id': student.id,
                         'username': student.username,
                         'name': f"{student.get_decrypted_first_name()} {student.get_decrypted_last_name()}",
-                        'avatar': request.build_absolute_uri(student.avatar.url) if student.avatar else None
+                        'avatar': image_url(student.avatar, request, *rendition_options(request, default_size='small'))
                     } for student in students
                 ]
             })
@@ -338,7 +313,7 @@ class ClassroomStudentsView(APIView): # enroll and delete students in a classroo
                     'id': student.id,
                     'first_name': student.get_decrypted_first_name(),
                     'last_name': student.get_decrypted_last_name(),
-                    'avatar': request.build_absolute_uri(student.avatar.url) if student.avatar else None,
+                    'avatar': image_url(student.avatar, request, *rendition_options(request, default_size='small')),
                     'points': classroom_points,
                     'drill_scores': drill_scores  # Include drill scores for detailed view
                 })
@@ -598,9 +573,38 @@ class DrillListCreateView(generics.ListCreateAPIView):
             
         if classroom_id:
             qs = qs.filter(classroom_id=classroom_id)
+
+        if self._is_summary():
+            qs = self._annotate_summary(qs, user)
             
         return qs
 
+    def _is_summary(self):
+        # Lists return drill summaries unless ?view=full asks for the questions too
+        return self.request.method == 'GET' and self.request.query_params.get('view') != 'full'
+
+    def get_serializer_class(self):
+        if self._is_summary():
+            return DrillSummarySerializer
+        return DrillSerializer
+
+    def _annotate_summary(self, qs, user):
+        """Question counts per type and the student's current attempt, as subqueries of the list query"""
+        from django.db.models import OuterRef, Subquery, Count, IntegerField
+        from django.db.models.functions import Coalesce
+
+        annotations = {}
+        for type_code, model_cls in Drill.question_models().items():
+            counts = model_cls.objects.filter(drill=OuterRef('pk')).order_by().values('drill').annotate(count=Count('id')).values('count')
+            annotations[f'{type_code.lower()}_question_count'] = Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+        if user.role.name == 'student':
+            attempt = DrillAttempt.objects.filter(drill=OuterRef('pk'), student=user)
+            for field in ('run_number', 'answered_count', 'question_total'):
+                annotations[f'attempt_{field}'] = Subquery(attempt.values(field)[:1], output_field=IntegerField())
+
+        return qs.annotate(**annotations)
+
     def create(self, request, *args, **kwargs):
         data = request.data
         questions_input = data.get('questions_input') or data.get('questions')
@@ -665,8 +669,52 @@ class DrillRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
         
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        payload, etag = self._get_cached_payload(request, instance)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(payload, headers=headers)
+
+    # How long (seconds) a serialized drill stays cached, and how long other requests
+    # wait for the one building it before building it themselves
+    PAYLOAD_CACHE_TTL = 60 * 60
+    PAYLOAD_BUILD_WAIT = 5
+
+    def _get_cached_payload(self, request, instance):
+        """
+        Returns the serialized drill and its strong ETag, cached per drill version, host and image size
+        (media urls are absolute). Only one request builds a missing payload, the others
+        wait for it instead of all hitting the database at once.
+        """
+        import hashlib
+        import json
+        import time
+        from django.core.cache import cache
+
+        size, fmt = rendition_options(request)
+        key = f'drill_payload:{instance.id}:v{instance.version}:{request.scheme}://{request.get_host()}:{size}:{fmt}'
+        lock_key = f'{key}:lock'
+        cached = cache.get(key)
+        locked = False
+        if cached is None:
+            locked = cache.add(lock_key, 1, self.PAYLOAD_BUILD_WAIT)
+            deadline = time.monotonic() + self.PAYLOAD_BUILD_WAIT
+            while not locked and cached is None and time.monotonic() < deadline:
+                time.sleep(0.05)
+                cached = cache.get(key)
+
+        if cached is None:
+            try:
+                data = self.get_serializer(instance).data
+                body = json.dumps(data, sort_keys=True, default=str).encode()
+                cached = {'data': data, 'etag': quote_etag(hashlib.sha256(body).hexdigest())}
+                cache.set(key, cached, self.PAYLOAD_CACHE_TTL)
+            finally:
+                # released even when the build fails, so the others don't wait out PAYLOAD_BUILD_WAIT
+                if locked:
+                    cache.delete(lock_key)
+
+        return cached['data'], cached['etag']
 
     def perform_destroy(self, instance):
         # Only allow the creator (teacher) to delete
@@ -674,7 +722,18 @@ class DrillRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         if user.role.name != 'teacher' or instance.created_by != user:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied('Only the creator teacher can delete this drill.')
-        return super().perform_destroy(instance)
+        classroom = instance.classroom
+        student_ids = list(DrillResult.objects.filter(drill=instance).values_list('student_id', flat=True).distinct())
+        super().perform_destroy(instance)
+        # Drop the deleted drill's results from the materialized leaderboard and the student aggregates
+        ClassroomLeaderboardEntry.rebuild(classroom)
+        for student in User.objects.filter(id__in=student_ids):
+            StudentStats.rebuild(student.id)
+            # The stored total points come from the stats
+            if settings.DEFER_BADGE_RECOMPUTE:
+                BadgeRecomputeJob.enqueue(student.id)
+            else:
+                student.update_points_and_badges(None)
 
     def update(self, request, *args, **kwargs):
         try:
@@ -825,9 +884,11 @@ class ProfileView(APIView):
                 user.email = request.data['email']
             if 'first_name' in request.data:
                 user.first_name_encrypted = encrypt(request.data['first_name'])
+                user.first_name_index = blind_index(request.data['first_name'])
                 user.first_name = "***"
             if 'last_name' in request.data:
                 user.last_name_encrypted = encrypt(request.data['last_name'])
+                user.last_name_index = blind_index(request.data['last_name'])
                 user.last_name = "***"
             if 'avatar' in request.data:
                 user.avatar = request.data['avatar']
@@ -835,6 +896,10 @@ class ProfileView(APIView):
             # Save all changes
             user.save()
             logger.info(f"Final username after save: {user.username}")
+
+            # Avatars are shown small in every list, create their renditions right away
+            if 'avatar' in request.data and user.avatar:
+                generate_renditions(user.avatar.name)
             
             # One final refresh
             user.refresh_from_db()
@@ -874,26 +939,21 @@ def import_students_from_csv(request, pk):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Preprocess all users: map (lowercased first + last name) to user instance
-    user_lookup = {
-        f"{(user.get_decrypted_first_name() or '').strip().lower()} {(user.get_decrypted_last_name() or '').strip().lower()}": user
-        for user in User.objects.all()
-    }
-    classroom = Classroom.objects.get(pk=pk)
-    classroom_student_lookup = {
-        f"{(student.get_decrypted_first_name() or '').strip().lower()} {(student.get_decrypted_last_name() or '').strip().lower()}": student
-        for student in classroom.students.all()
-    }
+    rows = [
+        (str(row['First Name']).strip(), str(row['Last Name']).strip())
+        for _, row in df.iterrows()
+    ]
 
+    # Resolve every CSV name through the blind indexes (one indexed query, no decryption)
+    user_lookup = User.filter_by_names(rows)
+    classroom = Classroom.objects.get(pk=pk)
+    enrolled_ids = set(classroom.students.filter(id__in=[user.id for user in user_lookup.values()]).values_list('id', flat=True))
 
-    for _, row in df.iterrows():
-        first_name = str(row['First Name']).strip()
-        last_name = str(row['Last Name']).strip()
-        full_name = f"{first_name.lower()} {last_name.lower()}"
 
-        user = user_lookup.get(full_name)
+    for first_name, last_name in rows:
+        user = user_lookup.get((blind_index(first_name), blind_index(last_name)))
         if user:
-            if classroom_student_lookup.get(full_name):
+            if user.id in enrolled_ids:
                 error_names.append(f"{last_name}, {first_name}")
                 print(f"User already enrolled in classroom: {user.username} - {first_name} {last_name}")
                 continue
@@ -1155,8 +1215,9 @@ def upload_image(request):
     filename = f"vocabulary/images/{os.path.basename(image_file.name)}"
     
     try:
-        # Save the file
-        saved_path = default_storage.save(filename, image_file)
+        # Save the file (stored by content, re-uploading the same file reuses the stored one)
+        saved_path = store_upload(image_file, filename)
+        generate_renditions(saved_path)
         
         # Get the URL of the saved file
         file_url = request.build_absolute_uri(default_storage.url(saved_path))
@@ -1183,8 +1244,8 @@ def upload_video(request):
     filename = f"vocabulary/videos/{os.path.basename(video_file.name)}"
     
     try:
-        # Save the file
-        saved_path = default_storage.save(filename, video_file)
+        # Save the file (stored by content, re-uploading the same file reuses the stored one)
+        saved_path = store_upload(video_file, filename)
         
         # Get the URL of the saved file
         file_url = request.build_absolute_uri(default_storage.url(saved_path))
@@ -1260,7 +1321,6 @@ class ClassroomPointsView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        from operator import itemgetter
         classroom_id = self.kwargs['classroom_id']
         user = self.request.user
 
@@ -1279,47 +1339,16 @@ class ClassroomPointsView(generics.RetrieveAPIView):
         else:
             raise PermissionDenied("You do not have permission to view leaderboard.")
 
-        # Get all students in the classroom
-        students = classroom.students.all()
+        # Read the materialized leaderboard, already ranked by total_points descending
         leaderboard = []
-        for student in students:
-            # Get latest attempt points for each drill in this classroom
-            drill_results = DrillResult.objects.filter(
-                student=student, 
-                drill__classroom=classroom
-            ).select_related('drill') 
-            
-            # Group by drill and get the latest attempt (highest run_number) for each drill
-            drill_latest_scores = {}
-
-            # Set to track unique drills attempted by this student in this classroom
-            completed_drill_ids = set()
-
-            for result in drill_results:
-                drill_id = result.drill.id
-
-                if drill_id not in drill_latest_scores or result.run_number > drill_latest_scores[drill_id]['run_number']:
-                    drill_latest_scores[drill_id] = {
-                        'points': result.points,
-                        'run_number': result.run_number
-                    }
-                
-                # Add the drill ID to the set to count it as completed
-                completed_drill_ids.add(drill_id)
-            
-            # Sum up the latest attempt scores
-            total_points = sum(score['points'] or 0 for score in drill_latest_scores.values())
-            
+        for student, entry in ClassroomLeaderboardEntry.ranked_for(classroom):
             leaderboard.append({
                 'student_id': student.id,
                 'student_name': f"{student.get_decrypted_first_name()} {student.get_decrypted_last_name()}",
-                'total_points': total_points,
-                'completed_drills': len(completed_drill_ids)
+                'total_points': entry.total_points if entry else 0,
+                'completed_drills': entry.completed_drills if entry else 0
             })
 
-        # Sort leaderboard by total_points descending
-        leaderboard = sorted(leaderboard, key=itemgetter('total_points'), reverse=True)
-
         return {
             "classroom_id": classroom.id,
             "leaderboard": leaderboard
@@ -1328,54 +1357,27 @@ class ClassroomPointsView(generics.RetrieveAPIView):
 class SubmitAnswerView(APIView):
     permission_classes = [IsAuthenticated]
 
-    QUESTION_MODEL_MAP = {
-        'M': SmartSelectQuestion,
-        'F': BlankBustersQuestion,
-        'D': SentenceBuilderQuestion,
-        'P': PictureWordQuestion,
-        'G': MemoryGameQuestion,
-    }
-
+    @transaction.atomic  # keeps the attempt row locked until the answer is recorded
     def post(self, request, drill_id, question_id):
         try:
             user = request.user
             drill = Drill.objects.get(id=drill_id)
 
-            question_instance = None
-            question_model_type = None
-            
             # Get question type from request data to narrow down the search
             question_type = request.data.get('question_type')
-            
-            if question_type and question_type in self.QUESTION_MODEL_MAP:
-                # If question type is provided, search only in that specific model
-                model_cls = self.QUESTION_MODEL_MAP[question_type]
-                try:
-                    question_instance = model_cls.objects.get(id=question_id, drill=drill)
-                    question_model_type = question_type
-                except model_cls.DoesNotExist:
-                    pass
-            else:
-                # Fallback: iterate through all concrete question models to find the question
-                for q_type_code, model_cls in self.QUESTION_MODEL_MAP.items():
-                    try:
-                        # Attempt to get the question from this specific model
-                        q = model_cls.objects.get(id=question_id, drill=drill)
-                        question_instance = q
-                        question_model_type = q_type_code
-                        break # Found the question, stop searching
-                    except model_cls.DoesNotExist:
-                        continue # Not found in this model, try the next one
+
+            # The cached question manifest of the drill tells which table holds this id
+            question_instance = drill.find_question(question_id, question_type)
 
             if not question_instance:
                 # If after checking all, it's still not found
+                transaction.set_rollback(True)
                 return Response({"error": "Question not found in this drill or invalid question ID."}, status=status.HTTP_404_NOT_FOUND)
 
             question = question_instance
             
             # Ensure student is enrolled in the classroom to submit answers
             if user.role.name != 'student' or not drill.classroom.students.filter(id=user.id).exists():
-                 from rest_framework.exceptions import PermissionDenied
                  raise PermissionDenied("Only students enrolled in the classroom can submit answers.")
 
             submitted_answer_data = request.data.get('answer')
@@ -1383,102 +1385,17 @@ class SubmitAnswerView(APIView):
             wrong_attempts = request.data.get('wrong_attempts', 0) # Get wrong attempts from frontend
 
             if submitted_answer_data is None:
+                 transaction.set_rollback(True)
                  return Response({"error": "Answer data is required"}, status=status.HTTP_400_BAD_REQUEST)
 
             # Get ContentType for QuestionResult creation
             ct = ContentType.objects.get_for_model(question)
             
-            # Check if this is the very first question ever answered for this student-drill combination
-            existing_question_results = QuestionResult.objects.filter(
-                drill_result__student=user,
-                drill_result__drill=drill
-            ).exists()
-            
-            if not existing_question_results:
-                # No QuestionResults exist at all - this is definitely a new attempt
-                is_new_attempt = True
-            else:
-                # QuestionResults exist - check if this specific question has been answered before
-                existing_question_result = QuestionResult.objects.filter(
-                    drill_result__student=user,
-                    drill_result__drill=drill,
-                    content_type=ct,
-                    object_id=question.id
-                ).exists()
-                
-                if existing_question_result:
-                    # This question has been answered before - this is a retake
-                    # Check if there's already a DrillResult for this retake session
-                    most_recent_drill_result = DrillResult.objects.filter(
-                        student=user,
-                        drill=drill
-                    ).order_by('-start_time').first()
-                    
-                    # Count how many questions have been answered in the most recent DrillResult
-                    questions_in_recent_attempt = QuestionResult.objects.filter(
-                        drill_result=most_recent_drill_result
-                    ).count()
-                    
-                    # If the most recent attempt has fewer questions than total questions, 
-                    # and this question was answered in a previous attempt, this is a retake
-                    from api.models import SmartSelectQuestion, BlankBustersQuestion, SentenceBuilderQuestion, PictureWordQuestion, MemoryGameQuestion
-                    
-                    total_questions = SmartSelectQuestion.objects.filter(drill=drill).count()
-                    total_questions += BlankBustersQuestion.objects.filter(drill=drill).count()
-                    total_questions += SentenceBuilderQuestion.objects.filter(drill=drill).count()
-                    total_questions += PictureWordQuestion.objects.filter(drill=drill).count()
-                    total_questions += MemoryGameQuestion.objects.filter(drill=drill).count()
-                    
-                    if questions_in_recent_attempt < total_questions:
-                        # The most recent attempt is incomplete - continue with it
-                        is_new_attempt = False
-                    else:
-                        # The most recent attempt is complete - start a new one
-                        is_new_attempt = True
-                else:
-                    # This question hasn't been answered before - continue current attempt
-                    is_new_attempt = False
-            
-            if is_new_attempt:
-                # Create a new DrillResult for this attempt
-                # Get the next run number for this student-drill combination
-                last_drill_result = DrillResult.objects.filter(
-                    student=user,
-                    drill=drill
-                ).order_by('-run_number').first()
-                
-                next_run_number = (last_drill_result.run_number + 1) if last_drill_result else 1
-                
-                drill_result = DrillResult.objects.create(
-                    student=user,
-                    drill=drill,
-                    run_number=next_run_number,
-                    start_time=timezone.now(),
-                    completion_time=timezone.now(),
-                    points=0.0
-                )
-                print(f"Created new DrillResult for attempt {next_run_number}")
-            else:
-                # This is a continuation of the current attempt
-                # Find the most recent DrillResult for this student-drill combination
-                drill_result = DrillResult.objects.filter(
-                    student=user,
-                    drill=drill
-                ).order_by('-run_number').first()
-                
-                if not drill_result:
-                    # Fallback: create a new DrillResult if none exists
-                    drill_result = DrillResult.objects.create(
-                        student=user,
-                        drill=drill,
-                        run_number=1,
-                        start_time=timezone.now(),
-                        completion_time=timezone.now(),
-                        points=0.0
-                    )
-                    print(f"Fallback: Created new DrillResult for attempt 1")
-                else:
-                    print(f"Using existing DrillResult for attempt {drill_result.run_number}")
+            # Current attempt of this student on the drill, resolved with one locked lookup.
+            # A new run (DrillResult) is started when there is none yet or the last one is complete.
+            attempt = DrillAttempt.resolve(user, drill)
+            drill_result = attempt.drill_result
+            print(f"Using DrillResult for attempt {drill_result.run_number}")
 
             # Determine if the answer is correct
             is_correct = question.check_answer(submitted_answer_data)
@@ -1515,6 +1432,8 @@ class SubmitAnswerView(APIView):
             )
             print(f"QuestionResult {'created' if created else 'updated'} - ID: {question_result.id}, Points awarded: {question_result.points_awarded}")
             print(f"QuestionResult {'created' if created else 'updated'} with ID {question_result.id}")
+            if created:
+                attempt.record_answer()
 
             # Update overall points on DrillResult
             # Recalculate total points from all question_results
@@ -1549,13 +1468,17 @@ class SubmitAnswerView(APIView):
                 'run_number': drill_result.run_number
             }, status=status.HTTP_201_CREATED)
 
+        # Errors are answered, not raised: roll back what the request already wrote (ex. a new run)
         except Drill.DoesNotExist:
+            transaction.set_rollback(True)
             return Response({"error": "Drill not found"}, status=status.HTTP_404_NOT_FOUND)
         except PermissionDenied as e:
+            transaction.set_rollback(True)
             return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
         except Exception as e:
             import traceback
             print(f"SubmitAnswerView Error: {e}\n{traceback.format_exc()}")
+            transaction.set_rollback(True)
             return Response({"error": str(e), "traceback": traceback.format_exc()}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
     def check_answer(self, question, submitted_answer_data):
@@ -1620,6 +1543,168 @@ class SubmitAnswerView(APIView):
         # Handle other question types or return False by default
         return False
 
+class SubmitDrillAnswersView(APIView):
+    """
+    Submits the answers of a whole drill run in one request.
+
+    Body:
+    {
+        "answers": [
+            {"question_id": 1, "question_type": "M", "answer": 1, "points": 100, "time_taken": 4.2},
+            ...
+        ]
+    }
+    Answers are graded with each question's check_answer, every QuestionResult is
+    written with one bulk_create/bulk_update and the DrillResult is saved once,
+    so points and badges are recomputed once per batch instead of once per answer.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic  # keeps the attempt row locked until the answers are recorded
+    def post(self, request, drill_id):
+        try:
+            user = request.user
+            drill = Drill.objects.get(id=drill_id)
+
+            # Ensure student is enrolled in the classroom to submit answers
+            if user.role.name != 'student' or not drill.classroom.students.filter(id=user.id).exists():
+                raise PermissionDenied("Only students enrolled in the classroom can submit answers.")
+
+            answers = request.data.get('answers')
+            if not isinstance(answers, list) or not answers:
+                return Response({"error": "answers must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Resolve the table of every question from the drill's question manifest
+            question_models = Drill.question_models()
+            manifest = drill.question_manifest()
+            refreshed = False
+
+            def types_of(question_id, question_type):
+                types = manifest['questions'].get(question_id, [])
+                if question_type in question_models:
+                    types = [question_type] if question_type in types else []
+                return types
+
+            ids_by_type = {}
+            resolved = []
+            for item in answers:
+                if not isinstance(item, dict) or item.get('answer') is None:
+                    return Response({"error": "Each answer needs a question_id and answer"}, status=status.HTTP_400_BAD_REQUEST)
+                try:
+                    question_id = int(item.get('question_id'))
+                except (ValueError, TypeError):
+                    return Response({"error": "Each answer needs a question_id and answer"}, status=status.HTTP_400_BAD_REQUEST)
+                question_type = item.get('question_type')
+                types = types_of(question_id, question_type)
+                if not types and not refreshed:
+                    # The manifest may predate a question saved outside create/update_with_questions
+                    manifest = drill.question_manifest(refresh=True)
+                    refreshed = True
+                    types = types_of(question_id, question_type)
+                if not types:
+                    return Response({"error": f"Question {question_id} not found in this drill."}, status=status.HTTP_404_NOT_FOUND)
+                ids_by_type.setdefault(types[0], set()).add(question_id)
+                resolved.append((types[0], question_id, item))
+
+            # One query per question type present in the batch
+            questions = {}
+            for type_code, ids in ids_by_type.items():
+                for question in question_models[type_code].objects.filter(drill=drill, pk__in=ids):
+                    questions[(type_code, question.id)] = question
+            # Every question must exist before resolve can start a new run
+            for type_code, question_id, item in resolved:
+                if (type_code, question_id) not in questions:
+                    return Response({"error": f"Question {question_id} not found in this drill."}, status=status.HTTP_404_NOT_FOUND)
+
+            attempt = DrillAttempt.resolve(user, drill)
+            drill_result = attempt.drill_result
+
+            content_types = ContentType.objects.get_for_models(*[question_models[t] for t in ids_by_type])
+            existing = {
+                (result.content_type_id, result.object_id): result
+                for result in QuestionResult.objects.filter(drill_result=drill_result)
+            }
+
+            # Grade every answer; a question answered twice in the batch keeps its last answer
+            graded = {}
+            for type_code, question_id, item in resolved:
+                question = questions[(type_code, question_id)]
+                is_correct = question.check_answer(item['answer'])
+                points_to_award = 0.0
+                if is_correct:
+                    try:
+                        points_to_award = float(item.get('points', 0))
+                    except (ValueError, TypeError):
+                        points_to_award = 0.0
+                ct = content_types[question_models[type_code]]
+                graded[(ct.id, question.id)] = (ct, question, item, is_correct, points_to_award)
+
+            now = timezone.now()
+            to_create = []
+            to_update = []
+            correct_delta = 0
+            for key, (ct, question, item, is_correct, points_to_award) in graded.items():
+                result = existing.get(key)
+                if result is None:
+                    result = QuestionResult(drill_result=drill_result, content_type=ct, object_id=question.id)
+                    to_create.append(result)
+                else:
+                    to_update.append(result)
+                correct_delta += int(bool(is_correct)) - int(bool(result.is_correct))
+                result.submitted_answer = item['answer']
+                result.is_correct = is_correct
+                result.time_taken = item.get('time_taken')
+                result.submitted_at = now
+                result.points_awarded = points_to_award
+
+            QuestionResult.objects.bulk_create(to_create)
+            QuestionResult.objects.bulk_update(to_update, ['submitted_answer', 'is_correct', 'time_taken', 'submitted_at', 'points_awarded'])
+
+            # bulk writes skip QuestionResult.save, so apply the counters here
+            if correct_delta:
+                StudentStats.apply_correct_delta(user.id, correct_delta)
+            if to_create:
+                attempt.answered_count += len(to_create)
+                attempt.save(update_fields=['answered_count', 'updated_at'])
+
+            # A single save updates the stats, the leaderboard and the points/badges
+            drill_result.points = drill_result.question_results.aggregate(total=models.Sum('points_awarded'))['total'] or 0
+            drill_result.save()
+
+            best_score = max(
+                [result.points for result in DrillResult.objects.filter(student=user, drill=drill) if result.points is not None],
+                default=0
+            )
+
+            return Response({
+                'success': True,
+                'results': [
+                    {
+                        'question_id': question.id,
+                        'question_type': question.type,
+                        'is_correct': is_correct,
+                        'points_awarded': points_to_award,
+                    } for ct, question, item, is_correct, points_to_award in graded.values()
+                ],
+                'current_points': drill_result.points,
+                'best_score': best_score,
+                'run_number': drill_result.run_number,
+                'completed': attempt.is_complete
+            }, status=status.HTTP_201_CREATED)
+
+        # Errors are answered, not raised: roll back what the request already wrote
+        except Drill.DoesNotExist:
+            transaction.set_rollback(True)
+            return Response({"error": "Drill not found"}, status=status.HTTP_404_NOT_FOUND)
+        except PermissionDenied as e:
+            transaction.set_rollback(True)
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+        except Exception as e:
+            import traceback
+            print(f"SubmitDrillAnswersView Error: {e}\n{traceback.format_exc()}")
+            transaction.set_rollback(True)
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = BadgeSerializer
     permission_classes = [IsAuthenticated]
@@ -1717,7 +1802,7 @@ class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
         try:
             if request.user.role.name == 'teacher':
                 # Teachers can see all students
-                students = User.objects.filter(role__name='student')
+                students = User.prime_decrypted_names(list(User.objects.filter(role__name='student')))
                 student_points_data = []
                 for student in students:
                     # Calculate total points from all drills across all classrooms
@@ -1749,7 +1834,7 @@ class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
                         'id': student.id,
                         'first_name': student.get_decrypted_first_name(),
                         'last_name': student.get_decrypted_last_name(),
-                        'avatar': request.build_absolute_uri(student.avatar.url) if student.avatar else None,
+                        'avatar': image_url(student.avatar, request, *rendition_options(request, default_size='small')),
                         'total_points': total_points,
                         'classroom_points': classroom_points_data,
                         'badges_count': student.badges.count()
@@ -1834,7 +1919,7 @@ class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
                     'id': badge.id,
                     'name': badge.name,
                     'description': badge.description,
-                    'image': request.build_absolute_uri(badge.image.url) if badge.image else None,
+                    'image': image_url(badge.image, request, *rendition_options(request)),
                     'points_required': badge.points_required,
                     # 'is_first_drill' removed
                     'drills_completed_required': badge.drills_completed_required,
@@ -1873,7 +1958,7 @@ class BadgeViewSet(viewsets.ReadOnlyModelViewSet):
                     'id': badge.id,
                     'name': badge.name,
                     'description': badge.description,
-                    'image': request.build_absolute_uri(badge.image.url) if badge.image else None,
+                    'image': image_url(badge.image, request, *rendition_options(request)),
                     'points_required': badge.points_required,
                     # 'is_first_drill' removed
                     'drills_completed_required': badge.drills_completed_required,
@@ -0,0 +1,153 @@
+import os
+from django.core.files.storage import default_storage
+from django.db import transaction
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..models import ChunkedUpload
+from ..utils.media import media_folder
+from ..utils.chunked_upload import get_chunk_backend, ChunkedUploadError, CHUNKED_UPLOAD_PART_SIZE, CHUNKED_UPLOAD_MAX_PART_SIZE
+
+
+# Resumable uploads for large files (ex. sign-language videos):
+# 1. POST   /api/uploads/                          {"filename": "clip.mp4", "content_type": "video/mp4", "size": 73400320}
+# 2. PUT    /api/uploads/<id>/parts/<number>/      raw bytes of the part (numbers start at 1)
+# 3. POST   /api/uploads/<id>/complete/            -> {"url": "..."}
+# GET /api/uploads/<id>/ lists the received parts so an interrupted upload can resume,
+# DELETE /api/uploads/<id>/ aborts it.
+
+def serialize_upload(upload, request=None):
+  data = {
+    "id": str(upload.id),
+    "filename": upload.filename,
+    "content_type": upload.content_type,
+    "status": upload.status,
+    "size": upload.size,
+    "received_size": upload.received_size,
+    "parts": sorted(int(number) for number in upload.parts),
+    "part_size": CHUNKED_UPLOAD_PART_SIZE,
+    "max_part_size": CHUNKED_UPLOAD_MAX_PART_SIZE,
+    "url": None,
+  }
+  if upload.status == 'complete':
+    url = default_storage.url(upload.path)
+    data["url"] = request.build_absolute_uri(url) if request else url
+  return data
+
+
+class ChunkedUploadStartView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def post(self, request):
+    filename = os.path.basename(str(request.data.get('filename') or ''))
+    content_type = str(request.data.get('content_type') or '')
+    size = request.data.get('size')
+
+    if not filename:
+      return Response({"error": "filename is required"}, status=status.HTTP_400_BAD_REQUEST)
+    folder = media_folder(content_type)
+    if not folder:
+      return Response({"error": "Invalid file type. Only image and video files are allowed."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+      size = int(size) if size is not None else None
+    except (ValueError, TypeError):
+      return Response({"error": "size must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    upload = ChunkedUpload(
+      user=request.user,
+      filename=filename,
+      content_type=content_type,
+      size=size,
+      path=default_storage.get_available_name(f"{folder}/{filename}"),
+    )
+    try:
+      upload.backend_upload_id = get_chunk_backend().start(upload) or ''
+    except Exception as e:
+      return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    upload.save()
+
+    return Response(serialize_upload(upload, request), status=status.HTTP_201_CREATED)
+
+
+class ChunkedUploadDetailView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def get(self, request, upload_id):
+    upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+    if not upload:
+      return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(serialize_upload(upload, request))
+
+  def delete(self, request, upload_id):
+    upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+    if not upload:
+      return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+    if upload.status == 'uploading':
+      get_chunk_backend().abort(upload)
+      upload.status = 'aborted'
+      upload.save(update_fields=['status', 'updated_at'])
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ChunkedUploadPartView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def put(self, request, upload_id, part_number):
+    upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+    if not upload:
+      return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+    if upload.status != 'uploading':
+      return Response({"error": f"Upload is {upload.status}."}, status=status.HTTP_409_CONFLICT)
+    if not 1 <= part_number <= 10000:
+      return Response({"error": "Part numbers go from 1 to 10000."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # DRF leaves no stream when the body is missing or empty
+    if request.stream is None:
+      return Response({"error": "The part is empty."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # The body is streamed to the backend block by block, it is never read into memory at once
+    try:
+      etag, size = get_chunk_backend().write_part(upload, part_number, request.stream)
+    except ChunkedUploadError as e:
+      return Response({"error": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    # Parts can arrive in parallel, record this one on the locked row
+    with transaction.atomic():
+      upload = ChunkedUpload.objects.select_for_update().get(id=upload.id)
+      upload.parts[str(part_number)] = {"etag": etag, "size": size}
+      upload.save(update_fields=['parts', 'updated_at'])
+
+    return Response({"part": part_number, "etag": etag, "size": size, "received_size": upload.received_size})
+
+
+class ChunkedUploadCompleteView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def post(self, request, upload_id):
+    upload = ChunkedUpload.objects.filter(id=upload_id, user=request.user).first()
+    if not upload:
+      return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+    if upload.status == 'complete':
+      return Response(serialize_upload(upload, request))
+    if upload.status != 'uploading':
+      return Response({"error": f"Upload is {upload.status}."}, status=status.HTTP_409_CONFLICT)
+
+    part_numbers = sorted(int(number) for number in upload.parts)
+    missing = sorted(set(range(1, (part_numbers[-1] if part_numbers else 0) + 1)) - set(part_numbers))
+    if not part_numbers or missing:
+      return Response({"error": "Some parts are missing.", "missing": missing}, status=status.HTTP_400_BAD_REQUEST)
+    if upload.size is not None and upload.received_size != upload.size:
+      return Response(
+        {"error": f"Received {upload.received_size} of {upload.size} bytes."},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+
+    try:
+      upload.path = get_chunk_backend().complete(upload, part_numbers)
+    except ChunkedUploadError as e:
+      return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    upload.status = 'complete'
+    upload.save(update_fields=['path', 'status', 'updated_at'])
+
+    return Response(serialize_upload(upload, request), status=status.HTTP_201_CREATED)
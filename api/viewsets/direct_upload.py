@@ -0,0 +1,62 @@
+from django.core.files.storage import default_storage
+from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..utils.direct_upload import presign_upload, receive_local_upload, complete_direct_upload, DirectUploadError
+
+
+# Direct uploads: the file goes from the client straight to the storage, not through this server
+# 1. POST /api/uploads/direct/           {"filename": "clip.mp4", "content_type": "video/mp4", "size": 73400320, "sha256": "9f86d08..." (optional)}
+#    -> {"token": "...", "path": "...", "exists": false, "upload": {"method": "POST" | "PUT", "url": "...", "fields" | "headers": {...}}}
+# 2. send the file as described by "upload" (multipart form with the fields + "file" for POST, raw body with the headers for PUT)
+# 3. POST /api/uploads/direct/complete/  {"token": "..."} -> {"url": "..."}
+# When "exists" is true the same file is already stored: skip 2 and 3, the file is at "path".
+
+class DirectUploadView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def post(self, request):
+    try:
+      data = presign_upload(
+        request,
+        str(request.data.get('filename') or ''),
+        str(request.data.get('content_type') or ''),
+        size=request.data.get('size'),
+        sha256=request.data.get('sha256'),
+      )
+    except DirectUploadError as e:
+      return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+      return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    data['url'] = request.build_absolute_uri(default_storage.url(data['path'])) if data['exists'] else None
+    return Response(data, status=status.HTTP_200_OK if data['exists'] else status.HTTP_201_CREATED)
+
+
+class DirectUploadReceiveView(APIView):
+  # the signed token in the url is the credential, like a presigned S3 url
+  authentication_classes = []
+  permission_classes = [AllowAny]
+
+  def put(self, request, token):
+    # DRF leaves no stream when the body is missing or empty
+    if request.stream is None:
+      return Response({"error": "The upload is empty."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+      receive_local_upload(token, request.stream)
+    except DirectUploadError as e:
+      return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DirectUploadCompleteView(APIView):
+  permission_classes = [IsAuthenticated]
+
+  def post(self, request):
+    try:
+      path = complete_direct_upload(request.user, str(request.data.get('token') or ''))
+    except DirectUploadError as e:
+      return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({"url": request.build_absolute_uri(default_storage.url(path))}, status=status.HTTP_201_CREATED)
@@ -1,11 +1,17 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from ..services import openrouter_service
-from ..serializers import PromptSerializer
+from ..services import openrouter_service, gemini_service, GEMINI_CLIENT_POOL_SIZE
+from ..serializers import PromptSerializer, DefinitionBatchSerializer
+from ..models import DefinitionCache, Role
+from ..utils.sse import sse_event, sse_response
+from ..utils.async_views import AsyncAPIView, call_service
 
-from google import genai
 from google.genai import types
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+import json
 
 # payload format for:
 # 
@@ -17,8 +23,8 @@ from google.genai import types
 #   "max_tokens": 200
 # }
 
-class GenAIView(APIView):
-  def post(self, request, *args, **kwargs):
+class GenAIView(AsyncAPIView):
+  async def post(self, request, *args, **kwargs):
     serializer = PromptSerializer(data=request.data)
     if serializer.is_valid():
       prompt = serializer.validated_data.get('prompt')
@@ -28,7 +34,10 @@ class GenAIView(APIView):
 
       try:
         # Use the OpenRouterService for non-streaming response
-        response_data = openrouter_service.generate_text(
+        response_data = await call_service(
+          request,
+          openrouter_service.agenerate_text,
+          openrouter_service.generate_text,
           prompt=prompt,
           system_message=system_message,
           temperature=temperature,
@@ -43,7 +52,7 @@ class GenAIView(APIView):
             {"error": "AI response format unexpected or service unavailable after retries."},
             status=status.HTTP_503_SERVICE_UNAVAILABLE 
           )
-      except Exception as e: # Catch any exceptions that bubble up from openrouter_service.generate_text
+      except Exception as e: # Catch any exceptions that bubble up from the OpenRouter call
         # Log the full error for debugging
         print(f"Unhandled exception in ChatAPIView: {e}")
         return Response(
@@ -53,9 +62,9 @@ class GenAIView(APIView):
         
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
   
-class GenAICheckLimitView(APIView):
-  def get(self, request):
-    response_data = openrouter_service.check_limit()
+class GenAICheckLimitView(AsyncAPIView):
+  async def get(self, request):
+    response_data = await call_service(request, openrouter_service.acheck_limit, openrouter_service.check_limit)
     
     if response_data:
       generated_text = response_data["data"]
@@ -88,7 +97,26 @@ DEFINITION_OUTPUT_SCHEMA = {
     "propertyOrdering": ["is_valid", "definitions"]
 }
 
-def generate_gemini_response(serializer, type):
+def is_valid_definition_result(data):
+  """
+  checks a parsed response against DEFINITION_OUTPUT_SCHEMA before it is cached
+  (a valid word needs at least one definition)
+  """
+  if not isinstance(data, dict) or not isinstance(data.get("is_valid"), bool):
+    return False
+  definitions = data.get("definitions")
+  if not isinstance(definitions, list) or not all(isinstance(d, str) and d.strip() for d in definitions):
+    return False
+  return bool(definitions) or not data["is_valid"]
+
+def definition_system_message(system_message):
+  return (
+    "Respond STRICTLY according to the provided JSON schema."
+    "Do not include any other text, markdown formatting, or explanation." 
+    f"{system_message or ''}"
+  )
+
+async def generate_gemini_response(request, serializer, type):
   """
   Helper function to initialize Gemini AI.
   Will check if it is a generic AI prompt or for generating definitions.
@@ -97,19 +125,29 @@ def generate_gemini_response(serializer, type):
   prompt = serializer.validated_data.get('prompt')
   system_message = serializer.validated_data.get('system_message')
   if type == "DEFINITION":
-    system_message = (
-      "Respond STRICTLY according to the provided JSON schema."
-      "Do not include any other text, markdown formatting, or explanation." 
-      f"{system_message or ''}"
-    )
+    system_message = definition_system_message(system_message)
   temperature = serializer.validated_data.get('temperature')
   max_tokens = serializer.validated_data.get('max_tokens')
 
-  try:
-    # 2. Initialize the Gemini Client
-    client = genai.Client()
+  # Definitions of a word already asked with the same prompt template come from the cache
+  cache_key = None
+  if type == "DEFINITION":
+    word = serializer.validated_data.get('word') or ''
+    cache_key = (
+      DefinitionCache.normalize_word(word),
+      DefinitionCache.prompt_template_hash(prompt, system_message, word),
+      gemini_service.model,
+    )
+    if not serializer.validated_data.get('bypass_cache'):
+      cached = await sync_to_async(DefinitionCache.lookup)(*cache_key)
+      if cached is not None:
+        return Response(
+          {"response": cached, "tokens": {"prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0}, "cached": True},
+          status=status.HTTP_200_OK
+        )
 
-    # 3. Configure the Generation
+  try:
+    # 2. Configure the Generation
     if type == "DEFINITION":
       config = types.GenerateContentConfig(
         system_instruction=system_message,
@@ -125,9 +163,11 @@ def generate_gemini_response(serializer, type):
         max_output_tokens=1024,
       )
     
-    # 4. Call the Gemini API
-    response = client.models.generate_content(
-      model="gemini-2.5-flash",
+    # 3. Call the Gemini API (identical requests in flight share one call)
+    response = await call_service(
+      request,
+      gemini_service.agenerate_content,
+      gemini_service.generate_content,
       contents=prompt,
       config=config
     )
@@ -138,7 +178,7 @@ def generate_gemini_response(serializer, type):
       "total_tokens": response.usage_metadata.total_token_count
     }
 
-    # 5. Determine the content to return based on the type
+    # 4. Determine the content to return based on the type
     if type == "DEFINITION":
       # Returns a Python dict/object (the structured JSON)
       response_data = response.parsed
@@ -153,10 +193,16 @@ def generate_gemini_response(serializer, type):
         status=status.HTTP_500_INTERNAL_SERVER_ERROR
       )
 
-    return Response(
-        {"response": response_data, "tokens": token_data},
-        status=status.HTTP_200_OK
-    )
+    if cache_key and is_valid_definition_result(response_data):
+      try:
+        await sync_to_async(DefinitionCache.store)(*cache_key, response_data)
+      except Exception as e:
+        print(f"Error caching definitions: {e}")
+
+    data = {"response": response_data, "tokens": token_data}
+    if cache_key:
+      data["cached"] = False
+    return Response(data, status=status.HTTP_200_OK)
 
   except Exception as e:
     # Handle API-specific or network errors
@@ -165,15 +211,15 @@ def generate_gemini_response(serializer, type):
       status=status.HTTP_500_INTERNAL_SERVER_ERROR
     )
 
-class GeminiAIGenericView(APIView):
+class GeminiAIGenericView(AsyncAPIView):
   """
   use Gemini AI to make generic prompts.
   """
-  def post(self, request):
+  async def post(self, request):
     # Get validated data from the request
     serializer = PromptSerializer(data=request.data)
     if serializer.is_valid():
-      return generate_gemini_response(serializer, "GENERIC")
+      return await generate_gemini_response(request, serializer, "GENERIC")
 
     # Return validation errors if serializer is not valid
     return Response(
@@ -182,18 +228,297 @@ class GeminiAIGenericView(APIView):
     )
 
 
-class GeminiAIDefinitionView(APIView):
+# Streaming responses (server-sent events):
+# data: {"text": "Once upon"}
+# data: {"text": " a time"}
+# ...
+# event: done
+# data: {"tokens": {"prompt_tokens": 12, "output_tokens": 230, "total_tokens": 242}}
+#
+# or, if the model fails midway:
+# event: error
+# data: {"error": "..."}
+
+class GenAIStreamView(APIView):
   """
-  use Gemini AI to make 3 definitions out of a word.
+  streaming version of GenAIView (OpenRouter), the text is sent as it is generated.
+  """
+  service = openrouter_service
+
+  def post(self, request):
+    serializer = PromptSerializer(data=request.data)
+    if not serializer.is_valid():
+      return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return sse_response(request, self.events(serializer.validated_data))
+
+  def events(self, data):
+    tokens = None
+    try:
+      for chunk in self.service.stream_text(
+        prompt=data.get('prompt'),
+        system_message=data.get('system_message'),
+        temperature=data.get('temperature'),
+        max_tokens=data.get('max_tokens')
+      ):
+        if isinstance(chunk, dict):
+          usage = chunk["usage"]
+          tokens = {
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "output_tokens": usage.get("completion_tokens"),
+            "total_tokens": usage.get("total_tokens")
+          }
+        else:
+          yield sse_event({"text": chunk})
+    except Exception as e:
+      print(f"Error streaming from OpenRouter: {e}")
+      yield sse_event({"error": "An unexpected error occurred while communicating with the AI service. Please try again later."}, event="error")
+      return
+    yield sse_event({"tokens": tokens}, event="done")
+
+
+class GeminiAIGenericStreamView(APIView):
+  """
+  streaming version of GeminiAIGenericView, the text is sent as it is generated.
   """
+  service = gemini_service
+
   def post(self, request):
+    serializer = PromptSerializer(data=request.data)
+    if not serializer.is_valid():
+      return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return sse_response(request, self.events(serializer.validated_data))
+
+  def events(self, data):
+    config = types.GenerateContentConfig(
+      system_instruction=data.get('system_message'),
+      temperature=data.get('temperature'),
+      max_output_tokens=1024,
+    )
+    usage = None
+    try:
+      for chunk in self.service.generate_content_stream(contents=data.get('prompt'), config=config):
+        if chunk.usage_metadata:
+          usage = chunk.usage_metadata
+        if chunk.text:
+          yield sse_event({"text": chunk.text})
+    except Exception as e:
+      yield sse_event({"error": f"Gemini API Error: {e}"}, event="error")
+      return
+
+    tokens = None
+    if usage:
+      tokens = {
+        "prompt_tokens": usage.prompt_token_count,
+        "output_tokens": usage.candidates_token_count,
+        "total_tokens": usage.total_token_count
+      }
+    yield sse_event({"tokens": tokens}, event="done")
+
+
+def can_see_cache_stats(user):
+  if user.is_staff:
+    return True
+  try:
+    return user.role.name == Role.TEACHER
+  except Role.DoesNotExist:
+    return False
+
+
+class GeminiAIDefinitionView(AsyncAPIView):
+  """
+  use Gemini AI to make 3 definitions out of a word.
+  Send "word" to cache the definitions and "bypass_cache": true to ask the model again.
+  """
+  async def get(self, request):
+    # hits, misses, hit ratio and size of the definition cache, for teachers and admins
+    if not await sync_to_async(can_see_cache_stats)(request.user):
+      return Response({"error": "Only teachers and admins can see the definition cache stats."}, status=status.HTTP_403_FORBIDDEN)
+    return Response(await sync_to_async(DefinitionCache.stats)(), status=status.HTTP_200_OK)
+
+  async def post(self, request):
     # Get validated data from the request
     serializer = PromptSerializer(data=request.data)
     if serializer.is_valid():
-      return generate_gemini_response(serializer, "DEFINITION")
+      return await generate_gemini_response(request, serializer, "DEFINITION")
 
     # Return validation errors if serializer is not valid
     return Response(
       serializer.errors,
       status=status.HTTP_400_BAD_REQUEST
     )
+
+
+# payload format for:
+#
+# Generate Definitions for many words:
+# {
+#   "words": ["cat", "river", "planet"],
+#   "prompt": "Give 3 3rd grade academic dictionary definitions to guess the word \"INSERT_WORD_HERE\". ...",
+#   "system_message": "...",
+#   "temperature": 0.7
+# }
+# -> {"results": [{"word": "cat", "response": {"is_valid": true, "definitions": [...]}, "cached": false}, ...], "tokens": {...}, "calls": 1}
+
+# Output tokens expected for one word (3 definitions) and the output budget of one batched call
+DEFINITION_TOKENS_PER_WORD = getattr(settings, 'DEFINITION_TOKENS_PER_WORD', 150)
+DEFINITION_BATCH_MAX_OUTPUT_TOKENS = getattr(settings, 'DEFINITION_BATCH_MAX_OUTPUT_TOKENS', 4096)
+
+BATCH_DEFINITION_OUTPUT_SCHEMA = {
+  "type": "array",
+  "items": {
+    "type": "object",
+    "properties": {
+      "word": {
+        "type": "string",
+        "description": "The word exactly as given."
+      },
+      **DEFINITION_OUTPUT_SCHEMA["properties"],
+    },
+    "required": ["word", "is_valid", "definitions"],
+    "propertyOrdering": ["word", "is_valid", "definitions"]
+  }
+}
+
+def estimate_tokens(text):
+  # about 4 characters per token for English text
+  return len(text) // 4 + 1
+
+# ex.
+# pack_words(['cat', 'dog', ...40 words]) == [[...26 words], [...14 words]]
+def pack_words(words, budget=None):
+  """
+  splits words into as few chunks as the output token budget of one call allows
+  """
+  budget = budget or DEFINITION_BATCH_MAX_OUTPUT_TOKENS
+  chunks = [[]]
+  used = 0
+  for word in words:
+    cost = DEFINITION_TOKENS_PER_WORD + estimate_tokens(word)
+    if chunks[-1] and used + cost > budget:
+      chunks.append([])
+      used = 0
+    chunks[-1].append(word)
+    used += cost
+  return chunks
+
+def _generate_definition_chunk(words, prompt, system_message, temperature):
+  """
+  one structured-output call for a chunk of words
+
+  Returns:
+    tuple: (normalized word -> validated result, token usage)
+  """
+  instructions = prompt.replace(DefinitionBatchSerializer.WORD_PLACEHOLDER, "WORD")
+  batch_prompt = (
+    "Follow these instructions for every word of the list below, WORD stands for the word:\n"
+    f"{instructions}\n\n"
+    "Return one item per word, in the same order, with the word copied exactly.\n"
+    f"Words: {json.dumps(words)}"
+  )
+  config = types.GenerateContentConfig(
+    system_instruction=system_message,
+    temperature=temperature,
+    max_output_tokens=min(DEFINITION_BATCH_MAX_OUTPUT_TOKENS, len(words) * DEFINITION_TOKENS_PER_WORD + 512),
+    response_mime_type="application/json",
+    response_schema=BATCH_DEFINITION_OUTPUT_SCHEMA,
+  )
+  response = gemini_service.generate_content(contents=batch_prompt, config=config)
+
+  items = response.parsed
+  if items is None and response.text:
+    try:
+      items = json.loads(response.text)
+    except ValueError:
+      items = None
+
+  results = {}
+  for item in items if isinstance(items, list) else []:
+    if not isinstance(item, dict) or not isinstance(item.get("word"), str):
+      continue
+    result = {"is_valid": item.get("is_valid"), "definitions": item.get("definitions")}
+    if is_valid_definition_result(result):
+      results[DefinitionCache.normalize_word(item["word"])] = result
+
+  usage = response.usage_metadata
+  tokens = {
+    "prompt_tokens": (usage.prompt_token_count or 0) if usage else 0,
+    "output_tokens": (usage.candidates_token_count or 0) if usage else 0,
+    "total_tokens": (usage.total_token_count or 0) if usage else 0,
+  }
+  return results, tokens
+
+
+class GeminiAIDefinitionBatchView(APIView):
+  """
+  use Gemini AI to make definitions for a list of words (ex. a whole word list).
+  Cached words are answered from the definition cache, the others are packed into as
+  few calls as the token budget allows and the calls run in parallel.
+  """
+  def post(self, request):
+    serializer = DefinitionBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+      return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    prompt = serializer.validated_data['prompt']
+    system_message = definition_system_message(serializer.validated_data.get('system_message'))
+    temperature = serializer.validated_data.get('temperature')
+    model = gemini_service.model
+
+    # Same keys as GeminiAIDefinitionView for the single prompt of each word
+    keys = {}
+    for word in serializer.validated_data['words']:
+      normalized = DefinitionCache.normalize_word(word)
+      if normalized not in keys:
+        single_prompt = prompt.replace(DefinitionBatchSerializer.WORD_PLACEHOLDER, word)
+        keys[normalized] = (word, DefinitionCache.prompt_template_hash(single_prompt, system_message, word))
+
+    cached = {}
+    if not serializer.validated_data.get('bypass_cache'):
+      found = DefinitionCache.lookup_many([(normalized, prompt_hash) for normalized, (_, prompt_hash) in keys.items()], model)
+      cached = {normalized: found[(normalized, prompt_hash)] for normalized, (_, prompt_hash) in keys.items() if (normalized, prompt_hash) in found}
+
+    missing = [word for normalized, (word, _) in keys.items() if normalized not in cached]
+    chunks = pack_words(missing) if missing else []
+
+    generated = {}
+    errors = {}
+    tokens = {"prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    if chunks:
+      with ThreadPoolExecutor(max_workers=min(GEMINI_CLIENT_POOL_SIZE, len(chunks))) as pool:
+        futures = [
+          (pool.submit(_generate_definition_chunk, chunk, prompt, system_message, temperature), chunk)
+          for chunk in chunks
+        ]
+      for future, chunk in futures:
+        try:
+          results, chunk_tokens = future.result()
+        except Exception as e:
+          print(f"Gemini API Error for {chunk}: {e}")
+          for word in chunk:
+            errors[DefinitionCache.normalize_word(word)] = f"Gemini API Error: {e}"
+          continue
+        generated.update(results)
+        for name in tokens:
+          tokens[name] += chunk_tokens[name]
+
+    try:
+      DefinitionCache.store_many(
+        [(normalized, prompt_hash, generated[normalized]) for normalized, (_, prompt_hash) in keys.items() if normalized in generated],
+        model
+      )
+    except Exception as e:
+      print(f"Error caching definitions: {e}")
+
+    results = []
+    for normalized, (word, _) in keys.items():
+      if normalized in cached:
+        results.append({"word": word, "response": cached[normalized], "cached": True})
+      elif normalized in generated:
+        results.append({"word": word, "response": generated[normalized], "cached": False})
+      else:
+        results.append({"word": word, "error": errors.get(normalized, "No valid definitions returned, please try again.")})
+
+    return Response(
+      {"results": results, "tokens": tokens, "calls": len(chunks)},
+      status=status.HTTP_200_OK
+    )
@@ -48,12 +48,19 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')  # Sender email
 
 # KEY for ENCRYPTING/DECRYPTING data
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY").encode()
+# Number of decrypted values cached per process (names, points)
+DECRYPT_LRU_SIZE = config('DECRYPT_LRU_SIZE', default=4096, cast=int)
+# KEY for the name blind indexes (HMAC); derived from ENCRYPTION_KEY when left empty
+BLIND_INDEX_KEY = config('BLIND_INDEX_KEY', default='').encode()
 
 # KEY for using Gen. AI (through OpenRouter)
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 # KEY for using Gen. AI (through Gemini AI)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Recompute total points and badges in the `process_badge_jobs` worker instead of during answer submission
+DEFER_BADGE_RECOMPUTE = config('DEFER_BADGE_RECOMPUTE', default=True, cast=bool)
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -100,6 +107,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
+    "api.middleware.DecryptionCacheMiddleware",
 ]
 
 ROOT_URLCONF = 'backend.urls'
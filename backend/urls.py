@@ -7,11 +7,13 @@ from api.views import (
     RequestPasswordReset, ResetPassword, ClassroomListView, ClassroomDetailView,
     ClassroomStudentsView, JoinClassroomView, DrillListCreateView, DrillRetrieveUpdateDestroyView,
     ProfileView, import_students_from_csv,
-    TransferRequestViewSet, NotificationViewSet, ClassroomPointsView, DrillResultsForDrillView, DrillResultsForStudentView, SubmitAnswerView, BadgeViewSet, upload_image, upload_video, unread_badge_notifications
+    TransferRequestViewSet, NotificationViewSet, ClassroomPointsView, DrillResultsForDrillView, DrillResultsForStudentView, SubmitAnswerView, SubmitDrillAnswersView, BadgeViewSet, upload_image, upload_video, unread_badge_notifications
 )
 from api.viewsets.word_list import WordListView
 from api.viewsets.builtin_word_list import BuiltInWordListView, BuiltInWordListIndexView
-from api.viewsets.gen_ai import GenAIView, GenAICheckLimitView, GeminiAIGenericView, GeminiAIDefinitionView 
+from api.viewsets.direct_upload import DirectUploadView, DirectUploadReceiveView, DirectUploadCompleteView
+from api.viewsets.chunked_upload import ChunkedUploadStartView, ChunkedUploadDetailView, ChunkedUploadPartView, ChunkedUploadCompleteView
+from api.viewsets.gen_ai import GenAIView, GenAICheckLimitView, GenAIStreamView, GeminiAIGenericView, GeminiAIGenericStreamView, GeminiAIDefinitionView, GeminiAIDefinitionBatchView 
 from rest_framework_simplejwt.views import TokenRefreshView
 
 # API endpoints
@@ -46,6 +48,7 @@ urlpatterns = [
     path('api/drills/<int:drill_id>/results/', DrillResultsForDrillView.as_view(), name='drill_results_list'),
     path('api/drills/<int:drill_id>/results/student/', DrillResultsForStudentView.as_view(), name='drill_results_for_student'),
     path('api/drills/<int:drill_id>/questions/<int:question_id>/submit/', SubmitAnswerView.as_view(), name='submit_answer'),
+    path('api/drills/<int:drill_id>/submit/', SubmitDrillAnswersView.as_view(), name='submit_drill_answers'),
     
     # Transfer Request URLs
     path('api/transfer-requests/', TransferRequestViewSet.as_view({'get': 'list', 'post': 'create'}), name='transfer_request_list'),
@@ -70,7 +73,10 @@ urlpatterns = [
     # Gen. AI URL
     path('api/gen-ai/checklimit/', GenAICheckLimitView.as_view(), name='gen-ai-checklimit'),
     path('api/gen-ai-definitions/', GeminiAIDefinitionView.as_view(), name='gen-ai-definitions'),
+    path('api/gen-ai-definitions/batch/', GeminiAIDefinitionBatchView.as_view(), name='gen-ai-definitions-batch'),
     path('api/gen-ai/', GeminiAIGenericView.as_view(), name='gen-ai'),
+    path('api/gen-ai/stream/', GeminiAIGenericStreamView.as_view(), name='gen-ai-stream'),
+    path('api/gen-ai/openrouter/stream/', GenAIStreamView.as_view(), name='gen-ai-openrouter-stream'),
 
     # Badge URLs
     path('api/badges/', BadgeViewSet.as_view({'get': 'list'}), name='badge_list'),
@@ -86,6 +92,15 @@ urlpatterns = [
     # Upload Image and Video URLs
     path('api/upload-image/', upload_image, name='upload_image'),
     path('api/upload-video/', upload_video, name='upload_video'),
+
+    # Direct (presigned) and chunked (resumable) uploads
+    path('api/uploads/direct/', DirectUploadView.as_view(), name='direct_upload'),
+    path('api/uploads/direct/complete/', DirectUploadCompleteView.as_view(), name='direct_upload_complete'),
+    path('api/uploads/direct/<str:token>/', DirectUploadReceiveView.as_view(), name='direct_upload_receive'),
+    path('api/uploads/', ChunkedUploadStartView.as_view(), name='chunked_upload_start'),
+    path('api/uploads/<uuid:upload_id>/', ChunkedUploadDetailView.as_view(), name='chunked_upload_detail'),
+    path('api/uploads/<uuid:upload_id>/parts/<int:part_number>/', ChunkedUploadPartView.as_view(), name='chunked_upload_part'),
+    path('api/uploads/<uuid:upload_id>/complete/', ChunkedUploadCompleteView.as_view(), name='chunked_upload_complete'),
 ]
 
 # Serve media files in development